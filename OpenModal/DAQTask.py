@@ -122,9 +122,21 @@ class DAQTask(Task):
         # handling continuous measurements
         self.data_residual = None
 
+        # preallocated buffers (allocated at the first use): two read buffers for acquire_base and
+        # two record buffers for acquire, used alternately
+        self._read_buffers = None
+        self._read_index = 0
+        self._records = None
+        self._record_index = 0
+        self._cursor = 0
+        self._residual = None
+
     def acquire_base(self):
         """Acquires the data from the task.
 
+        The data is read to one of two preallocated buffers, used alternately. The returned
+        array is valid until the next but one call of acquire_base.
+
         Parameters
         ----------
             None
@@ -137,9 +149,11 @@ class DAQTask(Task):
         ------
             Nothing.
         """
-        # allocate data variable
         le = self.samples_per_ch * self.number_of_ch
-        data = np.zeros(le, dtype=numpy.float64)
+        if self._read_buffers is None:
+            self._read_buffers = np.zeros((2, le), dtype=numpy.float64)
+        self._read_index = 1 - self._read_index
+        data = self._read_buffers[self._read_index]
         samples_per_ch = int32()
         #acquire
         self.ReadAnalogF64(DAQmx_Val_Auto, self.time_out, DAQmx_Val_GroupByChannel, data, le, byref(samples_per_ch),
@@ -172,6 +186,11 @@ class DAQTask(Task):
     def _append_data(self, data):
         """Appends acquired data to self.data.
 
+        The data is copied to a preallocated (number_of_ch, samples_per_ch) record at the write
+        cursor; self.data is the filled part of the record. The samples that do not fit are kept
+        in self.data_residual and start the next record (when self.data is set to None). The two
+        record buffers are used alternately, the previous record stays valid during the next one.
+
         Parameters
         ----------
             data : acquired data
@@ -184,26 +203,39 @@ class DAQTask(Task):
         ------
             Nothing.
         """
+        if self._records is None:
+            self._records = np.zeros((2, self.number_of_ch, self.samples_per_ch), dtype=data.dtype)
+            self._residual = np.zeros((self.number_of_ch, self.samples_per_ch), dtype=data.dtype)
 
-        data_ready = False
         if self.data is None:
-            if self.data_residual is None:
-                self.data = data
-            else:
-                self.data = self.data_residual
-                self.data = np.concatenate((self.data, data), axis=1)
-                self.data_residual = None
-        else:
-            self.data = np.concatenate((self.data, data), axis=1)
-
-        [_, samples_per_ch] = np.shape(self.data)
-
-        if samples_per_ch > self.samples_per_ch:  # more samples then required
-            self.data_residual = self.data[:, self.samples_per_ch:]
-            self.data = self.data[:, :self.samples_per_ch]
-            data_ready = True
-
-        return data_ready
+            # start the next record with the residual of the previous one
+            self._record_index = 1 - self._record_index
+            self._cursor = 0
+            residual = self.data_residual
+            self.data_residual = None
+            if residual is not None:
+                self._fill_record(residual)
+        self._fill_record(data)
+
+        self.data = self._records[self._record_index, :, :self._cursor]
+        return self._cursor == self.samples_per_ch
+
+    def _fill_record(self, data):
+        """Copies data to the record at the write cursor, the rest is added to the residual."""
+        n = min(data.shape[1], self.samples_per_ch - self._cursor)
+        self._records[self._record_index, :, self._cursor:self._cursor + n] = data[:, :n]
+        self._cursor += n
+
+        rest = data.shape[1] - n
+        if rest > 0:
+            start = 0 if self.data_residual is None else self.data_residual.shape[1]
+            if start + rest > self._residual.shape[1]:
+                # only when appending blocks longer than samples_per_ch
+                residual = np.zeros((self.number_of_ch, start + rest), dtype=self._residual.dtype)
+                residual[:, :start] = self._residual[:, :start]
+                self._residual = residual
+            self._residual[:, start:start + rest] = data[:, n:]
+            self.data_residual = self._residual[:, :start + rest]
 
     def acquire(self, time_out=10., wait_4_all_samples=True, acquire_sleep='auto'):
         """Acquires the data from the task.
@@ -19,6 +19,10 @@
 # -*- coding: UTF-8 -*-
 """Class for 2D buffer array. Based on this code: http://scimusing.wordpress.com/2013/10/25/ring-buffers-in-pythonnumpy/
 
+The data is written with (at most two) contiguous slice copies. The first-in-first-out data can be
+read without copying with get_views(); in the doubled mode every sample is written twice (to
+position i and i+samples) so that get() always returns a single contiguous view.
+
 Classes:
     class RingBuffer: Buffer for 2D array.
 
@@ -29,17 +33,46 @@ import numpy as np
 
 
 class RingBuffer():
-    """A 2D ring buffer using numpy arrays"""
+    """A 2D ring buffer using numpy arrays
+
+    :param channels: number of channels
+    :param samples: number of samples per channel
+    :param dtype: data type of the buffer (e.g. 'float32' halves the memory for 24-bit DAQ data)
+    :param doubled: if True, the buffer is allocated twice and get() returns a read-only view
+                    (no copy), otherwise get() returns a copy
+    :param buffer: optional preallocated array of shape (channels, samples) or (channels, 2*samples)
+                   if doubled (e.g. in shared memory), it is cleared
+    """
 
-    def __init__(self, channels, samples):
-        self.data = np.zeros((channels, samples), dtype='float')
+    def __init__(self, channels, samples, dtype='float', doubled=False, buffer=None):
+        self.samples = samples
+        self.doubled = doubled
+        shape = (channels, 2 * samples) if doubled else (channels, samples)
+        if buffer is None:
+            self._buffer = np.zeros(shape, dtype=dtype)
+        elif buffer.shape != shape:
+            raise Exception('wrong buffer shape given %s (should be %s)' % (buffer.shape, shape))
+        else:
+            self._buffer = buffer
+            self._buffer[:] = 0
+        self.data = self._buffer[:, :samples]
         self.index = 0
 
     def clear(self):
         """Clear buffer."""
-        self.data = np.zeros_like(self.data)
+        self._buffer[:] = 0
         self.index = 0
 
+    def _write(self, x, start):
+        """Writes x (not longer than the buffer) from position start on, in at most two slices."""
+        n = x.shape[1]
+        first = min(n, self.samples - start)
+        self.data[:, start:start + first] = x[:, :first]
+        self.data[:, :n - first] = x[:, first:]
+        if self.doubled:
+            self._buffer[:, self.samples + start:self.samples + start + first] = x[:, :first]
+            self._buffer[:, self.samples:self.samples + n - first] = x[:, first:]
+
     def extend(self, x, add_samples='all'):
         """adds array x to ring buffer"""
         if x[0].size==0:
@@ -49,17 +82,49 @@ class RingBuffer():
                 return
             if add_samples<x[0].size:
                 x=x[:,:add_samples]
-        x_index = (self.index + np.arange(x[0].size)) % self.data[0].size
-        self.data[:, x_index] = x
-        self.index = x_index[-1] + 1
+        n = x[0].size
+        if n > self.samples:
+            # only the last samples remain in the buffer
+            start = (self.index + n - self.samples) % self.samples
+            x = x[:, n - self.samples:]
+        else:
+            start = self.index
+        self._write(x, start)
+        self.index = (self.index + n) % self.samples
+
+    def _get_length(self, length):
+        if length == 'all':
+            return self.samples
+        return max(0, min(length, self.samples))
+
+    def get_views(self, length='all'):
+        """Returns the first-in-first-out data as a list of (at most two) views, no data is copied.
+
+        The views are only valid until the next call to extend() or clear().
+        """
+        length = self._get_length(length)
+        if self.doubled:
+            return [self._buffer[:, self.index:self.index + length]]
+        first = min(length, self.samples - self.index)
+        views = [self.data[:, self.index:self.index + first]]
+        if length > first:
+            views.append(self.data[:, :length - first])
+        return views
 
     def get(self,length='all'):
-        """Returns the first-in-first-out data in the ring buffer"""
-        idx = (self.index + np.arange(self.data[0].size)) % self.data[0].size
-        if length=='all':
-            return self.data[:, idx]
-        else:
-            return self.data[:, idx[:length]]
+        """Returns the first-in-first-out data in the ring buffer
+
+        In the doubled mode a read-only view is returned (valid until the next extend() or clear()),
+        otherwise a copy.
+        """
+        views = self.get_views(length)
+        if self.doubled:
+            view = views[0]
+            view.flags.writeable = False
+            return view
+        if len(views) == 1:
+            return views[0].copy()
+        return np.concatenate(views, axis=1)
 
 
 def ringbuff_numpy_test():
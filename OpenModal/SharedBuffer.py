@@ -0,0 +1,286 @@
+
+# Copyright (C) 2014-2017 Matjaž Mršnik, Miha Pirnat, Janko Slavič, Blaž Starc (in alphabetic order)
+# 
+# This file is part of OpenModal.
+# 
+# OpenModal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+# 
+# OpenModal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with OpenModal.  If not, see <http://www.gnu.org/licenses/>.
+
+# -*- coding: UTF-8 -*-
+"""Shared-memory buffers for passing the DAQ data between processes without pickling.
+
+The writer (the DAQ process) creates the buffers, the reader (the GUI) attaches to them by the
+description sent over a pipe. Every buffer has a small header with a sequence counter (seqlock):
+the writer makes it odd before and even after each write and the reader retries the copy until
+the counter is even and did not change during the copy, so a consistent snapshot is read without
+any locking of the writer.
+
+The live preview (SharedRingBuffer) is latest-value-wins: the writer never waits for the reader and
+the reader counts the frames it did not see. The complete chunks (SharedSlots) are lossless up to
+the number of slots; when the reader is too slow, the writer drops (and counts) the new chunks
+instead of blocking the acquisition.
+
+Classes:
+    class SharedArray: Numpy array in a shared memory block with a seqlock header.
+    class SharedRingBuffer: Doubled RingBuffer in shared memory (writer side).
+    class SharedRingReader: Reads the first-in-first-out snapshot of a SharedRingBuffer.
+    class SharedSlots: Lossless queue of fixed-size data blocks in shared memory.
+    class SlotsReader: Receives the SharedSlots blocks announced over a pipe.
+"""
+import os
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+import RingBuffer as RingBuffer
+
+_HEADER = 4  # int64: [sequence, ring index or blocks written, frames written or blocks read, unused]
+
+
+class SharedArray():
+    """Numpy array in a shared memory block with a seqlock header
+
+    :param shape: shape of the array
+    :param dtype: data type of the array
+    :param name: name of an existing shared memory block, if None a new block is created
+    """
+
+    def __init__(self, shape, dtype='float', name=None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        header_bytes = _HEADER * np.dtype('int64').itemsize
+        self.owner = name is None
+        if self.owner:
+            size = header_bytes + int(np.prod(self.shape)) * self.dtype.itemsize
+            self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            # the block is freed by its owner, the attaching process must not unlink it at exit
+            _track(self.shm, resource_tracker.unregister)
+        self.header = np.ndarray((_HEADER,), dtype='int64', buffer=self.shm.buf)
+        self.data = np.ndarray(self.shape, dtype=self.dtype, buffer=self.shm.buf, offset=header_bytes)
+        if self.owner:
+            self.header[:] = 0
+            self.data[...] = 0
+
+    @property
+    def description(self):
+        """Small picklable description, used to attach to the block in another process."""
+        return self.__class__.__name__, self.shm.name, self.shape, self.dtype
+
+    @property
+    def sequence(self):
+        return int(self.header[0])
+
+    def begin_write(self):
+        self.header[0] += 1
+
+    def end_write(self):
+        self.header[0] += 1
+
+    def write(self, x):
+        """Writes x to the array."""
+        self.begin_write()
+        self.data[...] = x
+        self.end_write()
+
+    def read(self, copy_data=None, retries=10000):
+        """Returns a consistent copy of the data and the value of header[1] at the time of the copy.
+
+        :param copy_data: function returning a copy of the data, called with header[1] (default: whole array)
+        :param retries: maximal number of retries when the writer is writing
+        :return: (copy, header[1])
+        """
+        if copy_data is None:
+            copy_data = lambda index: self.data.copy()
+        for _ in range(retries):
+            sequence = self.header[0]
+            if sequence % 2 == 0:
+                index = int(self.header[1])
+                out = copy_data(index)
+                if self.header[0] == sequence:
+                    return out, index
+            time.sleep(0)
+        raise Exception('shared buffer %s is not readable (writer stalled?)' % self.shm.name)
+
+    def close(self):
+        """Closes the block in this process; the owner also frees the block."""
+        self.header = None
+        self.data = None
+        self.shm.close()
+        if self.owner:
+            # A forked attaching process can share the resource tracker and has unregistered the
+            # block there, register it again so that unlink() finds it.
+            _track(self.shm, resource_tracker.register)
+            self.shm.unlink()
+
+
+def _track(shm, function):
+    """Calls resource_tracker.register or unregister for the shared memory block.
+
+    Only the POSIX shared memory is tracked (the tracker is not available on Windows, where the
+    block is freed when its last handle is closed); the tracker uses the name with the leading slash.
+    """
+    if os.name == 'posix':
+        function('/' + shm.name.lstrip('/'), 'shared_memory')
+
+
+def attach(description):
+    """Attaches to a shared buffer in another process by its description."""
+    class_name, name, shape, dtype = description
+    if class_name == 'SharedRingBuffer':
+        return SharedRingReader(name, shape, dtype)
+    elif class_name == 'SharedSlots':
+        return SharedSlots(shape[1:], shape[0], dtype, name=name)
+    return SharedArray(shape, dtype, name=name)
+
+
+class SharedRingBuffer(RingBuffer.RingBuffer):
+    """A doubled RingBuffer living in shared memory, the writing index is kept in the header
+
+    :param channels: number of channels
+    :param samples: number of samples per channel
+    :param dtype: data type of the buffer
+    """
+
+    def __init__(self, channels, samples, dtype='float'):
+        self.shared = SharedArray((channels, 2 * samples), dtype)
+        RingBuffer.RingBuffer.__init__(self, channels, samples, dtype, doubled=True, buffer=self.shared.data)
+
+    @property
+    def description(self):
+        return self.__class__.__name__, self.shared.shm.name, self.shared.shape, self.shared.dtype
+
+    def clear(self):
+        self.shared.begin_write()
+        RingBuffer.RingBuffer.clear(self)
+        self.shared.header[1] = self.index
+        self.shared.end_write()
+
+    def extend(self, x, add_samples='all'):
+        """adds array x to ring buffer and publishes it as a new preview frame"""
+        self.shared.begin_write()
+        RingBuffer.RingBuffer.extend(self, x, add_samples)
+        self.shared.header[1] = self.index
+        self.shared.header[2] += 1
+        self.shared.end_write()
+
+    def close(self):
+        self.data = None
+        self._buffer = None
+        self.shared.close()
+
+
+class SharedRingReader():
+    """Reader of a SharedRingBuffer in another process
+
+    The interface follows the pipe connection: recv() returns the current first-in-first-out
+    content of the ring buffer (channels, samples), it does not wait for new data. The frames
+    written since the previous recv() that were never read are counted in `dropped_frames`.
+    """
+
+    def __init__(self, name, shape, dtype):
+        self.shared = SharedArray(shape, dtype, name=name)
+        self.samples = shape[1] // 2
+        self.frames_read = 0
+        self.dropped_frames = 0
+        self._frame = 0
+
+    def poll(self):
+        """True if a new frame was written since the previous recv()."""
+        return int(self.shared.header[2]) != self._frame
+
+    def recv(self):
+        def copy_frame(index):
+            frame = int(self.shared.header[2])
+            return frame, self.shared.data[:, index:index + self.samples].copy()
+        (frame, data), _ = self.shared.read(copy_frame)
+        if frame != self._frame:
+            self.dropped_frames += frame - self._frame - 1
+            self.frames_read += 1
+            self._frame = frame
+        return data
+
+    def close(self):
+        self.shared.close()
+
+
+class SharedSlots(SharedArray):
+    """Lossless queue of data blocks in shared memory
+
+    The writer puts a block to the next slot and sends the returned (small) message over a pipe;
+    the reader gets the block with get(message) and marks it as read. When all the slots hold
+    unread blocks, put() does not write and returns None (the block is dropped, the writer is
+    never blocked by the reader). A block can be shorter (along the last axis) than the slot.
+
+    :param shape: shape of one block
+    :param n_slots: number of slots
+    :param dtype: data type of the blocks
+    :param name: name of an existing shared memory block, if None a new block is created
+    """
+
+    def __init__(self, shape, n_slots=4, dtype='float', name=None):
+        SharedArray.__init__(self, (n_slots,) + tuple(shape), dtype, name=name)
+        self.n_slots = n_slots
+
+    @property
+    def unread(self):
+        """Number of blocks written and not read yet."""
+        return int(self.header[1] - self.header[2])
+
+    def put(self, x):
+        """Copies the block x to the next slot and returns the message for the reader (None if all slots are unread).
+
+        The message is the block number, or (block number, samples) for a block shorter than the slot."""
+        if self.unread >= self.n_slots:
+            return None
+        block = int(self.header[1])
+        self.header[1] = block + 1
+        samples = np.shape(x)[-1]
+        self.begin_write()
+        self.data[block % self.n_slots, ..., :samples] = x
+        self.end_write()
+        if samples < self.shape[-1]:
+            return block, samples
+        return block
+
+    def get(self, block):
+        """Returns a copy of the block given by the message from put()."""
+        samples = self.shape[-1]
+        if isinstance(block, tuple):
+            block, samples = block
+        # the message is sent after the block is written and the slot is not reused before it is read
+        out = self.data[block % self.n_slots, ..., :samples].copy()
+        self.header[2] = block + 1
+        return out
+
+
+class SlotsReader():
+    """Pipe-like reader of SharedSlots: recv() waits for the next message and returns its block
+
+    :param pipe: pipe connection receiving the messages from SharedSlots.put()
+    :param description: description of the SharedSlots
+    """
+
+    def __init__(self, pipe, description):
+        self.pipe = pipe
+        self.slots = attach(description)
+
+    def poll(self, timeout=0):
+        return self.pipe.poll(timeout)
+
+    def recv(self):
+        return self.slots.get(self.pipe.recv())
+
+    def close(self):
+        self.slots.close()
@@ -0,0 +1,235 @@
+
+# Copyright (C) 2014-2017 Matjaž Mršnik, Miha Pirnat, Janko Slavič, Blaž Starc (in alphabetic order)
+# 
+# This file is part of OpenModal.
+# 
+# OpenModal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+# 
+# OpenModal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with OpenModal.  If not, see <http://www.gnu.org/licenses/>.
+
+# -*- coding: UTF-8 -*-
+"""Simulated DAQ task, for running the acquisition without the NI hardware.
+
+The task is selected by its name (instead of a NI MAX task name), see SIMULATED_TASKS:
+    'Simulated:impulse':    channel 0 is the hammer force (a hit every `hit_period` seconds),
+                            the other channels are the responses
+    'Simulated:random':     channel 0 is a random force, the other channels are the responses
+    'Simulated:oma':        all the channels are responses to unmeasured random forces
+An optional speed factor can be added to the name, e.g. 'Simulated:random:10' runs 10 times faster
+than real time and 'Simulated:random:0' as fast as possible.
+
+The responses (displacements) are computed from the 3DOF modal model of
+analysis.get_simulated_sample.get_simulated_receptance by the overlap-add convolution with the
+impulse responses, continuously over the acquired blocks.
+
+Classes:
+    class SimulatedDAQTask: Simulated DAQ task with the DAQTask interface.
+"""
+import time
+
+import numpy as np
+
+import OpenModal.fft_tools as fft_tools
+from OpenModal.analysis.get_simulated_sample import get_simulated_receptance
+
+SIMULATED_TASKS = ['Simulated:impulse', 'Simulated:random', 'Simulated:oma']
+_SIGNALS = ['impulse', 'random', 'oma']
+
+
+def _to_str(task_name):
+    if isinstance(task_name, bytes):
+        return task_name.decode()
+    return task_name
+
+
+def is_simulated_task(task_name):
+    """True if the task name is a simulated task name."""
+    return _to_str(task_name).split(':')[0] == 'Simulated'
+
+
+def get_simulated_tasks():
+    """ Returns the simulated task names (as bytes, like DAQTask.get_daq_tasks)."""
+    return [_.encode() for _ in SIMULATED_TASKS]
+
+
+class SimulatedDAQTask(object):
+    """Simulated DAQ task with the DAQTask interface
+
+    Parameters
+    ----------
+    task_name: simulated task name, see SIMULATED_TASKS.
+    sample_rate: sample rate.
+    number_of_ch: number of channels.
+    samples_per_ch: how many samples per channel should be acquired (the measurement length).
+    block_size: number of samples per channel returned by acquire_base, if None samples_per_ch//10.
+    speed: speed relative to real time, 0 for as fast as possible (overrides the name).
+    hit_period: time between the hits in impulse mode.
+    force_amplitude: peak force of the hit (impulse) or standard deviation of the force (random, oma).
+    noise: standard deviation of the added noise relative to the running peak of each channel.
+    seed: seed of the random generator.
+
+    data: acquired data (by acquire).
+    done: task done status (never done, the task is continuous).
+    channel_list: channel names.
+    """
+
+    def __init__(self, task_name, sample_rate=25600., number_of_ch=4, samples_per_ch=25600, block_size=None,
+                 speed=None, hit_period=2., force_amplitude=100., noise=1e-4, seed=None):
+        name = _to_str(task_name).split(':')
+        if name[0] != 'Simulated' or len(name) < 2 or name[1] not in _SIGNALS:
+            raise Exception('wrong simulated task given %s (can be %s)' % (task_name, SIMULATED_TASKS))
+        self.signal = name[1]
+        if speed is None:
+            speed = float(name[2]) if len(name) > 2 else 1.
+
+        self.time_out = 20
+        self.data = np.array([])
+        self.done = 0
+        self.overload = False
+        self.sample_rate = float(sample_rate)
+        self.number_of_ch = number_of_ch
+        self.number_of_dev = 1
+        self.samples_per_ch = samples_per_ch
+        if block_size is None:
+            block_size = max(1, samples_per_ch // 10)
+        self.block_size = block_size
+        self.speed = speed
+        self.hit_period = hit_period
+        self.force_amplitude = force_amplitude
+        self.noise = noise
+        self.random = np.random.RandomState(seed)
+
+        if self.signal == 'oma':
+            self.channel_list = [('Simulated/resp%d' % i).encode() for i in range(number_of_ch)]
+            n_points = number_of_ch
+        else:
+            self.channel_list = [b'Simulated/force'] + [('Simulated/resp%d' % i).encode()
+                                                        for i in range(number_of_ch - 1)]
+            n_points = number_of_ch - 1
+        self._ini_model(n_points)
+
+        self._samples_done = 0
+        self._peak = np.zeros(number_of_ch)
+        self._start_time = None
+
+    def _ini_model(self, n_points):
+        """Impulse responses of the modal model and their spectra for the overlap-add convolution."""
+        _, _, modal_constants, eta, f0 = get_simulated_receptance(measured_points=max(n_points, 1),
+                                                                  real_mode=True)
+        modal_constants = np.real(modal_constants)
+        w0 = 2 * np.pi * f0
+        sigma = eta * w0 / 2
+        wd = w0 * np.sqrt(1 - (eta / 2) ** 2)
+        # length: until the slowest mode decays to 1e-4
+        length = int(np.ceil(np.log(1e4) / np.min(sigma) * self.sample_rate))
+        t = np.arange(length) / self.sample_rate
+        modal_h = np.exp(-sigma[:, None] * t) * np.sin(wd[:, None] * t) / wd[:, None] / self.sample_rate
+        if self.signal == 'oma':
+            # forces at all the points: residue of mode r between points j, k is C_r*phi_r(j)*phi_r(k)
+            mode_shapes = modal_constants / np.max(np.abs(modal_constants), axis=1, keepdims=True)
+            residues = np.einsum('rj,rk->jkr', modal_constants, mode_shapes)
+        else:
+            # one force: the residues of get_simulated_receptance
+            residues = modal_constants.T[:, None, :]
+        h = np.einsum('jkr,rt->jkt', residues, modal_h)
+
+        self._fft_len = fft_tools.next_fast_len(length + self.block_size - 1)
+        self._H = fft_tools.rfft(h, n=self._fft_len)
+        self._tail = np.zeros((h.shape[0], length - 1))
+
+    def _get_force(self, n):
+        """Returns the force (inputs, n) for the next n samples."""
+        if self.signal == 'impulse':
+            # half-sine pulses of 1 ms, the hits start at (k + 1/2)*hit_period
+            pulse_len = max(1, int(1e-3 * self.sample_rate))
+            pulse = np.sin(np.pi * np.arange(1, pulse_len + 1) / (pulse_len + 1))
+            hit_samples = int(round(self.hit_period * self.sample_rate))
+            start = self._samples_done
+            force = np.zeros((1, n))
+            first = max(0, (start - pulse_len - hit_samples // 2) // hit_samples)
+            for k in range(first, (start + n - hit_samples // 2) // hit_samples + 1):
+                hit = k * hit_samples + hit_samples // 2 - start
+                i = np.arange(max(hit, 0), min(hit + pulse_len, n))
+                if len(i):
+                    amplitude = self.force_amplitude * (1 + 0.1 * np.random.RandomState(k).uniform(-1, 1))
+                    force[0, i] = amplitude * pulse[i - hit]
+            return force
+        return self.force_amplitude * self.random.randn(self._H.shape[1], n)
+
+    def _simulate(self, n):
+        """Returns the next n samples of all the channels."""
+        force = self._get_force(n)
+        response = fft_tools.irfft(np.einsum('jkf,kf->jf', self._H, fft_tools.rfft(force, n=self._fft_len)),
+                                   n=self._fft_len)[:, :n + self._tail.shape[1]]
+        response[:, :self._tail.shape[1]] += self._tail
+        self._tail = response[:, n:].copy()
+        if self.signal == 'oma':
+            data = response[:, :n]
+        else:
+            data = np.vstack((force, response[:, :n]))
+        self._peak = np.maximum(self._peak, np.max(np.abs(data), axis=1))
+        if self.noise:
+            data += self.noise * self._peak[:, None] * self.random.randn(*data.shape)
+        self._samples_done += n
+        return data
+
+    def acquire_base(self):
+        """Acquires the next block of the simulated data.
+
+        Returns
+        -------
+            data : simulated values (number_of_ch, block_size).
+        """
+        if self._start_time is None:
+            self._start_time = time.perf_counter()
+        if self.speed > 0:
+            # wait until the block would be acquired by the hardware
+            block_end = (self._samples_done + self.block_size) / self.sample_rate / self.speed
+            wait = self._start_time + block_end - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+        return self._simulate(self.block_size)
+
+    def acquire(self, time_out=10., wait_4_all_samples=True, acquire_sleep='auto'):
+        """Acquires samples_per_ch samples to self.data."""
+        data = []
+        samples = 0
+        while samples < self.samples_per_ch:
+            data.append(self.acquire_base())
+            samples += data[-1].shape[1]
+        self.data = np.concatenate(data, axis=1)[:, :self.samples_per_ch]
+
+    def clear_task(self, wait_until_done=True):
+        """Clears the task (stops the real-time clock)."""
+        self._start_time = None
+
+
+def test_overlap_add():
+    """The responses acquired in blocks must continue over the block borders (as if acquired at once)."""
+    for signal in _SIGNALS:
+        blocks = SimulatedDAQTask('Simulated:%s:0' % signal, sample_rate=5120., number_of_ch=3,
+                                  samples_per_ch=7000, block_size=700, hit_period=0.5, noise=0, seed=0)
+        whole = SimulatedDAQTask('Simulated:%s:0' % signal, sample_rate=5120., number_of_ch=3,
+                                 samples_per_ch=7000, block_size=7000, hit_period=0.5, noise=0, seed=0)
+
+        # the same forces are applied to the whole record
+        forces = []
+        get_force = blocks._get_force
+        blocks._get_force = lambda n: forces.append(get_force(n)) or forces[-1]
+        data = np.hstack([blocks.acquire_base() for i in range(10)])
+        whole._get_force = lambda n: np.hstack(forces)
+        reference = whole.acquire_base()
+
+        assert np.max(np.abs(reference)) > 0
+        np.testing.assert_allclose(data, reference, rtol=0, atol=1e-9 * np.max(np.abs(reference)))
+
+if __name__ == '__main__':
+    test_overlap_add()
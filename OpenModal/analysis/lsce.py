@@ -17,11 +17,11 @@
 
 
 import numpy as np
-from OpenModal.analysis.utility_functions import prime_factors
+from OpenModal.fft_tools import adjust_frf_len, irfft
 
 
 def lsce(frf, f, low_lim, nmax, dt, input_frf_type ='d', additional_timepoints=0,
-         reconstruction='LSFD'):
+         reconstruction='LSFD', fast_len=None):
     """ The Least-Squares Complex Exponential method (LSCE), introduced
     in [1], is the extension of the Complex Exponential method (CE) to
     a global procedure. It is therefore a SIMO method, processing
@@ -53,14 +53,22 @@ def lsce(frf, f, low_lim, nmax, dt, input_frf_type ='d', additional_timepoints=0
      :param additional_timepoints - normed additional time points (default is
             0% added time points, max. is 1 - all time points (100%) taken into
             computation)
+    :param fast_len: None, 'trim' or 'pad' - the frequency band is trimmed or zero padded
+            for a fast inverse FFT (see fft_tools.fast_frf_len), `dt` is adjusted accordingly;
+            off by default as the highest lines are dropped or zero lines are added (the GUI
+            sets it with the 'fast_frf_len' preference)
     :return: list of complex eigenfrequencies
     """
+    if fast_len is not None:
+        nf = 2*(frf.shape[1]-low_lim-1)
+        frf = adjust_frf_len(frf, fast_len, low_lim)
+        dt *= nf / (2*(frf.shape[1]-low_lim-1))
 
     no = frf.shape[0]  # number of outputs
     l = frf.shape[1]  # length of receptance
     nf = 2*(l-low_lim-1)  # number of DFT frequencies (nf >> n)
 
-    irf = np.fft.irfft(frf[:, low_lim:], n=nf, axis=-1)  # Impulse response function
+    irf = irfft(frf[:, low_lim:], n=nf, axis=-1)  # Impulse response function
 
     sr_list = []
     for n in range(1, nmax+1):
@@ -140,13 +148,8 @@ def test_lsce():
             f_start=0, f_end=5001, measured_points=8, show=False, real_mode=False)
 
     low_lim = 100
-    nf = (2*(len(f)-low_lim-1))
-
-    while max(prime_factors(nf)) > 5:
-        f = f[:-1]
-        frf = frf[:, :-1]
-        nf = (2*(len(f)-low_lim-1))
-
+    frf = adjust_frf_len(frf, 'trim', low_lim)
+    f = f[:frf.shape[1]]
 
     df = (f[1] - f[0])
     nf = 2*(len(f)-low_lim-1)
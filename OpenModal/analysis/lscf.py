@@ -18,11 +18,11 @@
 
 import numpy as np
 from OpenModal.analysis.get_simulated_sample import get_simulated_receptance
-from OpenModal.fft_tools import irfft_adjusted_lower_limit
-from OpenModal.analysis.utility_functions import toeplitz, prime_factors, complex_freq_to_freq_and_damp
+from OpenModal.fft_tools import irfft_adjusted_lower_limit, adjust_frf_len, irfft
+from OpenModal.analysis.utility_functions import toeplitz, complex_freq_to_freq_and_damp
 
 
-def lscf(frf, low_lim, n, dt, weighing_type='Unity', reconstruction='LSFD'):
+def lscf(frf, low_lim, n, dt, weighing_type='Unity', reconstruction='LSFD', fast_len=None):
     """
     LSCF - Least-Squares Complex frequency domain method
 
@@ -85,8 +85,16 @@ def lscf(frf, low_lim, n, dt, weighing_type='Unity', reconstruction='LSFD'):
     :param dt: time sampling interval
     :param weighing_type: weighing type (TO BE UPDATED)
     :param reconstruction: type of reconstruction - LSFD or LSCF
+    :param fast_len: None, 'trim' or 'pad' - the frequency band is trimmed or zero padded
+            for a fast inverse FFT (see fft_tools.fast_frf_len), `dt` is adjusted accordingly;
+            note that the padded (zero) lines are included in the least-squares problem; off by
+            default as the data is changed (the GUI sets it with the 'fast_frf_len' preference)
     :return: eigenfrequencies and the corresponding damping
     """
+    if fast_len is not None:
+        nf = 2*(frf.shape[1]-1)
+        frf = adjust_frf_len(frf, fast_len)
+        dt *= nf / (2*(frf.shape[1]-1))
 
     n *= 2  # the poles should be complex conjugate, therefore we expect even polynomial order
 
@@ -104,7 +112,7 @@ def lscf(frf, low_lim, n, dt, weighing_type='Unity', reconstruction='LSFD'):
     sk = -irfft_adjusted_lower_limit(frf, low_lim, indices_s)
     t = irfft_adjusted_lower_limit(frf.real**2 + frf.imag**2,
                                   low_lim, indices_t)
-    r = -(np.fft.irfft(np.ones(low_lim), n=nf))[indices_t]*nf
+    r = -(irfft(np.ones(low_lim), n=nf))[indices_t]*nf
     r[0] += nf
 
     s = []
@@ -141,12 +149,8 @@ def test_lsfd():
         df_Hz=1, f_start=0, f_end=5001, measured_points=8, show=False, real_mode=False)
 
     low_lim = 1500
-    nf = (2*(len(f)-1))
-
-    while max(prime_factors(nf)) > 5:
-        f = f[:-1]
-        frf = frf[:, :-1]
-        nf = (2*(len(f)-1))
+    frf = adjust_frf_len(frf, 'trim')
+    f = f[:frf.shape[1]]
 
     df = (f[1] - f[0])
     nf = 2*(len(f)-1)
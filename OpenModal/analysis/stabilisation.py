@@ -257,20 +257,16 @@ Input:
 
 def test_stabilisation():
     from OpenModal.analysis.lscf import lscf
-    from OpenModal.analysis.utility_functions import prime_factors
+    from OpenModal.fft_tools import adjust_frf_len
 
     """    Test of the Complex Exponential Method and stabilisation   """
     f, frf, modal_sim, eta_sim, f0_sim = get_simulated_receptance(
         df_Hz=1, f_start=0, f_end=5001, measured_points=8, show=False, real_mode=False)
 
     low_lim = 0
-    nf = (2 * (len(f) - 1))
-    print(nf)
-    while max(prime_factors(nf)) > 5:
-        f = f[:-1]
-        frf = frf[:, :-1]
-        nf = (2 * (len(f) - 1))
-    print(nf)
+    frf = adjust_frf_len(frf, 'trim')
+    f = f[:frf.shape[1]]
+    print(2 * (len(f) - 1))
 
     df = (f[1] - f[0])
     nf = 2 * (len(f) - 1)
@@ -20,16 +20,128 @@ __author__ = 'Matjaz'
 import numpy as np
 import time
 import RingBuffer as RingBuffer
-import DAQTask as DAQTask
+import SharedBuffer as SharedBuffer
+try:
+    import DAQTask as DAQTask
+except (ImportError, NotImplementedError):
+    # NI-DAQmx is not available, only the simulated tasks can be used.
+    DAQTask = None
+import SimulatedDAQTask as SimulatedDAQTask
+import quality as quality
 import multiprocessing as mp
 
 _DIRECTIONS = ['scalar', '+x', '+y', '+z', '-x', '-y', '-z']
 _DIRECTIONS_NR = [0, 1, 2, 3, -1, -2 - 3]
 
+# Acquisition statistics, published by ThreadedDAQ in shared memory:
+#   blocks, samples:    acquired blocks and samples per channel
+#   chunks:             complete chunks passed to the GUI (random, oma and continuous impact hits)
+#   dropped_chunks:     chunks dropped because the GUI did not read the previous ones
+#   daq_overruns:       reads that filled the whole read buffer (the loop does not keep up with the hardware)
+#   loop_latency:       time from the end of the read to the end of the block processing [s]
+#   max_loop_latency:   maximal loop_latency [s]
+#   block_time:         duration of the last block [s]
+#   rejected_records:   records rejected by the quality checks (with auto_reject)
+DAQ_STATISTICS = np.dtype([('blocks', 'i8'), ('samples', 'i8'), ('chunks', 'i8'), ('dropped_chunks', 'i8'),
+                           ('daq_overruns', 'i8'), ('loop_latency', 'f8'), ('max_loop_latency', 'f8'),
+                           ('block_time', 'f8'), ('rejected_records', 'i8')])
+
+def get_task(task_name):
+    """Returns the DAQ task: a SimulatedDAQTask for the simulated task names (see
+    SimulatedDAQTask.SIMULATED_TASKS), otherwise the NI-DAQmx task."""
+    if SimulatedDAQTask.is_simulated_task(task_name):
+        return SimulatedDAQTask.SimulatedDAQTask(task_name)
+    if DAQTask is None:
+        raise Exception('NI-DAQmx is not available, wrong task given %s (can be %s)'
+                        % (task_name, SimulatedDAQTask.SIMULATED_TASKS))
+    return DAQTask.DAQTask(task_name)
+
 def direction_dict():
     dir_dict = {a: b for a, b in zip(_DIRECTIONS, _DIRECTIONS_NR)}
     return dir_dict
 
+_TRIGGER_SLOPES = ['abs', 'rising', 'falling']
+_TRIGGER_LOGIC = ['any', 'all']
+
+class Trigger(object):
+    """Level trigger over consecutive data blocks.
+
+    The trigger fires at the first sample above the level (for the chosen slope) and is then
+    disarmed; it is re-armed when the signal drops below `level - hysteresis`, but not before
+    `hold_off` samples after the trigger. The state is kept between the blocks.
+
+        :param level: trigger level
+        :param channels: channel index or list of channel indices to watch
+        :param slope: 'abs' (absolute value above level), 'rising' (above level) or 'falling' (below -level)
+        :param hysteresis: the signal must drop this much under the level to re-arm the trigger
+        :param logic: 'any' (any of the channels above the level) or 'all' (all of them at the same sample)
+        :param hold_off: number of samples after a trigger in which the trigger is not re-armed
+    """
+    def __init__(self, level, channels=0, slope='abs', hysteresis=0., logic='any', hold_off=0):
+        if slope not in _TRIGGER_SLOPES:
+            raise Exception('wrong trigger slope given %s (can be %s)' % (slope, _TRIGGER_SLOPES))
+        if logic not in _TRIGGER_LOGIC:
+            raise Exception('wrong trigger logic given %s (can be %s)' % (logic, _TRIGGER_LOGIC))
+        self.level = level
+        self.channels = np.atleast_1d(channels)
+        self.slope = slope
+        self.hysteresis = hysteresis
+        self.logic = logic
+        self.hold_off = int(hold_off)
+        self.reset()
+
+    def reset(self):
+        """Arm the trigger, forget the hold-off."""
+        self.armed = True
+        self._hold_off_left = 0
+
+    def _get_signal(self, data):
+        x = data[self.channels]
+        if self.slope == 'abs':
+            return np.abs(x)
+        elif self.slope == 'falling':
+            return -x
+        return x
+
+    def _first(self, x, limit, above):
+        """Index of the first sample where (any/all) channels are above (or not above) limit, None if none."""
+        if above:
+            over = x > limit
+            over = over.any(axis=0) if self.logic == 'any' else over.all(axis=0)
+        else:
+            # re-arm when the trigger condition does not hold anymore
+            over = x < limit
+            over = over.all(axis=0) if self.logic == 'any' else over.any(axis=0)
+        i = np.argmax(over)  # stops at the first True
+        if over[i]:
+            return i
+        return None
+
+    def find(self, data):
+        """Returns the list of trigger indices in the data block (channels, samples)."""
+        x = self._get_signal(data)
+        n = x.shape[-1]
+        pos = min(self._hold_off_left, n)
+        self._hold_off_left -= pos
+        triggers = []
+        while pos < n:
+            if not self.armed:
+                i = self._first(x[:, pos:], self.level - self.hysteresis, above=False)
+                if i is None:
+                    break
+                pos += i
+                self.armed = True
+            i = self._first(x[:, pos:], self.level, above=True)
+            if i is None:
+                break
+            pos += i
+            triggers.append(pos)
+            self.armed = False
+            pos += 1
+            self._hold_off_left = max(0, pos + self.hold_off - n)
+            pos = min(pos + self.hold_off, n)
+        return triggers
+
 class MeasurementProcess(object):
     """Impact measurement handler.
 
@@ -41,6 +153,21 @@ class MeasurementProcess(object):
         :param fft_len: the length of the FFT, if 'auto' then the freq length matches the time length
         :param trigger_level: amplitude level at which to trigger.
         :param pre_trigger_samples: how many samples should be pre-triggered
+        :param trigger_slope: 'abs', 'rising' or 'falling', see Trigger
+        :param trigger_hysteresis: trigger hysteresis, see Trigger
+        :param trigger_channels: channels to trigger on, if None the excitation channel
+        :param trigger_logic: 'any' or 'all' trigger channels, see Trigger
+        :param trigger_hold_off: samples after a trigger without a new trigger, see Trigger
+        :param double_hit_limit: limit of the double hit check, see meas_check.double_hit_check
+        :param quality_checks: list of the quality checks, see quality; if None the defaults for the
+                               excitation type (quality.get_default_checks)
+        :param auto_reject: if True, the records that fail a quality check are not passed to the GUI
+                            (the impulse measurement waits for the next hit)
+        :param continuous_impact: if True, the impulse measurement keeps the task armed, the records of
+                                  the hits that pass the quality checks are queued (random_chunk)
+        :param stream_blocks: if True, the random and oma measurement queue every acquired block (random_chunk)
+                              instead of the complete records, for FRF.add_data_stream; the records are
+                              still checked, but not rejected (auto_reject)
     """
     def __init__(self, task_name=None, samples_per_channel='auto',
                  channel_delay=[0., 0.], exc_channel=0,
@@ -52,13 +179,20 @@ class MeasurementProcess(object):
 
         self.key_list = dict(excitation_type=None, task_name=None, samples_per_channel='auto',
                              channel_delay=[0., 0.], exc_channel=0,
-                             fft_len='auto', trigger_level=5, pre_trigger_samples=10, n_averages=8)
+                             fft_len='auto', trigger_level=5, pre_trigger_samples=10, n_averages=8,
+                             trigger_slope='abs', trigger_hysteresis=0., trigger_channels=None,
+                             trigger_logic='any', trigger_hold_off=0, double_hit_limit=1e-2,
+                             quality_checks=None, auto_reject=False, continuous_impact=False,
+                             stream_blocks=False)
 
         self.parameters = dict()
 
         # Trigger, keeps the thread alive.
         self.live_flag = mp.Value('b', False)
 
+        self._statistics = dict()
+        self._quality = None
+
         self.setup_measurement_parameters(locals())
 
     def setup_measurement_parameters(self, parameters_dict):
@@ -125,13 +259,17 @@ class MeasurementProcess(object):
                          channel_delay=self.channel_delay,
                          fft_len=self.fft_len, trigger_level=self.trigger_level,
                          pre_trigger_samples=self.pre_trigger_samples,
-                         n_averages=self.n_averages)
+                         n_averages=self.n_averages,
+                         trigger_slope=self.trigger_slope, trigger_hysteresis=self.trigger_hysteresis,
+                         trigger_channels=self.trigger_channels, trigger_logic=self.trigger_logic,
+                         trigger_hold_off=self.trigger_hold_off, double_hit_limit=self.double_hit_limit,
+                         quality_checks=self.quality_checks, auto_reject=self.auto_reject,
+                         continuous_impact=self.continuous_impact)
 
             # Reinitialize pipes beforehand (pipes are closed each time the measurement is stopped).
-            self.process_measured_data_out, self.process_measured_data_in = mp.Pipe(False)
+            # The data itself is in shared memory, only the chunk messages go over the pipe.
             self.process_random_chunk_out, self.process_random_chunk_in = mp.Pipe(False)
 
-            pdict['measured_data_pipe'] = self.process_measured_data_in
             pdict['random_chunk_pipe'] = self.process_random_chunk_in
 
             # Actually send the data over the pipe.
@@ -140,6 +278,46 @@ class MeasurementProcess(object):
             # Send a start signal to the process object.
             self.run_flag.value = True
 
+    def get_task_info(self):
+        """Wait for the started measurement, attach to its shared memory buffers and return the sampling rate.
+
+        After this, measured_data.recv() returns the current (live) content of the ring buffer and
+        random_chunk.recv() the next complete chunk (random, oma and continuous impact measurement; with
+        stream_blocks the next acquired block of the random and oma measurement). The preview is
+        latest-value-wins: recv() returns the newest frame, the skipped frames are only counted."""
+        sampling_rate = self.task_info_out.recv()
+        self.measured_data = SharedBuffer.attach(self.task_info_out.recv())
+        self.random_chunk = SharedBuffer.SlotsReader(self.process_random_chunk_out, self.task_info_out.recv())
+        self.statistics = SharedBuffer.attach(self.task_info_out.recv())
+        self.quality = SharedBuffer.attach(self.task_info_out.recv())
+        return sampling_rate
+
+    def get_quality(self):
+        """Results of the quality checks done in the measurement process, see quality.QualityStage.
+
+        Returns a structured array of shape (2,): [0] the current record (before the impulse
+        trigger: the last block), [1] the last complete record. The fields depend on the checks,
+        e.g. overload (bool per channel), double_hit, rms (per channel), coherence_drop and reject.
+        After the measurement is stopped, the results of the last measurement are returned (None before
+        the first measurement)."""
+        if hasattr(self, 'quality'):
+            result, _ = self.quality.read()
+            self._quality = result.copy()
+        return self._quality
+
+    def get_statistics(self):
+        """Acquisition statistics of the current (or the last) measurement.
+
+        Returns the DAQ_STATISTICS fields and the preview frames read by measured_data.recv()
+        (preview_frames) and skipped (dropped_preview_frames) as a dict. Compare loop_latency to
+        block_time and watch daq_overruns to size the blocks."""
+        if hasattr(self, 'measured_data'):
+            statistics, _ = self.statistics.read()
+            self._statistics = {name: statistics[name].item() for name in DAQ_STATISTICS.names}
+            self._statistics['preview_frames'] = self.measured_data.frames_read
+            self._statistics['dropped_preview_frames'] = self.measured_data.dropped_frames
+        return self._statistics
+
     def stop_measurement(self):
         """Stop measuring."""
         if not self.run_flag.value:
@@ -149,10 +327,16 @@ class MeasurementProcess(object):
             # Stop it and close the pipes. Both ends of the pipes should be closed at the same time, like below.
             self.run_flag.value = False
             self.triggered.value = False
-            self.process_measured_data_in.close()
-            self.process_measured_data_out.close()
             self.process_random_chunk_in.close()
             self.process_random_chunk_out.close()
+            if hasattr(self, 'measured_data'):
+                self.get_statistics()
+                self.get_quality()
+                self.measured_data.close()
+                self.random_chunk.close()
+                self.statistics.close()
+                self.quality.close()
+                del self.measured_data, self.random_chunk, self.statistics, self.quality
 
 
 class ThreadedDAQ(object):
@@ -185,7 +369,9 @@ class ThreadedDAQ(object):
             if self.run_flag.value:
                 self.inject_properties(self.properties.recv())
                 # self.measurement_continuous()
-                if self.type == 'impulse':
+                if self.type == 'impulse' and self.continuous_impact:
+                    self.measurement_impact_continuous()
+                elif self.type == 'impulse':
                     self.measurement_triggered()
                 elif self.type == 'random' or self.type == 'oma':
                     self.measurement_continuous()
@@ -195,32 +381,129 @@ class ThreadedDAQ(object):
     def inject_properties(self, properties):
         """Get fresh arguments to the function before starting the measurement."""
         self.type = properties['excitation_type']
-        self.task = DAQTask.DAQTask(properties['task_name'])
+        self.task = get_task(properties['task_name'])
         self.sampling_rate = self.task.sample_rate
-        self.task_info.send(self.sampling_rate)
         self.channel_list = self.task.channel_list
         self.samples_per_channel = self.task.samples_per_ch
         self.number_of_channels = self.task.number_of_ch
         self.exc_channel = properties['exc_channel']
         self.trigger_level = properties['trigger_level']
         self.pre_trigger_samples = properties['pre_trigger_samples']
-        if properties['samples_per_channel'] is 'auto':
+        trigger_channels = properties.get('trigger_channels', None)
+        if trigger_channels is None:
+            trigger_channels = self.exc_channel
+        self.trigger = Trigger(self.trigger_level, trigger_channels,
+                               slope=properties.get('trigger_slope', 'abs'),
+                               hysteresis=properties.get('trigger_hysteresis', 0.),
+                               logic=properties.get('trigger_logic', 'any'),
+                               hold_off=properties.get('trigger_hold_off', 0))
+        quality_checks = properties.get('quality_checks', None)
+        if quality_checks is None:
+            quality_checks = quality.get_default_checks(self.type)
+        # The double hit limit of the settings, if the check is given without it.
+        quality_checks = ['DoubleHit:%g' % properties.get('double_hit_limit', 1e-2) if _ == 'DoubleHit' else _
+                          for _ in quality_checks]
+        self.continuous_impact = properties.get('continuous_impact', False)
+        # The continuous impact measurement queues only the hits that pass the quality checks.
+        self.auto_reject = properties.get('auto_reject', False) or self.continuous_impact
+        self.stream_blocks = properties.get('stream_blocks', False) and self.type in ['random', 'oma']
+        if properties['samples_per_channel'] == 'auto':
             self.samples_per_channel = self.task.samples_per_ch
         else:
             self.samples_per_channel = properties['samples_per_channel']
         self.samples_left_to_acquire = self.samples_per_channel
 
         # Reinitialize pipe always -- it is closed when measurement is stopped.
-        self.measured_data = properties['measured_data_pipe']
         self.random_chunk = properties['random_chunk_pipe']
 
-        self.ring_buffer = RingBuffer.RingBuffer(self.number_of_channels, self.samples_per_channel)
+        # The ring buffer and the complete chunks live in shared memory, the GUI attaches to them.
+        self.ring_buffer = SharedBuffer.SharedRingBuffer(self.number_of_channels, self.samples_per_channel)
+        if self.stream_blocks:
+            # The acquired blocks are queued, the slots hold the longest block of the task.
+            self.chunks = SharedBuffer.SharedSlots((self.number_of_channels, self.task.samples_per_ch), n_slots=16)
+        else:
+            self.chunks = SharedBuffer.SharedSlots((self.number_of_channels, self.samples_per_channel))
+        self.statistics = SharedBuffer.SharedArray((), DAQ_STATISTICS)
+        self.quality_stage = quality.QualityStage(quality_checks, self.number_of_channels, self.exc_channel,
+                                                  self.sampling_rate)
+        self.quality = SharedBuffer.SharedArray((2,), self.quality_stage.dtype)
+        self.quality_stage.set_result(self.quality.data)
+        self.task_info.send(self.sampling_rate)
+        self.task_info.send(self.ring_buffer.description)
+        self.task_info.send(self.chunks.description)
+        self.task_info.send(self.statistics.description)
+        self.task_info.send(self.quality.description)
+
+    def _close_buffers(self):
+        """Free the shared memory (the GUI keeps its mapping until it closes it)."""
+        self.ring_buffer.close()
+        self.chunks.close()
+        self.statistics.close()
+        self.quality.close()
+
+    def _check_block(self, data, new_record):
+        """Quality checks of the block, new_record starts a new record."""
+        self.quality.begin_write()
+        if new_record:
+            self.quality_stage.new_record()
+        self.quality_stage.update(data)
+        self.quality.end_write()
+
+    def _check_record(self, record):
+        """Quality checks of the complete record; returns True if the record is rejected (auto_reject)."""
+        self.quality.begin_write()
+        reject = self.quality_stage.finish(record) and self.auto_reject
+        self.quality.end_write()
+        if reject:
+            self.statistics.begin_write()
+            self.statistics.data['rejected_records'] += 1
+            self.statistics.end_write()
+        return reject
+
+    def _update_statistics(self, data, read_time):
+        """Count the processed block; read_time is the time.perf_counter() after the read."""
+        latency = time.perf_counter() - read_time
+        self.statistics.begin_write()
+        statistics = self.statistics.data
+        statistics['blocks'] += 1
+        statistics['samples'] += data.shape[1]
+        if data.shape[1] >= self.task.samples_per_ch:
+            statistics['daq_overruns'] += 1
+        statistics['loop_latency'] = latency
+        statistics['max_loop_latency'] = max(latency, statistics['max_loop_latency'])
+        statistics['block_time'] = data.shape[1] / self.sampling_rate
+        self.statistics.end_write()
+
+    def _send_chunk(self, data):
+        """Pass a complete chunk to the GUI over the lossless path; returns False if it was dropped."""
+        block = self.chunks.put(data)
+        counter = 'dropped_chunks' if block is None else 'chunks'
+        self.statistics.begin_write()
+        self.statistics.data[counter] += 1
+        self.statistics.end_write()
+        if block is None:
+            return False
+        try:
+            self.random_chunk.send(block)
+        except OSError:
+            # The GUI closes the pipe when the measurement is stopped.
+            if self.run_flag.value:
+                raise
+        return True
+
+    def _send_stream(self, data):
+        """Pass an acquired block to the GUI over the lossless path (in pieces if longer than a slot)."""
+        slot_samples = self.chunks.shape[-1]
+        for start in range(0, data.shape[1], slot_samples):
+            self._send_chunk(data[:, start:start + slot_samples])
+        self.triggered.value = True
 
     def _add_data_if_triggered(self, data):
-        # If trigger level crossed ...
-        _trigger = np.abs(data[self.exc_channel]) > self.trigger_level
-        if np.any(_trigger) and not self.internal_trigger:
-            trigger_index = np.where(_trigger)[0][0]
+        # If trigger level crossed ... (the pre-trigger samples of the previous blocks are in the ring buffer)
+        in_record = self.internal_trigger
+        triggers = [] if self.internal_trigger else self.trigger.find(data)
+        if len(triggers) and not self.internal_trigger:
+            trigger_index = triggers[0]
             start = trigger_index - self.pre_trigger_samples
             self.samples_left_to_acquire+=start
             self.ring_buffer.extend(data, self.samples_left_to_acquire)
@@ -231,39 +514,75 @@ class ThreadedDAQ(object):
             self.samples_left_to_acquire = self.samples_left_to_acquire - data[0].size
         else:
             self.ring_buffer.extend(data)
+        self._check_block(data, new_record=not in_record)
+        if self.internal_trigger and self.samples_left_to_acquire <= 0:
+            if self._check_record(self.ring_buffer.get()):
+                # Rejected, wait for the next hit.
+                self.internal_trigger = False
+                self.samples_left_to_acquire = self.samples_per_channel
+
+    def _add_hits(self, data):
+        """Continuous impact: the records of all the hits in the block are checked and queued.
+
+        A record starts pre_trigger_samples before the trigger; the triggers during a record are ignored
+        (the double hit check rejects such a record)."""
+        triggers = self.trigger.find(data)
+        position = 0
+        while position < data.shape[1]:
+            if self.internal_trigger:
+                stop = min(data.shape[1], position + self.samples_left_to_acquire)
+                self.ring_buffer.extend(data[:, position:stop])
+                self._check_block(data[:, position:stop], new_record=False)
+                self.samples_left_to_acquire -= stop - position
+                position = stop
+                if self.samples_left_to_acquire <= 0:
+                    record = self.ring_buffer.get()
+                    if not self._check_record(record) and self._send_chunk(record):
+                        self.triggered.value = True
+                    self.internal_trigger = False
+            else:
+                triggers = [_ for _ in triggers if _ >= position]
+                if len(triggers) == 0:
+                    self.ring_buffer.extend(data[:, position:])
+                    break
+                self.ring_buffer.extend(data[:, position:triggers[0]])
+                # The pre-trigger samples are already in the ring buffer.
+                pre_trigger_samples = min(self.pre_trigger_samples, self.samples_per_channel)
+                self._check_block(self.ring_buffer.get()[:, self.samples_per_channel - pre_trigger_samples:],
+                                  new_record=True)
+                self.samples_left_to_acquire = self.samples_per_channel - pre_trigger_samples
+                self.internal_trigger = True
+                position = triggers[0]
 
     def measurement_continuous(self):
         """Continuous measurement."""
         samples_left_local = self.samples_left_to_acquire
+        new_record = True
         while True:
             # TODO: Optimize below.
             if not self.run_flag.value:
-                # self.measured_data.close()
                 self.task.clear_task(False)
                 # self.task = None
+                self._close_buffers()
                 break
             else:
                 _data = self.task.acquire_base()
+                read_time = time.perf_counter()
                 self.ring_buffer.extend(_data, self.samples_left_to_acquire)
-                # self.ring_buffer.extend(_data, self.samples_left_to_acquire)
                 samples_left_local -= _data[0].size
-
-
-                # TODO: Why this try/excepty? It always throws an error? Problems with sync between processes probably.
-                try:
-                    self.measured_data.send(self.ring_buffer.get())
-                    if samples_left_local <= 0:
+                self._check_block(_data, new_record)
+                new_record = False
+                if self.stream_blocks:
+                    self._send_stream(_data)
+
+                if samples_left_local <= 0:
+                    samples_left_local = self.samples_left_to_acquire
+                    new_record = True
+                    reject = self._check_record(self.ring_buffer.get())
+                    if not self.stream_blocks and not reject and self._send_chunk(self.ring_buffer.get()):
                         self.triggered.value = True
-                        samples_left_local = self.samples_left_to_acquire
-                        self.random_chunk.send(self.ring_buffer.get())
-                        self.ring_buffer.clear()
-                except:
-                    print('DAQ Except')
-                    if not self.run_flag.value:
-                        pass
-                    else:
-                        raise Exception
-
+                    self.ring_buffer.clear()
+                self._update_statistics(_data, read_time)
 
 
     def measurement_triggered(self, trigger=100):
@@ -275,50 +594,53 @@ class ThreadedDAQ(object):
 
             # Check if stop condition, then do some cleanup and break out of loop.
             if not self.run_flag.value:
-                # self.measured_data.close()
                 self.task.clear_task(False)
                 self.task = None
+                self._close_buffers()
                 break
-            # TODO: Check what is happening with the triggers.
-            elif self.samples_left_to_acquire < 0:
-                if self.internal_trigger:
-                    self.triggered.value = True
-                    # self.internal_trigger = False
+            elif self.internal_trigger and self.samples_left_to_acquire <= 0:
+                # The record is complete, wait for the stop.
+                self.triggered.value = True
+                time.sleep(0.01)
             else:
                 # Otherwise, do the measurement and watch for trigger.
                 data = self.task.acquire_base()
+                read_time = time.perf_counter()
                 self._add_data_if_triggered(data)
-
-                try:
-                    self.measured_data.send(self.ring_buffer.get())
-                except:
-                    if not self.run_flag.value:
-                        pass
-                    else:
-                        raise Exception
+                self._update_statistics(data, read_time)
 
                 # if self.samples_left_to_acquire == 0:
                 #     break
 
+    def measurement_impact_continuous(self):
+        """Continuous impact measurement, the task stays armed and the accepted hits are queued."""
+        self.internal_trigger = False
+        while True:
+            if not self.run_flag.value:
+                self.task.clear_task(False)
+                self.task = None
+                self._close_buffers()
+                break
+            else:
+                data = self.task.acquire_base()
+                read_time = time.perf_counter()
+                self._add_hits(data)
+                self._update_statistics(data, read_time)
+
     def measurement_nsamples(self, n=1000):
         """Measure N number of samples."""
         # TODO: This doesn't work obviously.
         while True:
             if not self.run_flag.value:
-                self.measured_data.close()
                 self.task.clear_task(False)
                 self.task = None
+                self._close_buffers()
                 break
             else:
                 _data = self.task.acquire_base()
+                read_time = time.perf_counter()
                 self.ring_buffer.extend(_data)
-                try:
-                    self.measured_data.send(self.ring_buffer.get())
-                except:
-                    if not self.run_flag.value:
-                        pass
-                    else:
-                        raise Exception
+                self._update_statistics(_data, read_time)
 
 def test_ring_buffer():
     tt = ThreadedDAQ(live_flag=mp.Value('b', False), run_flag=mp.Value('b', True), properties=None, task_info='OpenModal Impact_', trigger=False)
@@ -327,6 +649,13 @@ def test_ring_buffer():
     tt.trigger_level=3.5
     tt.pre_trigger_samples=5
     tt.exc_channel=0
+    tt.trigger = Trigger(tt.trigger_level, tt.exc_channel)
+    tt.sampling_rate=1.
+    tt.auto_reject=False
+    tt.quality_stage = quality.QualityStage(['Overload', 'DoubleHit', 'Statistics'], tt.number_of_channels,
+                                            tt.exc_channel, tt.sampling_rate)
+    tt.quality = SharedBuffer.SharedArray((2,), tt.quality_stage.dtype)
+    tt.quality_stage.set_result(tt.quality.data)
     tt.ring_buffer = RingBuffer.RingBuffer(tt.number_of_channels, tt.samples_per_channel)
     tt.samples_left_to_acquire=tt.samples_per_channel
     tt.internal_trigger=False
@@ -341,9 +670,42 @@ def test_ring_buffer():
     tt._add_data_if_triggered(data)
     print(tt.ring_buffer.get())
     print(tt.samples_left_to_acquire)
-
+    print(tt.quality.data)
+    tt.quality.close()
+
+
+
+def test_trigger():
+    # hysteresis: the dip to 4 does not re-arm the trigger, the drop to 1 does (also over the block border)
+    x = np.array([[0., 6., 4., 6., 1., 6., 0., 0.]])
+    trigger = Trigger(5., hysteresis=2.)
+    assert trigger.find(x) == [1, 5]
+    trigger = Trigger(5., hysteresis=2.)
+    assert trigger.find(x[:, :3]) == [1]
+    assert trigger.find(x[:, 3:]) == [2]
+    assert Trigger(5.).find(x) == [1, 3, 5]
+
+    # hold-off over the block borders
+    x = np.zeros((1, 30))
+    x[0, [2, 8, 14, 20, 26]] = 6.
+    trigger = Trigger(5., hold_off=10)
+    assert [i + start for start in range(0, 30, 5) for i in trigger.find(x[:, start:start + 5])] == [2, 14, 26]
+
+    # hits of the simulated task: 0.5 s apart, the hold-off of 0.6 s skips every other hit
+    for hold_off, hits in [(0, 8), (0.6, 4)]:
+        task = SimulatedDAQTask.SimulatedDAQTask('Simulated:impulse:0', sample_rate=5120., number_of_ch=2,
+                                                 samples_per_ch=5120, block_size=512, hit_period=0.5, seed=0)
+        trigger = Trigger(50., channels=0, hysteresis=10., hold_off=hold_off * task.sample_rate)
+        triggers = []
+        for block in range(40):
+            triggers.extend(block * task.block_size + i for i in trigger.find(task.acquire_base()))
+        # the hits start at 1280 + k*2560 samples, the level is crossed in the 5 samples long pulse
+        hit_starts = 1280 + np.arange(hits) * 2560 * (8 // hits)
+        assert len(triggers) == hits
+        assert np.all((np.array(triggers) >= hit_starts) & (np.array(triggers) < hit_starts + 5))
 
 
 if __name__ == '__main__':
     test_ring_buffer()
+    test_trigger()
 
@@ -29,145 +29,376 @@ History:
 
 """
 
+import os
+import pickle
+import time
+
 import numpy as np
 
 _FRF_TYPES = {'a': 2, 'v': 1, 'd': 0}  # accelerance, mobility, receptance
 
-def multiply(ffts, m):
-    """Multiplies ffts*m. ffts can be a single fft or an array of ffts.
+_FFT_BACKENDS = ['numpy', 'scipy', 'pyfftw']
+
+# the FFT backend used by all the spectral routines, see set_fft_backend()
+_fft_backend = {'name': 'numpy', 'workers': 1, 'module': np.fft, 'kwargs': {}, 'wisdom_file': None}
+
+
+def set_fft_backend(backend='numpy', workers=-1, wisdom_file=None, planner_effort='FFTW_MEASURE'):
+    """Sets the FFT backend used by rfft(), irfft(), fft() and ifft() (and by all the spectral routines)
+
+    Backends:
+        'numpy':    np.fft (single-threaded)
+        'scipy':    scipy.fft with `workers` threads (requires scipy >= 1.4; the plans are cached by scipy)
+        'pyfftw':   pyFFTW with `threads` and cached plans (requires pyFFTW); the wisdom is loaded from
+                    `wisdom_file` (if it exists) and can be saved with save_fft_wisdom()
+
+    :param backend: backend name, see _FFT_BACKENDS
+    :param workers: number of threads; negative values count from the number of CPUs (-1: all CPUs)
+    :param wisdom_file: pyFFTW wisdom file
+    :param planner_effort: pyFFTW planner effort
+    :return:
+    """
+    if not (backend in _FFT_BACKENDS):
+        raise Exception('wrong FFT backend given %s (can be %s)' % (backend, _FFT_BACKENDS))
+    if workers < 0:
+        workers = max(1, (os.cpu_count() or 1) + 1 + workers)
+
+    if backend == 'numpy':
+        module = np.fft
+        kwargs = {}
+    elif backend == 'scipy':
+        try:
+            import scipy.fft as module
+        except ImportError:
+            raise ImportError('scipy >= 1.4 is required for the scipy FFT backend.')
+        kwargs = {'workers': workers}
+    else:  # 'pyfftw'
+        try:
+            import pyfftw
+            import pyfftw.interfaces.numpy_fft as module
+        except ImportError:
+            raise ImportError('pyFFTW is required for the pyfftw FFT backend.')
+        pyfftw.interfaces.cache.enable()
+        if wisdom_file is not None and os.path.isfile(wisdom_file):
+            with open(wisdom_file, 'rb') as f:
+                pyfftw.import_wisdom(pickle.load(f))
+        kwargs = {'threads': workers, 'planner_effort': planner_effort}
+
+    _fft_backend.update({'name': backend, 'workers': workers, 'module': module, 'kwargs': kwargs,
+                         'wisdom_file': wisdom_file})
+
+
+def get_fft_backend():
+    """Returns the name and the number of threads of the FFT backend
+
+    :return: backend, workers
+    """
+    return _fft_backend['name'], _fft_backend['workers']
+
+
+def get_available_fft_backends():
+    """Returns the FFT backends that can be used (their packages are installed)
+
+    :return: list of backend names, see _FFT_BACKENDS
+    """
+    available = ['numpy']
+    for backend, package in [('scipy', 'scipy.fft'), ('pyfftw', 'pyfftw')]:
+        try:
+            __import__(package)
+            available.append(backend)
+        except ImportError:
+            pass
+    return available
+
+
+def save_fft_wisdom(wisdom_file=None):
+    """Saves the pyFFTW wisdom (the FFT plans) for the next sessions, see set_fft_backend()
+
+    :param wisdom_file: wisdom file; if None, the file given to set_fft_backend() is used
+    :return:
+    """
+    if _fft_backend['name'] != 'pyfftw':
+        return
+    import pyfftw
+    wisdom_file = _fft_backend['wisdom_file'] if wisdom_file is None else wisdom_file
+    with open(wisdom_file, 'wb') as f:
+        pickle.dump(pyfftw.export_wisdom(), f)
+
+
+def rfft(x, n=None, axis=-1):
+    """One-dimensional FFT of real input with the selected backend, see np.fft.rfft"""
+    return _fft_backend['module'].rfft(x, n=n, axis=axis, **_fft_backend['kwargs'])
+
+
+def irfft(x, n=None, axis=-1):
+    """Inverse of rfft() with the selected backend, see np.fft.irfft"""
+    return _fft_backend['module'].irfft(x, n=n, axis=axis, **_fft_backend['kwargs'])
+
+
+def fft(x, n=None, axis=-1):
+    """One-dimensional FFT with the selected backend, see np.fft.fft"""
+    return _fft_backend['module'].fft(x, n=n, axis=axis, **_fft_backend['kwargs'])
+
+
+def ifft(x, n=None, axis=-1):
+    """Inverse of fft() with the selected backend, see np.fft.ifft"""
+    return _fft_backend['module'].ifft(x, n=n, axis=axis, **_fft_backend['kwargs'])
+
+
+def benchmark_fft_backends(channels=32, samples=65536, repeat=20, workers=-1):
+    """Times the rfft of a (channels, samples) block with all the available backends
+
+    :param channels: number of channels
+    :param samples: number of samples per channel
+    :param repeat: number of repetitions (the best time is taken)
+    :param workers: number of threads, see set_fft_backend()
+    :return: dict of the times (in seconds) per block
+    """
+    x = np.random.randn(channels, samples)
+    backend = dict(_fft_backend)
+    times = dict()
+    try:
+        for name in _FFT_BACKENDS:
+            try:
+                set_fft_backend(name, workers=workers)
+            except ImportError:
+                continue
+            rfft(x)  # planning
+            t = []
+            for i in range(repeat):
+                t0 = time.perf_counter()
+                rfft(x)
+                t.append(time.perf_counter() - t0)
+            times[name] = min(t)
+    finally:
+        _fft_backend.update(backend)
+    return times
+
+
+def multiply(ffts, m, out=None):
+    """Multiplies ffts*m. ffts can be a single fft or an array of ffts of any shape (..., n_freq).
 
     :param ffts: array of fft data
-    :param m: multiplication vector
+    :param m: multiplication vector (or array broadcastable to ffts)
+    :param out: optional output array (can be ffts for an in place multiplication)
     :return: multiplied array of fft data
     """
-    out = np.zeros_like(ffts, dtype='complex')
-    if len(np.shape(ffts)) == 2:  # list of
-        n = np.shape(ffts)[0]  # number of frfs
-        for j in range(n):
-            out[j, :] = ffts[j, :] * m
-    else:
-        out[:] = ffts[:] * m
+    if out is None:
+        out = np.empty(np.broadcast(ffts, m).shape, dtype=np.result_type(ffts, m, 1j))
+    return np.multiply(ffts, m, out=out)
 
-    return out
 
-
-def frequency_integration(ffts, omega, order=1):
+def frequency_integration(ffts, omega, order=1, out=None):
     """Integrates ffts (one or many) in the frequency domain.
 
-    :param ffts: [rad/s] : angular frequency vector
-    :param omega: angular frequency
+    :param ffts: array of fft data of shape (..., n_freq)
+    :param omega: [rad/s] angular frequency vector
     :param order: order of integration
+    :param out: optional output array
     :return: integrated array of fft data
     """
-    return multiply(ffts, np.power(-1.j / omega, order))
+    return multiply(ffts, np.power(-1.j / omega, order), out=out)
 
 
-def frequency_derivation(ffts, omega, order=1):
+def frequency_derivation(ffts, omega, order=1, out=None):
     """Derivates ffts (one or many) in the frequency domain.
 
-    :param ffts: array of fft data
+    :param ffts: array of fft data of shape (..., n_freq)
     :param omega: [rad/s] angular frequency vector
     :param order: order of derivation
+    :param out: optional output array
     :return: derivated array of fft data
     """
-    return multiply(ffts, np.power(1.j * omega, order))
+    return multiply(ffts, np.power(1.j * omega, order), out=out)
 
-def convert_frf(input_frfs, omega, input_frf_type, output_frf_type):
+
+def convert_frf(input_frfs, omega, input_frf_type, output_frf_type, out=None):
     """ Converting the frf accelerance/mobility/receptance
 
     The most general case is when `input_frfs` is of shape:
        `nr_inputs` * `nr_outputs` * `frf_len`
+    (any number of leading dimensions is supported). The frf types are given as a single type or as
+    an array of types broadcastable to the leading dimensions of `input_frfs`.
+
+    All the frfs are converted with a single broadcast multiplication.
 
-    :param input_frfs:  frequency response function vector (of dim 1, 2 or 3)
+    :param input_frfs:  frequency response function array of shape (..., frf_len)
     :param omega: [rad/s] angular frequency vector
-    :param input_frf_type: 'd' receptance, 'v' mobility, 'a' accelerance (of dim 0, 1, 2)
-    :param output_frf_type: 'd' receptance, 'v' mobility, 'a' accelerance (of dim 0, 1, 2)
-    :return: frequency response function vector (of dim 1, 2 or 3)
+    :param input_frf_type: 'd' receptance, 'v' mobility, 'a' accelerance (or an array of types)
+    :param output_frf_type: 'd' receptance, 'v' mobility, 'a' accelerance (or an array of types)
+    :param out: optional output array (can be input_frfs for an in place conversion)
+    :return: frequency response function array of shape (..., frf_len)
     """
-    # put all data to 3D frf type (nr_inputs * nr_outputs * frf_len)
-    ini_shape = input_frfs.shape
-    if 1 <=len(ini_shape) > 3 :
-        raise Exception('Input frf should be if dimension 3 or smaller')
-    elif len(ini_shape) == 2:
-        input_frfs = np.expand_dims(input_frfs, axis=0)
-
-        if type(input_frf_type) == str:
-            input_frf_type = [ini_shape[0]*[input_frf_type]]
-        else:
-            input_frf_type = [input_frf_type]
-
-        if type(output_frf_type) == str:
-            output_frf_type = [ini_shape[0]*[output_frf_type]]
-        else:
-            output_frf_type = [output_frf_type]
-    elif len(ini_shape) == 1:
-        input_frfs = np.expand_dims(np.expand_dims(input_frfs, axis=0), axis=0)
-        input_frf_type = [[input_frf_type]]
-        output_frf_type = [[output_frf_type]]
-
-    # reshaping of frfs
-    (nr_inputs, nr_outputs, frf_len) = input_frfs.shape
-    nr_frfs = nr_inputs * nr_outputs
-    input_frfs = input_frfs.reshape(nr_frfs,-1)
-
-    # reshaping of input and output frf types
-    input_frf_type = np.asarray(input_frf_type)
-    output_frf_type = np.asarray(output_frf_type)
-    if len(input_frf_type.shape) != 2 or len(output_frf_type.shape) !=2:
-        raise Exception('Input and output frf type should be of dimension 2.')
-    input_frf_type = input_frf_type.flatten()
-    output_frf_type = output_frf_type.flatten()
-    if len(input_frf_type) != nr_frfs or len(output_frf_type) != nr_frfs:
-        raise Exception('Input and output frf type length should correspond to the number frfs.')
+    input_frfs = np.asarray(input_frfs)
+    try:
+        input_code = np.vectorize(_FRF_TYPES.__getitem__, otypes=[int])(input_frf_type)
+        output_code = np.vectorize(_FRF_TYPES.__getitem__, otypes=[int])(output_frf_type)
+    except KeyError:
+        raise Exception('Only frf types: d, v and a are supported.')
 
     try:
-        input_frf_type = [_FRF_TYPES[_] for _ in input_frf_type]
-        output_frf_type = [_FRF_TYPES[_] for _ in output_frf_type]
-    except:
-        raise('Only frf types: d, v and a are supported.')
-
-    # do the conversion
-    output_frfs = np.zeros_like(input_frfs)
-    for i in range(nr_frfs):
-        order = output_frf_type[i] - input_frf_type[i]
-        if (order > 2) or (order <-2):
-            raise Exception('FRF conversion not supported.')
-        output_frfs[i, :] = frequency_derivation(input_frfs[i, :], omega, order=order)
-
-    #reshape back to original shape
-    if len(ini_shape) == 3:
-        return output_frfs.reshape((nr_inputs, nr_outputs, -1))
-    elif len(ini_shape) == 2:
-        return output_frfs.reshape((nr_outputs, -1))
-    elif len(ini_shape) == 1:
-        return output_frfs[0]
-
-
-def correct_time_delay(fft, w, time_delay):
+        order = np.broadcast_to(output_code - input_code, input_frfs.shape[:-1])
+    except ValueError:
+        raise Exception('Input and output frf type length should correspond to the number frfs.')
+    if np.any(np.abs(order) > 2):
+        raise Exception('FRF conversion not supported.')
+
+    orders = np.unique(order)
+    if len(orders) == 1:
+        # the same conversion for all the frfs
+        factor = np.power(1.j * omega, orders[0])
+    else:
+        # factors of the orders -2, -1, 0, 1, 2 indexed for each frf
+        factor = np.power(1.j * omega, np.arange(-2, 3)[:, np.newaxis])[order + 2]
+    return multiply(input_frfs, factor, out=out)
+
+
+class ChannelTransfer(object):
+    """Precomputed complex multiplier of channel spectra
+
+    The frequency conversion (integration/derivation), the time delay correction and the
+    calibration scaling are fused into a single complex factor, computed once; the factor is
+    then applied to the spectra of every block in place (one broadcast multiplication).
+
+    Any of `in_type`, `time_delay` and `scale` can be given for each channel (list); the factor is
+    then of shape (n_channels, n_freq), otherwise of shape (n_freq,).
+
+        :param omega: angular frequency [rad/s]
+        :param in_type: type of the channel spectra, see _FRF_TYPES ('e' or None: no conversion)
+        :param out_type: type of the converted spectra, see _FRF_TYPES
+        :param time_delay: time delay of the channel in seconds (use positive value for a delayed signal)
+        :param scale: calibration scaling (e.g. 1/sensitivity)
+        :param dtype: complex data type of the factor
+    """
+
+    def __init__(self, omega, in_type=None, out_type='a', time_delay=0., scale=1., dtype='complex128'):
+        self.omega = omega
+        self.in_type = in_type
+        self.out_type = out_type
+        self.time_delay = time_delay
+        self.scale = scale
+        self.dtype = np.dtype(dtype)
+        self.factor = self._get_factor()
+
+    def _get_factor(self):
+        """Returns the fused factor or None if the transfer is the identity
+
+        :return: factor
+        """
+        per_channel = [np.ndim(_) != 0 for _ in [self.in_type, self.time_delay, self.scale]]
+        in_type = np.atleast_1d(self.in_type)
+        order = np.array([0 if _ in [None, 'e'] else _FRF_TYPES[self.out_type] - _FRF_TYPES[_]
+                          for _ in in_type])
+        order, time_delay, scale = np.broadcast_arrays(order, np.atleast_1d(self.time_delay),
+                                                       np.atleast_1d(self.scale))
+        if np.all(order == 0) and np.all(time_delay == 0.) and np.all(scale == 1.):
+            return None
+
+        omega = np.asarray(self.omega)
+        factor = scale[:, np.newaxis] * np.ones_like(omega, dtype=self.dtype)
+        if np.any(order != 0):
+            factor *= np.power(1j * omega, order[:, np.newaxis])
+        if np.any(time_delay != 0.):
+            factor *= np.exp(1j * omega * time_delay[:, np.newaxis])
+        if not np.any(per_channel):
+            factor = factor[0]
+        return factor.astype(self.dtype, copy=False)
+
+    def apply(self, ffts):
+        """Applies the transfer to the spectra in place
+
+        :param ffts: spectra of shape (..., n_channels, n_freq) or (..., n_freq) (changed in place)
+        :return: ffts
+        """
+        if self.factor is not None:
+            ffts *= self.factor
+        return ffts
+
+
+def correct_time_delay(fft, w, time_delay, out=None):
     """
     Corrects the ``fft`` with regards to the ``time_delay``.
 
-    :param fft: fft array
+    :param fft: fft array of shape (..., n_freq)
     :param w: angular frequency [rad/s]
-    :param time_delay: time dalay in seconds
+    :param time_delay: time dalay in seconds (or an array of delays, broadcastable to the leading
+                       dimensions of ``fft``)
+    :param out: optional output array (can be fft for an in place correction)
     :return: corrected fft array
     """
-    return fft / (np.exp(1j * w * time_delay))
+    return multiply(fft, np.exp(-1j * w * np.expand_dims(time_delay, -1)), out=out)
 
 
 def PSD(x, dt=1):
-    """ Power spectral density
+    """ Power spectral density (along the last axis)
     :param x: time domain data
     :param dt: delta time
     :return: PSD, freq
     """
-    X = np.fft.rfft(x)
-    freq = np.fft.rfftfreq(len(x), d=dt)
-    X = 2 * dt * np.abs(X.conj() * X / len(x))
+    x = np.asarray(x)
+    X = rfft(x)
+    freq = np.fft.rfftfreq(x.shape[-1], d=dt)
+    X = 2 * dt * np.abs(X.conj() * X / x.shape[-1])
 
     return X, freq
 
 
+def get_czt_factors(samples, f_lo, f_hi, n_lines, sampling_freq):
+    """Precomputes the chirp-z transform factors of the zoom FFT, see czt()
+
+    :param samples: number of time samples
+    :param f_lo: first frequency line [Hz]
+    :param f_hi: last frequency line [Hz]
+    :param n_lines: number of frequency lines (>= 2)
+    :param sampling_freq: sampling frequency [Hz]
+    :return: pre, V, post, fft_len
+    """
+    df = (f_hi - f_lo) / (n_lines - 1)
+    fft_len = 1 << int(np.ceil(np.log2(samples + n_lines - 1)))
+    n = np.arange(max(samples, n_lines), dtype=float)
+    chirp = np.exp(-1j * np.pi * df / sampling_freq * n**2)  # W**(n**2/2)
+
+    pre = np.exp(-2j * np.pi * f_lo / sampling_freq * n[:samples]) * chirp[:samples]
+    v = np.zeros(fft_len, dtype=complex)
+    v[:n_lines] = np.conjugate(chirp[:n_lines])
+    v[fft_len - samples + 1:] = np.conjugate(chirp[1:samples][::-1])
+    V = fft(v)
+    post = chirp[:n_lines]
+    return pre, V, post, fft_len
+
+
+def czt(x, factors):
+    """Chirp-z transform (Bluestein algorithm) of x along the last axis
+
+    The result is the DFT sum of x evaluated at the (equally spaced) frequency lines of the
+    factors, see get_czt_factors(); the amplitude normalization is the same as of np.fft.rfft.
+
+    :param x: time data array of shape (..., samples)
+    :param factors: factors obtained with get_czt_factors()
+    :return: array of shape (..., n_lines)
+    """
+    pre, V, post, fft_len = factors
+    y = ifft(fft(x * pre, fft_len) * V)
+    return y[..., :len(post)] * post
+
+
+def zoom_fft(x, f_lo, f_hi, n_lines, sampling_freq):
+    """Zoom FFT: the spectrum of x (along the last axis) over the band [f_lo, f_hi] only
+
+    The frequency resolution is ``(f_hi - f_lo) / (n_lines - 1)``; this is the same as zero padding
+    the data, but only the lines in the band are computed.
+
+    :param x: time data array of shape (..., samples)
+    :param f_lo: first frequency line [Hz]
+    :param f_hi: last frequency line [Hz]
+    :param n_lines: number of frequency lines (>= 2)
+    :param sampling_freq: sampling frequency [Hz]
+    :return: spectrum of shape (..., n_lines), frequency vector
+    """
+    factors = get_czt_factors(np.shape(x)[-1], f_lo, f_hi, n_lines, sampling_freq)
+    return czt(x, factors), np.linspace(f_lo, f_hi, n_lines)
+
+
 def fft_adjusted_lower_limit(x, lim, nr):
     """
     Compute the fft of complex matrix x with adjusted summation limits:
@@ -187,8 +418,8 @@ def fft_adjusted_lower_limit(x, lim, nr):
 
     n = np.arange(-nr + 1, nr)
 
-    a = np.fft.fft(x, n=nf).real[n]
-    b = np.fft.fft(x[:lim], n=nf).real[n]
+    a = fft(x, n=nf).real[n]
+    b = fft(x[:lim], n=nf).real[n]
     c = x[lim].conj() * np.exp(1j * 2 * np.pi * n * lim / nf)
 
     res = 2 * (a - b) - c
@@ -196,39 +427,149 @@ def fft_adjusted_lower_limit(x, lim, nr):
     return res[:nr][::-1], res[nr - 1:]
 
 
+def largest_prime_factor(n):
+    """Returns the largest prime factor of a positive integer
+
+    See: http://stackoverflow.com/questions/23287/largest-prime-factor-of-a-number/412942#412942
+
+    :param n: positive integer
+    :return: largest prime factor (1 for n=1)
+    """
+    n = int(n)
+    largest = 1
+    d = 2
+    while d * d <= n:
+        while n % d == 0:
+            largest = d
+            n //= d
+        d += 1
+    if n > 1:
+        largest = n
+    return largest
+
+
+def is_fast_len(n, max_prime=5):
+    """Returns True if the FFT of length n is fast (all the prime factors are up to `max_prime`)
+
+    :param n: FFT length
+    :param max_prime: largest allowed prime factor
+    :return: bool
+    """
+    return n > 0 and largest_prime_factor(n) <= max_prime
+
+
+def next_fast_len(n, max_prime=5):
+    """Returns the smallest fast FFT length >= n (the 2/3/5-smooth number for the default `max_prime`)
+
+    :param n: minimal FFT length
+    :param max_prime: largest allowed prime factor
+    :return: FFT length
+    """
+    n = int(n)
+    if n <= 6:
+        return max(n, 1)
+    if max_prime != 5:
+        while not is_fast_len(n, max_prime):
+            n += 1
+        return n
+
+    best = 2 * n
+    p5 = 1
+    while p5 < n:
+        p35 = p5
+        while p35 < n:
+            # the smallest power of 2 that gives a length >= n
+            p2 = 1 << (-(-n // p35) - 1).bit_length()
+            length = p2 * p35
+            if length == n:
+                return n
+            best = min(best, length)
+            p35 *= 3
+        best = min(best, p35)
+        p5 *= 5
+    return min(best, p5)
+
+
+def prev_fast_len(n, max_prime=5):
+    """Returns the largest fast FFT length <= n (the 2/3/5-smooth number for the default `max_prime`)
+
+    :param n: maximal FFT length
+    :param max_prime: largest allowed prime factor
+    :return: FFT length
+    """
+    n = int(n)
+    if n <= 6:
+        return max(n, 1)
+    if max_prime != 5:
+        while not is_fast_len(n, max_prime):
+            n -= 1
+        return n
+
+    best = 1
+    p5 = 1
+    while p5 <= n:
+        p35 = p5
+        while p35 <= n:
+            # the largest power of 2 that gives a length <= n
+            length = (1 << ((n // p35).bit_length() - 1)) * p35
+            if length == n:
+                return n
+            best = max(best, length)
+            p35 *= 3
+        p5 *= 5
+    return best
+
+
+def fast_frf_len(frf_len, mode='trim', low_lim=0, max_prime=5):
+    """Returns the single-sided FRF length for a fast two-sided (inverse) FFT
+
+    The two-sided length of the frequency lines from `low_lim` on is ``2 * (frf_len - low_lim - 1)``.
+
+    :param frf_len: number of single-sided frequency lines
+    :param mode: 'trim' (the longest fast length <= frf_len) or 'pad' (the shortest fast length >= frf_len)
+    :param low_lim: lower limit index of the frequency lines
+    :param max_prime: largest allowed prime factor
+    :return: number of single-sided frequency lines
+    """
+    half = frf_len - low_lim - 1
+    if mode == 'trim':
+        half = prev_fast_len(half, max_prime)
+    elif mode == 'pad':
+        half = next_fast_len(half, max_prime)
+    else:
+        raise Exception('wrong mode given %s (can be %s)' % (mode, ['trim', 'pad']))
+    return half + low_lim + 1
+
+
+def adjust_frf_len(frf, mode='trim', low_lim=0, max_prime=5):
+    """Trims or zero pads the FRF band (along the last axis) for a fast two-sided (inverse) FFT, see fast_frf_len()
+
+    :param frf: frequency response function array of shape (..., frf_len)
+    :param mode: 'trim' (the highest frequency lines are removed) or 'pad' (zero lines are added)
+    :param low_lim: lower limit index of the frequency lines
+    :param max_prime: largest allowed prime factor
+    :return: frequency response function array of shape (..., fast_frf_len)
+    """
+    frf = np.asarray(frf)
+    frf_len = fast_frf_len(frf.shape[-1], mode, low_lim, max_prime)
+    if frf_len <= frf.shape[-1]:
+        return frf[..., :frf_len]
+    padding = [(0, 0)] * (frf.ndim - 1) + [(0, frf_len - frf.shape[-1])]
+    return np.pad(frf, padding, mode='constant')
+
+
 def check_fft_for_speed(data_length, exception_if_prime_above=20):
     """To avoid slow FFT, raises an exception if largest prime above `exception_if_prime_above`.
 
-    See: http://stackoverflow.com/questions/23287/largest-prime-factor-of-a-number/
+    See next_fast_len() and fast_frf_len() to select a fast length.
 
     :param data_length: length of data for frf
     :param exception_if_prime_above: raise exception if the largest prime number is above
     :return: none
     """
-
-    def prime_factors(n):
-        """Returns all prime factors of a positive integer
-
-        See: http://stackoverflow.com/questions/23287/largest-prime-factor-of-a-number/412942#412942
-
-        :param n: lenght
-        :return: array of prime numbers
-        """
-        factors = []
-        d = 2
-        while n > 1:
-            while n % d == 0:
-                factors.append(d)
-                n /= d
-            d += 1
-            if d * d > n:
-                if n > 1:
-                    factors.append(n)
-                break
-        return factors
-
-    if np.max(prime_factors(data_length)) > exception_if_prime_above:
-        raise Exception('Change the number of time/frequency points or the FFT will run slow.')
+    if not is_fast_len(data_length, exception_if_prime_above):
+        raise Exception('Change the number of time/frequency points or the FFT will run slow '
+                        '(next fast length: %d).' % next_fast_len(data_length, exception_if_prime_above))
 
 
 def irfft_adjusted_lower_limit(x, low_lim, indices):
@@ -247,12 +588,35 @@ def irfft_adjusted_lower_limit(x, low_lim, indices):
     """
 
     nf = 2 * (x.shape[1] - 1)
-    a = (np.fft.irfft(x, n=nf)[:, indices]) * nf
-    b = (np.fft.irfft(x[:, :low_lim], n=nf)[:, indices]) * nf
+    a = (irfft(x, n=nf)[:, indices]) * nf
+    b = (irfft(x[:, :low_lim], n=nf)[:, indices]) * nf
     return a - b
 
 
+def test_fft_backends():
+    """All the available backends must give the numpy transforms."""
+    x = np.random.RandomState(0).randn(4, 1000)
+    X = np.fft.rfft(x)
+    backend = dict(_fft_backend)
+    try:
+        for name in get_available_fft_backends():
+            set_fft_backend(name, workers=1)
+            np.testing.assert_allclose(rfft(x), X, atol=1e-9)
+            np.testing.assert_allclose(irfft(rfft(x), n=x.shape[-1]), x, atol=1e-9)
+    finally:
+        _fft_backend.update(backend)
+
+
+def test_PSD():
+    x = np.sin(2 * np.pi * 10 * np.arange(100) * 0.01)
+    X, freq = PSD(list(x), dt=0.01)
+    np.testing.assert_allclose(PSD(x, dt=0.01)[0], X)
+    assert freq[np.argmax(X)] == 10.
+
+
 if __name__ == '__main__':
     plot_figure = False
     # check_fft_for_speed(4) #fast
     # check_fft_for_speed(59612) #slow
+    test_fft_backends()
+    test_PSD()
@@ -19,7 +19,9 @@
 """Module for FRF signal processing.
 
 Classes:
-    class FRF:      Handles 2 channel frequency response function.
+    class FRF:              Handles 2 channel frequency response function.
+    class MultiChannelFRF:  Handles one excitation and several response channels at once.
+    class MIMOFRF:          Handles several excitation and response channels (spectral matrices).
 
 Info:
     2014, jul, janko.slavic@fs.uni-lj.si: polishing and significant re-write
@@ -35,14 +37,35 @@ Info:
     @contact: janko.slavic@fs.uni-lj.si, martin.cesnik@fs.uni-lj.si, matjaz.mrsnik@ladisk.si
 """
 
+import threading
+from collections import OrderedDict
+
 import numpy as np
 import OpenModal.fft_tools as fft_tools
+import OpenModal.time_archive as time_archive
 
 _EXC_TYPES = ['f', 'a', 'v', 'd', 'e']  # force for EMA and kinematics for OMA
 _RESP_TYPES = ['a', 'v', 'd', 'e']  # acceleration, velocity, displacement, strain
 _FRF_TYPES = ['H1', 'H2', 'vector', 'OMA']
 _WGH_TYPES = ['None', 'Linear', 'Exponential']
 _WINDOWS = ['None', 'Hann', 'Hamming', 'Force', 'Exponential']
+_DTYPES = ['float64', 'float32']  # time data type; spectra are complex128 or complex64
+_SPECTRA = ['all', 'frf', 'coherence']  # averaged spectra: all, needed by frf_type, needed by frf_type and coherence
+
+_AVERAGED_SPECTRA = ['S_FX', 'S_FF', 'S_XX', 'S_XF', 'S_X', 'S_F']
+_FRF_TYPE_SPECTRA = {'H1': ['S_FX', 'S_FF'],
+                     'H2': ['S_XX', 'S_XF'],
+                     'vector': ['S_X', 'S_F'],
+                     'OMA': ['S_XX', 'S_XF']}
+_COHERENCE_SPECTRA = ['S_FX', 'S_FF', 'S_XX', 'S_XF']
+
+_MIMO_FRF_TYPES = ['H1', 'H2']
+_MIMO_SPECTRA = ['S_FF', 'S_XF', 'S_XX']  # spectral matrices
+_MIMO_FRF_TYPE_SPECTRA = {'H1': ['S_FF', 'S_XF'],
+                          'H2': ['S_XX', 'S_XF']}
+
+_CACHE_MAX_BYTES = 64 * 2**20  # memory budget of the window and frequency axis cache
+_SEGMENTS_MAX_BYTES = 64 * 2**20  # memory budget of the windowed segments and their spectra in one batch
 
 _DIRECTIONS = ['scalar', '+x', '+y', '+z', '-x', '-y', '-z']
 _DIRECTIONS_NR = [0, 1, 2, 3, -1, -2 - 3]
@@ -53,6 +76,140 @@ def direction_dict():
     return dir_dict
 
 
+class _ArrayCache(object):
+    """Least recently used cache of read-only arrays with a bounded memory budget
+
+        :param max_bytes: memory budget in bytes; the least recently used entries are removed first
+    """
+
+    def __init__(self, max_bytes=_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, function):
+        """Returns the cached value for the key; if not available, it is computed with function()
+
+        :param key: hashable key
+        :param function: function returning an array or a tuple of arrays and scalars
+        :return: cached value (the arrays are read-only)
+        """
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                return self._data[key][0]
+
+        value = function()
+        values = value if isinstance(value, tuple) else (value,)
+        nbytes = 0
+        for _ in values:
+            if isinstance(_, np.ndarray):
+                _.flags.writeable = False
+                nbytes += _.nbytes
+
+        with self._lock:
+            if nbytes <= self.max_bytes and key not in self._data:
+                self._data[key] = (value, nbytes)
+                self.nbytes += nbytes
+                while self.nbytes > self.max_bytes:
+                    self.nbytes -= self._data.popitem(last=False)[1][1]
+        return value
+
+    def clear(self):
+        """Removes all the cached values."""
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+
+_cache = _ArrayCache()
+
+
+def clear_cache():
+    """Clears the cache of windows and frequency axes shared by all FRF objects."""
+    _cache.clear()
+
+
+def get_window(window, samples, dtype='float64'):
+    """Returns the (cached, read-only) window time series and amplitude normalization term
+
+    :param window: window string, see _WINDOWS
+    :param samples: number of samples
+    :param dtype: data type of the window time series
+    :return: w, amplitude_norm
+    """
+    def _get():
+        w, amplitude_norm = _get_window(window, samples)
+        return w.astype(dtype, copy=False), amplitude_norm
+
+    return _cache.get(('window', window, samples, np.dtype(dtype).str), _get)
+
+
+def _get_window(window, samples):
+    """Computes the window time series and amplitude normalization term
+
+    :param window: window string, see _WINDOWS
+    :param samples: number of samples
+    :return: w, amplitude_norm
+    """
+    window = window.split(':')
+
+    if window[0] in ['Hamming', 'Hann']:
+        w = np.hanning(samples)
+    elif window[0] == 'Force':
+        w = np.zeros(samples)
+        force_window = float(window[1])
+        to1 = int(force_window * samples)
+        w[:to1] = 1.
+    elif window[0] == 'Exponential':
+        w = np.arange(samples)
+        exponential_window = float(window[1])
+        w = np.exp(np.log(exponential_window) * w / (samples - 1))
+    else:  # window = 'None'
+        w = np.ones(samples)
+
+    if window[0] == 'Force':
+        amplitude_norm = 2 / len(w)
+    else:
+        amplitude_norm = 2 / float(np.sum(w))
+
+    return w, amplitude_norm
+
+
+def get_f_axis(fft_len, sampling_freq):
+    """Returns the (cached, read-only) frequency vector in Hz
+
+    :param fft_len: the length of the FFT
+    :param sampling_freq: sampling frequency
+    :return: frequency vector in Hz
+    """
+    return _cache.get(('f_axis', fft_len, sampling_freq),
+                      lambda: np.fft.rfftfreq(fft_len, 1. / sampling_freq))
+
+
+def get_w_axis(fft_len, sampling_freq):
+    """Returns the (cached, read-only) angular frequency vector in rad/s
+
+    :param fft_len: the length of the FFT
+    :param sampling_freq: sampling frequency
+    :return: angular frequency vector in rad/s
+    """
+    return _cache.get(('w_axis', fft_len, sampling_freq),
+                      lambda: 2 * np.pi * get_f_axis(fft_len, sampling_freq))
+
+
+def get_band_f_axis(f_band, band_lines):
+    """Returns the (cached, read-only) frequency vector of the band in Hz
+
+    :param f_band: frequency band (f_lo, f_hi) in Hz
+    :param band_lines: number of frequency lines
+    :return: frequency vector in Hz
+    """
+    return _cache.get(('band_f_axis', tuple(f_band), band_lines),
+                      lambda: np.linspace(f_band[0], f_band[1], band_lines))
+
+
 class FRF:
     """
     Perform Dual Channel Spectral Analysis
@@ -64,10 +221,16 @@ class FRF:
         :param resp_window: response window, see _WINDOWS
         :param resp_delay: response time delay (in seconds) with regards to the excitation
                            (use positive value for a delayed signal)
+        :param exc_scale: excitation calibration scaling (e.g. 1/sensitivity)
+        :param resp_scale: response calibration scaling (e.g. 1/sensitivity)
         :param weighting: weighting type for average calculation, see _WGH_TYPES
         :param n_averages: number of measurements, used for averaging
         :param fft_len: the length of the FFT
                         If None then the freq length matches the time length
+                        If 'fast' then the shortest fast (2/3/5-smooth) length not shorter than the time
+                        length is used (zero-padding), see fft_tools.next_fast_len(); the frequency
+                        axis is then denser than the one of the time length (the GUI sets it with
+                        the 'fft_len' preference)
         :param nperseg: int, optional
                         Length of each segment.
                         If None, then the length corresponds to the data length
@@ -75,7 +238,26 @@ class FRF:
                          Number of points to overlap between segments.
                          If None,  ``noverlap = nperseg / 2``.  Defaults to None.
         :param archive_time_data: archive the time data (this can consume a lot of memory)
+                                  False: no archive
+                                  True or 'List': all the data in memory
+                                  'Ring:100': the last 100 measurements in memory
+                                  'Npy:directory': all the data in memory-mapped .npy files on disk
+                                  'HDF5:filename.h5': all the data in a compressed HDF5 file on disk
+                                  (see time_archive)
         :param frf_type: default frf type returned at self.get_frf(), see _FRF_TYPES
+        :param spectra: which spectra are averaged, see _SPECTRA
+                        'all': all the spectra (default)
+                        'frf': only the spectra needed by `frf_type`
+                        'coherence': the spectra needed by `frf_type` and by the coherence
+        :param f_band: optional frequency band (f_lo, f_hi) in Hz; if given, the spectra are computed
+                       only over the band with the chirp-z transform (zoom FFT), see fft_tools.czt()
+        :param band_lines: number of frequency lines in `f_band` (sets the frequency resolution);
+                           if None, the resolution is the same as of the full FFT of `fft_len`
+        :param dtype: data type of the time data, see _DTYPES
+                      With 'float32' the spectra are complex64, which halves the memory and bandwidth
+                      (24-bit DAQ data fits into float32). Compared to the 'float64' path, the maximal
+                      relative error of the averaged H1 over all frequency lines is typically below 1e-3
+                      (see dtype_accuracy_check()).
     """
 
     def __init__(self, sampling_freq,
@@ -84,12 +266,17 @@ class FRF:
                  exc_type='f', resp_type='a',
                  exc_window='Force:0.01', resp_window='Exponential:0.01',
                  resp_delay=0.,
+                 exc_scale=1., resp_scale=1.,
                  weighting='Exponential', n_averages=1,
                  fft_len=None,
                  nperseg=None,
                  noverlap=None,
                  archive_time_data=False,
-                 frf_type='H1'):
+                 frf_type='H1',
+                 spectra='all',
+                 dtype='float64',
+                 f_band=None,
+                 band_lines=None):
         """
         initiates the Data class:
 
@@ -101,13 +288,20 @@ class FRF:
         :param exc_window: excitation window, see _WINDOWS
         :param resp_window: response window, see _WINDOWS
         :param resp_delay: response time delay (in seconds) with regards to the excitation.
+        :param exc_scale: excitation calibration scaling
+        :param resp_scale: response calibration scaling
         :param weighting: weighting type for average calculation, see _WGH_TYPES
         :param n_averages: number of measurements, used for averaging
-        :param fft_len: the length of the FFT (zero-padding if longer than length of data)
+        :param fft_len: the length of the FFT (zero-padding if longer than length of data) or 'fast'
         :param nperseg: optional segment length, by default one segment is analyzed
         :param noverlap: optional segment overlap, by default ``noverlap = nperseg / 2``
-        :param archive_time_data: archive the time data (this can consume a lot of memory)
+        :param archive_time_data: archive the time data: False, True, 'List', 'Ring:N', 'Npy:directory'
+                                  or 'HDF5:filename' (see time_archive)
         :param frf_type: default frf type returned at self.get_frf(), see _FRF_TYPES
+        :param spectra: which spectra are averaged, see _SPECTRA
+        :param dtype: data type of the time data, see _DTYPES
+        :param f_band: optional frequency band (f_lo, f_hi) in Hz, computed with the zoom FFT
+        :param band_lines: number of frequency lines in `f_band`
         :return:
         """
 
@@ -119,13 +313,17 @@ class FRF:
         self.exc_window = exc_window
         self.resp_window = resp_window
         self.resp_delay = resp_delay
+        self.exc_scale = exc_scale
+        self.resp_scale = resp_scale
         self.frf_type = frf_type
+        self.spectra = spectra
+        self.dtype = np.dtype(dtype)
+        self.complex_dtype = np.result_type(self.dtype, np.complex64)
 
         # ini
         self.exc = np.array([])
         self.resp = np.array([])
-        self.exc_archive = []
-        self.resp_archive = []
+        self.exc_archive, self.resp_archive = time_archive.get_stores(archive_time_data)
         self.samples = None
 
         # set averaging and weighting
@@ -133,15 +331,41 @@ class FRF:
         self.weighting = weighting
         self.frf_norm = 1.
 
+        # averaged spectra (allocated at the first measurement)
+        for name in _AVERAGED_SPECTRA:
+            setattr(self, name, None)
+
         # fft length
         self.fft_len = fft_len
         self.nperseg = nperseg
         self.noverlap = noverlap
+        self.f_band = f_band
+        self.band_lines = band_lines
+
+        # estimators computed together, cached for the measurement `_estimators_meas`
+        self._estimators = None
+        self._estimators_meas = None
+
+        # samples of the incomplete segment when the data is added in chunks
+        self.exc_stream = None
+        self.resp_stream = None
 
         # save time data
         self.archive_time_data = archive_time_data
 
         # error checking
+        self._check_types()
+
+        self.curr_meas = 0
+
+        if exc is not None and resp is not None:
+            self.add_data(exc, resp)
+
+    def _check_types(self):
+        """Checks the frf, weighting, excitation, response and window types
+
+        :return:
+        """
         if not (self.frf_type in _FRF_TYPES):
             raise Exception('wrong FRF type given %s (can be %s)'
                             % (self.frf_type, _FRF_TYPES))
@@ -166,20 +390,35 @@ class FRF:
             raise Exception('wrong response window type given %s (can be %s)'
                             % (self.resp_window, _WINDOWS))
 
-        self.curr_meas = np.int(0)
+        if not (self.spectra in _SPECTRA):
+            raise Exception('wrong spectra given %s (can be %s)'
+                            % (self.spectra, _SPECTRA))
 
-        if exc is not None and resp is not None:
-            self.add_data(exc, resp)
+        if not (self.dtype.name in _DTYPES):
+            raise Exception('wrong dtype given %s (can be %s)'
+                            % (self.dtype, _DTYPES))
+
+        if self.f_band is not None:
+            f_lo, f_hi = self.f_band
+            if not (0 <= f_lo < f_hi <= self.sampling_freq / 2):
+                raise Exception('wrong frequency band given %s (can be within [0, %s])'
+                                % (self.f_band, self.sampling_freq / 2))
+            if self.band_lines is not None and self.band_lines < 2:
+                raise Exception('wrong number of band lines given %s (at least 2)' % self.band_lines)
 
     def add_data_for_overlapping(self, exc, resp):
         """Adds data and prepares accelerance FRF with the overlapping options
 
+        All the segments are processed at once (Welch method): the segments are strided views
+        of the time data, they are windowed and transformed together and the spectra are
+        reduced with a single weighted sum. The time data is not changed.
+
         :param exc: excitation array
         :param resp: response array
         :return:
         """
         self._add_to_archive(exc, resp)
-        samples = len(exc)
+        samples = np.shape(exc)[-1]
         if self.nperseg is None:
             self.nperseg = samples
         elif self.nperseg >= samples:
@@ -191,24 +430,101 @@ class FRF:
 
         self._ini_lengths_and_windows(self.nperseg)
         step = self.nperseg - self.noverlap
-        indices = np.arange(0, samples - self.nperseg + 1, step)
-        self.n_averages = len(indices)
-        for k, ind in enumerate(indices):
-            self.exc = exc[ind:ind + self.nperseg]
-            self.resp = resp[ind:ind + self.nperseg]
+        n_segments = (samples - self.nperseg) // step + 1
+        self.n_averages = n_segments
+        self._add_segments(exc, resp, n_segments, step)
+
+    def add_data_stream(self, exc, resp):
+        """Adds a chunk of continuously acquired data (e.g. a block from the DAQ)
 
-            # add windows
-            self._apply_window()
+        The chunks can be of any length. Every time a segment of `nperseg` samples (overlapped by
+        `noverlap` samples) is completed, it is added to the averaged spectra; the samples of the
+        incomplete segment are kept until the next chunk arrives.
+
+        :param exc: excitation array (chunk)
+        :param resp: response array (chunk)
+        :return: number of segments completed (and averaged) with this chunk
+        """
+        if self.nperseg is None:
+            raise ValueError('nperseg must be given to add data in chunks.')
+        if self.noverlap is None:
+            self.noverlap = self.nperseg // 2
+        elif self.noverlap >= self.nperseg:
+            raise ValueError('noverlap must be less than nperseg.')
+
+        self._add_to_archive(exc, resp)
+        if self.exc_stream is not None:
+            exc = np.concatenate((self.exc_stream, exc), axis=-1)
+            resp = np.concatenate((self.resp_stream, resp), axis=-1)
+        samples = np.shape(exc)[-1]
+
+        step = self.nperseg - self.noverlap
+        if samples >= self.nperseg:
+            n_segments = (samples - self.nperseg) // step + 1
+            self._ini_lengths_and_windows(self.nperseg)
+            self._add_segments(exc, resp, n_segments, step)
+        else:
+            n_segments = 0
+
+        # keep the samples of the next (incomplete) segment
+        self.exc_stream = np.array(exc[..., n_segments * step:], dtype=self.dtype)
+        self.resp_stream = np.array(resp[..., n_segments * step:], dtype=self.dtype)
+
+        return n_segments
+
+    def _add_segments(self, exc, resp, n_segments, step):
+        """Adds the overlapping segments of the time data to the averaged spectra
+
+        :param exc: excitation array
+        :param resp: response array
+        :param n_segments: number of segments
+        :param step: number of samples between the starts of the segments
+        :return:
+        """
+        exc_segments = self._get_segments(exc, n_segments, step)
+        resp_segments = self._get_segments(resp, n_segments, step)
+
+        # the segments are windowed and transformed in batches of at most _SEGMENTS_MAX_BYTES
+        fft_len = self.fft_len if isinstance(self.fft_len, int) else self.nperseg
+        channels = exc_segments[0].size // self.nperseg + resp_segments[0].size // self.nperseg
+        segment_bytes = channels * (self.nperseg * self.dtype.itemsize +
+                                    (fft_len // 2 + 1) * self.complex_dtype.itemsize)
+        batch = max(1, _SEGMENTS_MAX_BYTES // segment_bytes)
+
+        for start in range(0, n_segments, batch):
+            # add windows to the (batch, ..., nperseg) segments
+            self.exc = exc_segments[start:start + batch] * self.exc_window_data
+            self.resp = resp_segments[start:start + batch] * self.resp_window_data
 
             # go into freq domain
             self._get_fft()
 
             # get averaged accelerance and coherence
-            self._get_frf_av()
+            self._get_frf_av_segments()
 
             # measurement number counter
-            self.curr_meas += 1
-            self._data_available = True
+            self.curr_meas += self.exc.shape[0]
+
+        # keep the last segment as the most recent measurement data
+        self.exc = self.exc[-1].copy()
+        self.resp = self.resp[-1].copy()
+        self.Exc = self.Exc[-1].copy()
+        self.Resp = self.Resp[-1].copy()
+
+        self._data_available = True
+
+    def _get_segments(self, x, n_segments, step):
+        """Returns the overlapping segments of the time data as a strided view (no data is copied)
+
+        :param x: time data array of shape (..., samples)
+        :param n_segments: number of segments
+        :param step: number of samples between the starts of the segments
+        :return: read-only array of shape (n_segments, ..., nperseg)
+        """
+        x = np.asarray(x, dtype=self.dtype)
+        return np.lib.stride_tricks.as_strided(x, shape=(n_segments,) + x.shape[:-1] + (self.nperseg,),
+                                               strides=(step * x.strides[-1],) + x.strides,
+                                               writeable=False)
 
     def add_data(self, exc, resp):
         """Adds data and prepares accelerance FRF
@@ -219,9 +535,9 @@ class FRF:
         """
         # add time data
         self._add_to_archive(exc, resp)
-        self.exc = exc
-        self.resp = resp
-        self._ini_lengths_and_windows(len(self.exc))
+        self.exc = np.asarray(exc, dtype=self.dtype)
+        self.resp = np.asarray(resp, dtype=self.dtype)
+        self._ini_lengths_and_windows(self.exc.shape[-1])
 
         # add windows
         self._apply_window()
@@ -244,7 +560,8 @@ class FRF:
         if not self._data_available:
             raise Exception('No data has been added yet!')
 
-        return self.get_f_axis()[1]
+        f_axis = self.get_f_axis()
+        return f_axis[1] - f_axis[0]
 
     def get_f_axis(self):
         """
@@ -254,7 +571,9 @@ class FRF:
         if not self._data_available:
             raise Exception('No data has been added yet!')
 
-        return np.fft.rfftfreq(self.fft_len, 1. / self.sampling_freq)
+        if self.f_band is not None:
+            return get_band_f_axis(self.f_band, self.band_lines)
+        return get_f_axis(self.fft_len, self.sampling_freq)
 
     def get_t_axis(self):
         """Returns time axis.
@@ -278,32 +597,12 @@ class FRF:
     def _get_window_sub(self, window='None'):
         """Returns the window time series and amplitude normalization term
 
+        The windows are cached and shared between FRF objects, see get_window().
+
         :param window: window string
         :return: w, amplitude_norm
         """
-        window = window.split(':')
-
-        if window[0] in ['Hamming', 'Hann']:
-            w = np.hanning(self.samples)
-        elif window[0] == 'Force':
-            w = np.zeros(self.samples)
-            force_window = float(window[1])
-            to1 = np.long(force_window * self.samples)
-            w[:to1] = 1.
-        elif window[0] == 'Exponential':
-            w = np.arange(self.samples)
-            exponential_window = float(window[1])
-            w = np.exp(np.log(exponential_window) * w / (self.samples - 1))
-        else:  # window = 'None'
-            w = np.ones(self.samples)
-
-
-        if window[0] == 'Force':
-            amplitude_norm = 2 / len(w)
-        else:
-            amplitude_norm = 2 / np.sum(w)
-
-        return w, amplitude_norm
+        return get_window(window, self.samples, self.dtype)
 
     def _get_fft(self):
         """Calculates the fft ndarray of the most recent measurement data
@@ -311,23 +610,64 @@ class FRF:
         :return:
         """
         # define FRF - related variables (only for the first measurement)
-
         if self.curr_meas == 0:
-            if self.fft_len is None:
-                self.fft_len = self.samples
-            self.w_axis = 2 * np.pi * np.fft.rfftfreq(self.fft_len, 1. / self.sampling_freq)
+            self._ini_fft()
+
+        self.Exc = self._rfft(self.exc)
+        self.Resp = self._rfft(self.resp)
 
-        self.Exc = np.fft.rfft(self.exc, self.fft_len)
-        self.Resp = np.fft.rfft(self.resp, self.fft_len)
+        # calibrate, convert response to 'a' type and correct delay (in place)
+        self.exc_transfer.apply(self.Exc)
+        self.resp_transfer.apply(self.Resp)
 
-        if self.resp_type != 'e':  # if not strain
-            # convert response to 'a' type
-            self.Resp = fft_tools.convert_frf(self.Resp, self.w_axis, input_frf_type=self.resp_type,
-                                              output_frf_type='a')
+    def _ini_fft(self):
+        """Sets the fft length, the angular frequency vector and the channel transfers (at the first measurement)
+
+        :return:
+        """
+        if self.fft_len is None:
+            self.fft_len = self.samples
+        elif self.fft_len == 'fast':
+            self.fft_len = fft_tools.next_fast_len(self.samples)
+        if self.f_band is None:
+            self.w_axis = get_w_axis(self.fft_len, self.sampling_freq)
+        else:
+            if self.band_lines is None:
+                # the frequency resolution of the full fft
+                self.band_lines = int(round((self.f_band[1] - self.f_band[0]) * self.fft_len / self.sampling_freq)) + 1
+            self.w_axis = 2 * np.pi * get_band_f_axis(self.f_band, self.band_lines)
+            self._czt_factors = _cache.get(('czt', self.samples, tuple(self.f_band), self.band_lines,
+                                            self.sampling_freq),
+                                           lambda: fft_tools.get_czt_factors(self.samples, self.f_band[0],
+                                                                             self.f_band[1], self.band_lines,
+                                                                             self.sampling_freq))
+        self.exc_transfer, self.resp_transfer = self._get_transfers()
+
+    def _rfft(self, x):
+        """Returns the spectra of x along the last axis (over `f_band` if given)
+
+        :param x: time data array of shape (..., samples)
+        :return: spectra of shape (..., n_freq)
+        """
+        if self.f_band is None:
+            X = fft_tools.rfft(x, self.fft_len, axis=-1)
+        else:
+            X = fft_tools.czt(x, self._czt_factors)
+        return X.astype(self.complex_dtype, copy=False)
 
-            # correct delay
-        if self.resp_delay != 0.:
-            self.Exc = fft_tools.correct_time_delay(self.Exc, self.w_axis, self.resp_delay)
+    def _get_transfers(self):
+        """Returns the excitation and response channel transfers
+
+        The excitation is only calibrated. The response is calibrated, converted to 'a' type and
+        its delay is corrected (this is the same as correcting the excitation, the FRF estimators do not change).
+
+        :return: exc_transfer, resp_transfer (see fft_tools.ChannelTransfer)
+        """
+        exc_transfer = fft_tools.ChannelTransfer(self.w_axis, scale=self.exc_scale, dtype=self.complex_dtype)
+        resp_transfer = fft_tools.ChannelTransfer(self.w_axis, in_type=self.resp_type, out_type='a',
+                                                  time_delay=self.resp_delay, scale=self.resp_scale,
+                                                  dtype=self.complex_dtype)
+        return exc_transfer, resp_transfer
 
     def get_ods_frf(self):
         """Operational deflection shape averaged estimator
@@ -340,6 +680,7 @@ class FRF:
 
         :return: ODS FRF estimator
         """
+        self._check_spectra('S_XX', 'S_XF')
         # 2 / self.samples added for proper amplitude
         # TODO check for proper norming if window changed
         return 2 / self.samples * (np.sqrt(self.S_XX) * self.S_XF / np.abs(self.S_XF))
@@ -356,6 +697,7 @@ class FRF:
         if last:
             amp = np.abs(self.Resp)
         else:
+            self._check_spectra('S_XX')
             amp = np.sqrt(np.abs(self.S_XX))
 
         if amplitude_spectrum:
@@ -375,6 +717,7 @@ class FRF:
         if last:
             amp = np.abs(self.Exc)
         else:
+            self._check_spectra('S_FF')
             amp = np.sqrt(np.abs(self.S_FF))
 
         if amplitude_spectrum:
@@ -387,6 +730,7 @@ class FRF:
 
         :return: H1 FRF estimator
         """
+        self._check_spectra('S_FX', 'S_FF')
         return self.frf_norm * self.S_FX / self.S_FF
 
     def get_H2(self):
@@ -394,6 +738,7 @@ class FRF:
 
         :return: H2 FRF estimator
         """
+        self._check_spectra('S_XX', 'S_XF')
         return self.frf_norm * self.S_XX / self.S_XF
 
     def get_Hv(self):
@@ -405,6 +750,7 @@ class FRF:
 
         :return: Hv FRF estimator
         """
+        self._check_spectra(*_COHERENCE_SPECTRA)
         k = 1  # ratio of the spectra of measurement noises
         return self.frf_norm * ((self.S_XX - k * self.S_FF + np.sqrt(
             (k * self.S_FF - self.S_XX) ** 2 + 4 * k * np.conj(self.S_FX) * self.S_FX)) / (2 * self.S_XF))
@@ -414,6 +760,7 @@ class FRF:
 
         :return: FRF vector estimator
         """
+        self._check_spectra('S_X', 'S_F')
         return self.frf_norm * self.S_X / self.S_F
 
     def get_FRF(self):
@@ -427,7 +774,7 @@ class FRF:
             return self.get_H2()
         if self.frf_type == 'vector':
             return self.get_FRF_vector()
-        if self.frf_type == 'ODS':
+        if self.frf_type == 'OMA':
             return self.get_ods_frf()
 
     def get_coherence(self):
@@ -435,11 +782,70 @@ class FRF:
 
         :return: coherence
         """
-        return np.abs(self.get_H1() / self.get_H2())
+        self._check_spectra(*_COHERENCE_SPECTRA)
+        return np.abs(self.S_FX)**2 / np.abs(self.S_FF * self.S_XX)
+
+    def get_estimators(self):
+        """Returns the H1, H2, Hv, coherence and ODS FRF estimators, computed together
+
+        The estimators are computed in a single pass over the averaged spectra and cached until
+        new data is added; repeated calls (e.g. plot refreshes) return the same read-only arrays.
+        The H1, H2, Hv and ODS estimators are views of one contiguous array. The single getters
+        (get_H1, get_coherence, ...) compute only their estimator and return a new (writable) array.
+
+        Literature:
+            [1] Kihong and Hammond: Fundamentals of Signal Processing for
+                Sound and Vibration Engineers, page 293.
+            [2] Schwarz, Brian, and Mark Richardson. Measurements required for displaying
+                operating deflection shapes. Presented at IMAC XXII January 26 (2004): 29.
+
+        :return: dict with 'H1', 'H2', 'Hv', 'coherence' and 'ODS' keys
+        """
+        if self._estimators is not None and self._estimators_meas == self.curr_meas:
+            return self._estimators
+        self._check_spectra(*_COHERENCE_SPECTRA)
+
+        # new arrays (the previous ones can still be in use)
+        frfs = np.empty((4,) + self.S_FX.shape, dtype=self.complex_dtype)
+        H1, H2, Hv, ODS = frfs
+        tmp = np.empty_like(H1)
+        inv_S_XF = np.divide(1., self.S_XF)
+        abs2_S_FX = np.multiply(self.S_FX, np.conjugate(self.S_FX), out=tmp).real
+
+        np.divide(self.S_FX, self.S_FF, out=H1)
+        H1 *= self.frf_norm
+        np.multiply(self.S_XX, inv_S_XF, out=H2)
+        H2 *= self.frf_norm
+
+        coherence = abs2_S_FX / np.abs(self.S_FF * self.S_XX)
+
+        # Hv with the ratio of the spectra of measurement noises k = 1 [1]
+        np.subtract(self.S_FF, self.S_XX, out=Hv)
+        np.square(Hv, out=Hv)
+        Hv += 4 * abs2_S_FX
+        np.sqrt(Hv, out=Hv)
+        Hv += self.S_XX
+        Hv -= self.S_FF
+        Hv *= inv_S_XF
+        Hv *= self.frf_norm / 2
+
+        # ODS [2]; 2 / self.samples added for proper amplitude
+        np.sqrt(self.S_XX, out=ODS)
+        ODS *= self.S_XF
+        ODS /= np.sqrt(abs2_S_FX)  # |S_XF| = |S_FX|
+        ODS *= 2 / self.samples
+
+        frfs.flags.writeable = False
+        coherence.flags.writeable = False
+        H1, H2, Hv, ODS = frfs
+        self._estimators = {'H1': H1, 'H2': H2, 'Hv': Hv, 'coherence': coherence, 'ODS': ODS}
+        self._estimators_meas = self.curr_meas
+        return self._estimators
 
     def _get_frf_av(self):
         """Calculates the averaged FRF based on averaging and weighting type
 
+        The averaged spectra are updated in place; only the spectra selected with `spectra` are computed.
 
         Literature:
             [1] Haylen, Lammens, Sas: ISMA 2011 Modal Analysis Theory and Testing page: A.2.27
@@ -447,35 +853,161 @@ class FRF:
 
         :return:
         """
-        # obtain cross and auto spectra for current data
-        S_FX = np.conj(self.Exc) * self.Resp
-        S_FF = np.conj(self.Exc) * self.Exc
-        S_XX = np.conj(self.Resp) * self.Resp
-        S_XF = np.conj(self.Resp) * self.Exc
+        if self.curr_meas == 0:
+            self._ini_spectra(self.Exc, self.Resp)
+            N = 1.
+        elif self.weighting == 'Linear':
+            N = np.float64(self.curr_meas) + 1
+        else:  # 'Exponential'
+            N = np.float64(self.n_averages)
+
+        conj_exc = np.conjugate(self.Exc, out=self._conj_exc)
+        tmp_exc = self._tmp_exc
+        tmp_resp = self._tmp_resp
+
+        # obtain cross and auto spectra for current data and average them
+        if self.S_FF is not None:
+            self._average(self.S_FF, np.multiply(conj_exc, self.Exc, out=tmp_exc), tmp_exc, N)
+        if self.S_FX is not None:
+            self._average(self.S_FX, np.multiply(conj_exc, self.Resp, out=tmp_resp), tmp_resp, N)
+            if self.S_XF is not None:
+                # the averaged S_XF is the complex conjugate of the averaged S_FX
+                np.conjugate(self.S_FX, out=self.S_XF)
+        elif self.S_XF is not None:
+            np.conjugate(self.Resp, out=tmp_resp)
+            self._average(self.S_XF, np.multiply(tmp_resp, self.Exc, out=tmp_resp), tmp_resp, N)
+        if self.S_XX is not None:
+            np.conjugate(self.Resp, out=tmp_resp)
+            self._average(self.S_XX, np.multiply(tmp_resp, self.Resp, out=tmp_resp), tmp_resp, N)
         # direct
-        S_F = self.Exc
-        S_X = self.Resp
+        if self.S_F is not None:
+            self._average(self.S_F, self.Exc, tmp_exc, N)
+        if self.S_X is not None:
+            self._average(self.S_X, self.Resp, tmp_resp, N)
+
+    def _get_frf_av_segments(self):
+        """Calculates the averaged FRF from the spectra of several segments
 
-        # obtain average spectra
+        The segments are along the first axis of ``self.Exc`` and ``self.Resp``. The result is the
+        same as if the segments were averaged one by one with ``_get_frf_av``, but the spectra are
+        reduced with a single weighted sum.
+
+        :return:
+        """
         if self.curr_meas == 0:
-            self.S_XX = S_XX
-            self.S_FF = S_FF
-            self.S_XF = S_XF
-            self.S_FX = S_FX
-            self.S_X = S_X
-            self.S_F = S_F
-        else:
-            if self.weighting == 'Linear':
-                N = np.float64(self.curr_meas) + 1
-            else:  # 'Exponential'
-                N = np.float64(self.n_averages)
-
-            self.S_XX = 1 / N * S_XX + (N - 1) / N * self.S_XX
-            self.S_FF = 1 / N * S_FF + (N - 1) / N * self.S_FF
-            self.S_XF = 1 / N * S_XF + (N - 1) / N * self.S_XF
-            self.S_FX = 1 / N * S_FX + (N - 1) / N * self.S_FX
-            self.S_X = 1 / N * S_X + (N - 1) / N * self.S_X
-            self.S_F = 1 / N * S_F + (N - 1) / N * self.S_F
+            self._ini_spectra(self.Exc[0], self.Resp[0])
+        weights, av_weight = self._get_segment_weights(self.Exc.shape[0])
+
+        conj_exc = np.conjugate(self.Exc)
+        if self.S_FF is not None:
+            self._average_segments(self.S_FF, av_weight, np.einsum('j,jf,jf->f', weights, conj_exc, self.Exc))
+        if self.S_FX is not None:
+            self._average_segments(self.S_FX, av_weight,
+                                   np.einsum('j,jf,j...f->...f', weights, conj_exc, self.Resp))
+            if self.S_XF is not None:
+                # the averaged S_XF is the complex conjugate of the averaged S_FX
+                np.conjugate(self.S_FX, out=self.S_XF)
+        elif self.S_XF is not None:
+            self._average_segments(self.S_XF, av_weight,
+                                   np.einsum('j,j...f,jf->...f', weights, np.conjugate(self.Resp), self.Exc))
+        if self.S_XX is not None:
+            self._average_segments(self.S_XX, av_weight,
+                                   np.einsum('j,j...f,j...f->...f', weights, np.conjugate(self.Resp), self.Resp))
+        # direct
+        if self.S_F is not None:
+            self._average_segments(self.S_F, av_weight, np.einsum('j,jf->f', weights, self.Exc))
+        if self.S_X is not None:
+            self._average_segments(self.S_X, av_weight, np.einsum('j,j...f->...f', weights, self.Resp))
+
+    def _get_segment_weights(self, n_segments):
+        """Returns the weights of the segments and of the already averaged spectra
+
+        :param n_segments: number of segments
+        :return: weights (of shape (n_segments,)), av_weight
+        """
+        # averaging number of each segment
+        meas = self.curr_meas + np.arange(n_segments)
+        if self.weighting == 'Linear':
+            N = meas + 1.
+        else:  # 'Exponential'
+            N = np.ones(n_segments) * np.float64(self.n_averages)
+        N[meas == 0] = 1.
+
+        b = (N - 1) / N
+        weights = np.ones(n_segments)
+        weights[:-1] = np.cumprod(b[::-1])[::-1][1:]
+        weights /= N
+        av_weight = np.prod(b)
+        return weights, av_weight
+
+    @staticmethod
+    def _average_segments(S_av, av_weight, S_sum):
+        """In place update of the averaged spectrum with the weighted sum of segment spectra
+
+        :param S_av: averaged spectrum (updated in place)
+        :param av_weight: weight of the already averaged spectrum
+        :param S_sum: weighted sum of the segment spectra
+        :return:
+        """
+        S_av *= av_weight
+        S_av += S_sum
+
+    @staticmethod
+    def _average(S_av, S, tmp, N):
+        """In place update of the averaged spectrum: ``S_av = 1/N * S + (N-1)/N * S_av``
+
+        :param S_av: averaged spectrum (updated in place)
+        :param S: spectrum of the current data (can be the same array as `tmp`)
+        :param tmp: work array of the same shape as `S_av`
+        :param N: averaging number
+        :return:
+        """
+        np.subtract(S, S_av, out=tmp)
+        tmp /= N
+        S_av += tmp
+
+    def _get_spectra_names(self):
+        """Returns the names of the averaged spectra, see `spectra`
+
+        :return: list of spectra names
+        """
+        if self.spectra == 'all':
+            return _AVERAGED_SPECTRA
+        names = list(_FRF_TYPE_SPECTRA[self.frf_type])
+        if self.spectra == 'coherence':
+            names += [_ for _ in _COHERENCE_SPECTRA if _ not in names]
+        return names
+
+    def _ini_spectra(self, Exc, Resp):
+        """Allocates the averaged spectra and the work arrays (only for the first measurement)
+
+        :param Exc: excitation spectrum of one measurement
+        :param Resp: response spectrum of one measurement
+        :return:
+        """
+        names = self._get_spectra_names()
+        for name in _AVERAGED_SPECTRA:
+            if name not in names:
+                setattr(self, name, None)
+            elif name in ['S_FF', 'S_F']:
+                setattr(self, name, np.zeros_like(Exc))
+            else:
+                setattr(self, name, np.zeros_like(Resp))
+
+        self._conj_exc = np.empty_like(Exc)
+        self._tmp_exc = np.empty_like(Exc)
+        self._tmp_resp = np.empty_like(Resp)
+
+    def _check_spectra(self, *names):
+        """Raises an exception if any of the spectra is not averaged
+
+        :param names: names of the spectra
+        :return:
+        """
+        for name in names:
+            if getattr(self, name) is None:
+                raise Exception('spectrum %s is not averaged (spectra=%s, frf_type=%s)'
+                                % (name, self.spectra, self.frf_type))
 
     def _ini_lengths_and_windows(self, length):
         """
@@ -489,7 +1021,7 @@ class FRF:
             return
         if self.samples is None:
             self.samples = length
-        elif self.samples != len(self.exc):
+        elif self.samples != length:
             raise ValueError('data length changed.')
 
         self.exc_window_data, self.exc_window_amp_norm = self._get_window_sub(self.exc_window)
@@ -510,6 +1042,9 @@ class FRF:
     def get_archive(self):
         """Returns the time archive. If not available, it returns None, None
 
+        The archives are sequences of the added time data blocks; the disk archives read the
+        blocks lazily (see time_archive).
+
         :return: (excitation, response) time archive
         """
         if self.archive_time_data:
@@ -517,6 +1052,466 @@ class FRF:
         else:
             return None, None
 
+    def get_archive_reference(self):
+        """Returns the reference to the time data in a disk archive. If not available, it returns None
+
+        :return: (archive string, excitation store name, response store name), see time_archive.open_store
+        """
+        if hasattr(self.exc_archive, 'archive'):
+            # only the disk stores have an archive string
+            return self.exc_archive.archive, self.exc_archive.name, self.resp_archive.name
+        else:
+            return None
+
+    def close_archive(self):
+        """Closes the time archive (the disk archives write the block boundaries and close the files),
+        no time data can be added afterwards."""
+        if self.archive_time_data:
+            self.exc_archive.close()
+            self.resp_archive.close()
+
+
+class MultiChannelFRF(FRF):
+    """
+    Perform Dual Channel Spectral Analysis for one excitation and several responses
+
+    All the response channels are processed together: the excitation is transformed
+    once per measurement and the responses with a single batched ``rfft``.
+    The averaged spectra ``S_FX``, ``S_XX``, ``S_XF`` and ``S_X`` are contiguous
+    ``(n_resp, n_freq)`` arrays, ``S_FF`` and ``S_F`` are ``(n_freq,)`` arrays
+    and all the estimators (``get_H1()``, ...) return ``(n_resp, n_freq)`` arrays.
+
+        :param resp_type: response type, see _RESP_TYPES, or a list of response types
+                          (one for each response channel)
+        :param resp_delay: response time delay (in seconds) or a list of delays
+                           (one for each response channel)
+        :param resp_scale: response calibration scaling or a list of scalings
+                           (one for each response channel)
+
+        The other parameters are the same as for FRF.
+    """
+
+    def __init__(self, sampling_freq, exc=None, resp=None, resp_type='a', resp_delay=0., **kwargs):
+        """
+        initiates the MultiChannelFRF class:
+
+        :param sampling_freq: sampling frequency
+        :param exc: excitation array; if None, no data is added and init
+        :param resp: response array of shape (n_resp, samples)
+        :param resp_type: response type (see _RESP_TYPES) or a list of types, one for each response
+        :param resp_delay: response time delay (in seconds) or a list of delays, one for each response
+        :param kwargs: other FRF parameters, see FRF
+        :return:
+        """
+        self.n_resp = None
+        FRF.__init__(self, sampling_freq, exc=exc, resp=resp, resp_type=resp_type, resp_delay=resp_delay,
+                     **kwargs)
+
+    def _check_types(self):
+        """Checks the types; the response type can be given for each channel
+
+        :return:
+        """
+        resp_type = self.resp_type
+        for _resp_type in np.atleast_1d(resp_type):
+            self.resp_type = _resp_type
+            FRF._check_types(self)
+        self.resp_type = resp_type
+
+    def add_data_for_overlapping(self, exc, resp):
+        """Adds data and prepares accelerance FRF with the overlapping options
+
+        :param exc: excitation array
+        :param resp: response array of shape (n_resp, samples)
+        :return:
+        """
+        self._check_resp(resp)
+        FRF.add_data_for_overlapping(self, exc, resp)
+
+    def add_data_stream(self, exc, resp):
+        """Adds a chunk of continuously acquired data (e.g. a block from the DAQ)
+
+        :param exc: excitation array (chunk)
+        :param resp: response array of shape (n_resp, samples) (chunk)
+        :return: number of segments completed (and averaged) with this chunk
+        """
+        self._check_resp(resp)
+        return FRF.add_data_stream(self, exc, resp)
+
+    def add_data(self, exc, resp):
+        """Adds data and prepares accelerance FRF
+
+        :param exc: excitation array
+        :param resp: response array of shape (n_resp, samples)
+        :return:
+        """
+        self._check_resp(resp)
+        FRF.add_data(self, exc, resp)
+
+    def _check_resp(self, resp):
+        """Checks the shape of the response data and the number of response channels
+
+        :param resp: response array of shape (n_resp, samples)
+        :return:
+        """
+        if np.ndim(resp) != 2:
+            raise ValueError('response data should be of shape (n_resp, samples).')
+        if self.n_resp is None:
+            self.n_resp = np.shape(resp)[0]
+            for name in ['resp_type', 'resp_delay', 'resp_scale']:
+                if np.ndim(getattr(self, name)) != 0 and len(getattr(self, name)) != self.n_resp:
+                    raise ValueError('length of %s does not match the number of response channels.' % name)
+        elif np.shape(resp)[0] != self.n_resp:
+            raise ValueError('number of response channels changed.')
+
+
+
+class MIMOFRF(MultiChannelFRF):
+    """
+    Perform Multiple Input Multiple Output Spectral Analysis
+
+    The averaged spectral matrices are stored with the frequency as the first axis:
+    ``S_FF`` is the ``(n_freq, n_exc, n_exc)`` input matrix ``E[F F^H]``, ``S_XF`` the
+    ``(n_freq, n_resp, n_exc)`` output-input matrix ``E[X F^H]`` and ``S_XX`` the
+    ``(n_freq, n_resp, n_resp)`` output matrix ``E[X X^H]``. The estimators are solved for all
+    the frequency lines at once (batched ``np.linalg.solve``) and returned as
+    ``(n_exc, n_resp, n_freq)`` arrays, the layout of utils.get_frf_from_mdd() as used by the
+    analysis methods (e.g. lscf).
+
+    Note: ``S_XX`` grows with the square of the number of responses; with ``spectra='frf'`` and
+    ``frf_type='H1'`` it is not averaged.
+
+        :param exc: excitation array of shape (n_exc, samples)
+        :param resp: response array of shape (n_resp, samples)
+        :param frf_type: default frf type returned at self.get_frf(), see _MIMO_FRF_TYPES
+
+        The other parameters are the same as for MultiChannelFRF (the windows, averaging and
+        weighting options are the same for all the channels).
+    """
+
+    def __init__(self, sampling_freq, exc=None, resp=None, **kwargs):
+        """
+        initiates the MIMOFRF class:
+
+        :param sampling_freq: sampling frequency
+        :param exc: excitation array of shape (n_exc, samples); if None, no data is added and init
+        :param resp: response array of shape (n_resp, samples)
+        :param kwargs: other MultiChannelFRF parameters, see MultiChannelFRF and FRF
+        :return:
+        """
+        self.n_exc = None
+        MultiChannelFRF.__init__(self, sampling_freq, exc=exc, resp=resp, **kwargs)
+
+    def _check_types(self):
+        """Checks the types; only the H1 and H2 frf types are available
+
+        :return:
+        """
+        if not (self.frf_type in _MIMO_FRF_TYPES):
+            raise Exception('wrong FRF type given %s (can be %s)'
+                            % (self.frf_type, _MIMO_FRF_TYPES))
+        MultiChannelFRF._check_types(self)
+
+    def add_data_for_overlapping(self, exc, resp):
+        """Adds data and prepares accelerance FRF with the overlapping options
+
+        :param exc: excitation array of shape (n_exc, samples)
+        :param resp: response array of shape (n_resp, samples)
+        :return:
+        """
+        self._check_exc(exc)
+        MultiChannelFRF.add_data_for_overlapping(self, exc, resp)
+
+    def add_data_stream(self, exc, resp):
+        """Adds a chunk of continuously acquired data (e.g. a block from the DAQ)
+
+        :param exc: excitation array of shape (n_exc, samples) (chunk)
+        :param resp: response array of shape (n_resp, samples) (chunk)
+        :return: number of segments completed (and averaged) with this chunk
+        """
+        self._check_exc(exc)
+        return MultiChannelFRF.add_data_stream(self, exc, resp)
+
+    def add_data(self, exc, resp):
+        """Adds data and prepares accelerance FRF
+
+        :param exc: excitation array of shape (n_exc, samples)
+        :param resp: response array of shape (n_resp, samples)
+        :return:
+        """
+        self._check_exc(exc)
+        MultiChannelFRF.add_data(self, exc, resp)
+
+    def _check_exc(self, exc):
+        """Checks the shape of the excitation data and the number of excitation channels
+
+        :param exc: excitation array of shape (n_exc, samples)
+        :return:
+        """
+        if np.ndim(exc) != 2:
+            raise ValueError('excitation data should be of shape (n_exc, samples).')
+        if self.n_exc is None:
+            self.n_exc = np.shape(exc)[0]
+            if np.ndim(self.exc_scale) != 0 and len(self.exc_scale) != self.n_exc:
+                raise ValueError('length of exc_scale does not match the number of excitation channels.')
+        elif np.shape(exc)[0] != self.n_exc:
+            raise ValueError('number of excitation channels changed.')
+
+    def _get_spectra_names(self):
+        """Returns the names of the averaged spectral matrices, see `spectra`
+
+        :return: list of spectra names
+        """
+        if self.spectra == 'frf':
+            return _MIMO_FRF_TYPE_SPECTRA[self.frf_type]
+        return _MIMO_SPECTRA
+
+    def _ini_spectra(self, Exc, Resp):
+        """Allocates the averaged spectral matrices (only for the first measurement)
+
+        :param Exc: excitation spectra of one measurement, shape (n_exc, n_freq)
+        :param Resp: response spectra of one measurement, shape (n_resp, n_freq)
+        :return:
+        """
+        names = self._get_spectra_names()
+        n_freq = Exc.shape[-1]
+        shapes = {'S_FF': (n_freq, self.n_exc, self.n_exc),
+                  'S_XF': (n_freq, self.n_resp, self.n_exc),
+                  'S_XX': (n_freq, self.n_resp, self.n_resp)}
+        for name in _AVERAGED_SPECTRA:
+            if name in names:
+                setattr(self, name, np.zeros(shapes[name], dtype=self.complex_dtype))
+            else:
+                setattr(self, name, None)
+
+    def _get_frf_av(self):
+        """Calculates the averaged spectral matrices based on averaging and weighting type
+
+        :return:
+        """
+        if self.curr_meas == 0:
+            self._ini_spectra(self.Exc, self.Resp)
+            N = 1.
+        elif self.weighting == 'Linear':
+            N = np.float64(self.curr_meas) + 1
+        else:  # 'Exponential'
+            N = np.float64(self.n_averages)
+
+        conj_exc = np.conjugate(self.Exc)
+        if self.S_FF is not None:
+            S = np.einsum('if,jf->fij', self.Exc, conj_exc)
+            self._average(self.S_FF, S, S, N)
+        if self.S_XF is not None:
+            S = np.einsum('of,jf->foj', self.Resp, conj_exc)
+            self._average(self.S_XF, S, S, N)
+        if self.S_XX is not None:
+            S = np.einsum('of,pf->fop', self.Resp, np.conjugate(self.Resp))
+            self._average(self.S_XX, S, S, N)
+
+    def _get_frf_av_segments(self):
+        """Calculates the averaged spectral matrices from the spectra of several segments
+
+        :return:
+        """
+        if self.curr_meas == 0:
+            self._ini_spectra(self.Exc[0], self.Resp[0])
+        weights, av_weight = self._get_segment_weights(self.Exc.shape[0])
+
+        conj_exc = np.conjugate(self.Exc)
+        if self.S_FF is not None:
+            self._average_segments(self.S_FF, av_weight, np.einsum('s,sif,sjf->fij', weights, self.Exc, conj_exc))
+        if self.S_XF is not None:
+            self._average_segments(self.S_XF, av_weight, np.einsum('s,sof,sjf->foj', weights, self.Resp, conj_exc))
+        if self.S_XX is not None:
+            self._average_segments(self.S_XX, av_weight,
+                                   np.einsum('s,sof,spf->fop', weights, self.Resp, np.conjugate(self.Resp)))
+
+    @staticmethod
+    def _to_mdd_layout(H_T):
+        """Returns the (n_freq, n_exc, n_resp) transposed FRF matrices in the (n_exc, n_resp, n_freq) layout
+
+        :param H_T: transposed FRF matrices
+        :return: FRF array of shape (n_exc, n_resp, n_freq)
+        """
+        return np.ascontiguousarray(H_T.transpose(1, 2, 0))
+
+    def _get_augmented_matrix(self):
+        """Returns the spectral matrices of the excitations augmented with each response
+
+        :return: array of shape (n_freq, n_resp, n_exc + 1, n_exc + 1)
+        """
+        self._check_spectra('S_FF', 'S_XF', 'S_XX')
+        n_freq, ni, no = self.S_FF.shape[0], self.n_exc, self.n_resp
+        G = np.empty((n_freq, no, ni + 1, ni + 1), dtype=self.complex_dtype)
+        G[:, :, :ni, :ni] = self.S_FF[:, np.newaxis]
+        G[:, :, ni, :ni] = self.S_XF
+        G[:, :, :ni, ni] = np.conjugate(self.S_XF)
+        G[:, :, ni, ni] = np.einsum('foo->fo', self.S_XX)
+        return G
+
+    def get_H1(self):
+        """H1 FRF averaged estimator: ``H1 = S_XF S_FF^-1``
+
+        :return: H1 FRF estimator of shape (n_exc, n_resp, n_freq)
+        """
+        self._check_spectra('S_FF', 'S_XF')
+        # H1 S_FF = S_XF  <=>  S_FF^T H1^T = S_XF^T
+        H_T = np.linalg.solve(np.swapaxes(self.S_FF, 1, 2), np.swapaxes(self.S_XF, 1, 2))
+        return self.frf_norm * self._to_mdd_layout(H_T)
+
+    def get_H2(self):
+        """H2 FRF averaged estimator: ``H2 = S_XX S_FX^-1`` (the number of excitations and responses must match)
+
+        :return: H2 FRF estimator of shape (n_exc, n_resp, n_freq)
+        """
+        self._check_spectra('S_XX', 'S_XF')
+        if self.n_exc != self.n_resp:
+            raise Exception('H2 needs the same number of excitations and responses (%d != %d)'
+                            % (self.n_exc, self.n_resp))
+        # H2 S_FX = S_XX  <=>  S_FX^T H2^T = S_XX^T, where S_FX^T = conj(S_XF)
+        H_T = np.linalg.solve(np.conjugate(self.S_XF), np.swapaxes(self.S_XX, 1, 2))
+        return self.frf_norm * self._to_mdd_layout(H_T)
+
+    def get_Hv(self):
+        """Hv FRF averaged estimator (total least squares)
+
+        For each response, the FRF is obtained from the eigenvector of the smallest eigenvalue
+        of the excitations' spectral matrix augmented with the response.
+
+        Literature:
+            [1] Heylen, Lammens, Sas: Modal Analysis Theory and Testing, 1998
+
+        :return: Hv FRF estimator of shape (n_exc, n_resp, n_freq)
+        """
+        v = np.linalg.eigh(self._get_augmented_matrix())[1][..., 0]  # smallest eigenvalue first
+        H = -np.conjugate(v[..., :-1]) / np.conjugate(v[..., -1:])  # (n_freq, n_resp, n_exc)
+        return self.frf_norm * self._to_mdd_layout(np.swapaxes(H, 1, 2))
+
+    def get_FRF(self):
+        """Returns the default FRF function set at init.
+
+        :return: FRF estimator of shape (n_exc, n_resp, n_freq)
+        """
+        if self.frf_type == 'H1':
+            return self.get_H1()
+        if self.frf_type == 'H2':
+            return self.get_H2()
+
+    def get_coherence(self):
+        """Multiple coherence of each response with all the excitations
+
+        :return: multiple coherence of shape (n_resp, n_freq)
+        """
+        self._check_spectra('S_FF', 'S_XF', 'S_XX')
+        H_T = np.linalg.solve(np.swapaxes(self.S_FF, 1, 2), np.swapaxes(self.S_XF, 1, 2))
+        # H1 S_FX / S_XX for each response
+        num = np.einsum('fio,foi->of', H_T, np.conjugate(self.S_XF)).real
+        return num / np.einsum('foo->of', self.S_XX).real
+
+    def get_partial_coherence(self):
+        """Partial coherence of each response with each excitation (conditioned on the other excitations)
+
+        Obtained from the inverse ``C`` of the augmented spectral matrix:
+        ``|C_ix|**2 / (C_ii C_xx)``.
+
+        Literature:
+            [1] Bendat, Piersol: Random Data: Analysis and Measurement Procedures, 4th edition,
+                chapter 7
+
+        :return: partial coherence of shape (n_exc, n_resp, n_freq)
+        """
+        C = np.linalg.inv(self._get_augmented_matrix())  # (n_freq, n_resp, n_exc + 1, n_exc + 1)
+        C_ii = np.einsum('foii->foi', C)[..., :-1].real
+        C_ix = C[..., :-1, -1]
+        C_xx = C[..., -1, -1].real
+        gamma = np.abs(C_ix)**2 / (C_ii * C_xx[..., np.newaxis])  # (n_freq, n_resp, n_exc)
+        return np.ascontiguousarray(gamma.transpose(2, 1, 0))
+
+    def get_exc_spectrum(self, amplitude_spectrum=True, last=True):
+        """get excitation amplitude/power spectra
+
+        :param amplitude_spectrum: get amplitude spectrum else power
+        :param last: return the last only (else the averaged value is returned)
+        :return: excitation spectra of shape (n_exc, n_freq)
+        """
+        if last:
+            return FRF.get_exc_spectrum(self, amplitude_spectrum=amplitude_spectrum)
+        self._check_spectra('S_FF')
+        amp = np.sqrt(np.abs(np.einsum('fii->if', self.S_FF)))
+        return self.exc_window_amp_norm * (amp if amplitude_spectrum else amp**2)
+
+    def get_resp_spectrum(self, amplitude_spectrum=True, last=True):
+        """get response amplitude/power spectra
+
+        :param amplitude_spectrum: get amplitude spectrum else power
+        :param last: return the last only (else the averaged value is returned)
+        :return: response spectra of shape (n_resp, n_freq)
+        """
+        if last:
+            return FRF.get_resp_spectrum(self, amplitude_spectrum=amplitude_spectrum)
+        self._check_spectra('S_XX')
+        amp = np.sqrt(np.abs(np.einsum('foo->of', self.S_XX)))
+        return self.resp_window_amp_norm * (amp if amplitude_spectrum else amp**2)
+
+    def get_ods_frf(self):
+        """The ODS FRF is defined for a single excitation only (see FRF).
+
+        :return:
+        """
+        raise Exception('ODS FRF is not available for several excitations, use MultiChannelFRF')
+
+    def get_FRF_vector(self):
+        """The vector FRF is defined for a single excitation only (see FRF).
+
+        :return:
+        """
+        raise Exception('vector FRF is not available for several excitations, use MultiChannelFRF')
+
+
+def dtype_accuracy_check(samples=2**14, n_averages=10, seed=0, plot_figure=False):
+    """Compares the float32 (complex64) FRF estimators to the float64 (complex128) ones
+
+    Random excitation of a single degree of freedom system is averaged with both data types.
+
+    :param samples: number of samples per measurement
+    :param n_averages: number of averaged measurements
+    :param seed: seed of the random excitation and noise
+    :param plot_figure: plots the relative error of H1
+    :return: dictionary of the maximal relative errors of H1, H2 and coherence
+    """
+    fs = 1000.
+    w = get_w_axis(samples, fs)
+    h = 1. / (-w**2 + 2j * 0.05 * 100. * w + 100.**2)
+    frf64 = FRF(fs, exc_window='Hann', resp_window='Hann', weighting='Linear', dtype='float64')
+    frf32 = FRF(fs, exc_window='Hann', resp_window='Hann', weighting='Linear', dtype='float32')
+    random_state = np.random.RandomState(seed)
+    for i in range(n_averages):
+        exc = random_state.randn(samples)
+        resp = np.fft.irfft(np.fft.rfft(exc) * h * w**2, samples) + 1e-3 * random_state.randn(samples)
+        frf64.add_data(exc.copy(), resp.copy())
+        frf32.add_data(exc.copy(), resp.copy())
+
+    errors = dict()
+    for name in ['get_H1', 'get_H2', 'get_coherence']:
+        a64 = getattr(frf64, name)()[1:]
+        a32 = getattr(frf32, name)()[1:]
+        errors[name] = np.max(np.abs(a32 - a64) / np.abs(a64))
+    if plot_figure:
+        import matplotlib.pyplot as plt
+        plt.semilogy(frf64.get_f_axis()[1:], np.abs(frf32.get_H1()[1:] - frf64.get_H1()[1:]) / np.abs(frf64.get_H1()[1:]))
+        plt.xlabel('f [Hz]')
+        plt.ylabel('relative error of H1')
+        plt.show()
+    return errors
+
+
+def test_dtype_accuracy(tolerance=1e-3):
+    """The float32 estimators must match the float64 ones within the relative tolerance."""
+    for seed in range(3):
+        errors = dtype_accuracy_check(seed=seed)
+        for name, error in errors.items():
+            assert error < tolerance, 'relative error of %s is %g (seed %d)' % (name, error, seed)
+
 
 if __name__ == '__main__':
-    pass
+    test_dtype_accuracy()
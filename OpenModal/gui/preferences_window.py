@@ -42,6 +42,7 @@ import numpy as np
 from preferences import DEFAULTS, EXCITATION_DEFAULTS
 
 from frf import _WINDOWS, _EXC_TYPES, _RESP_TYPES, _WGH_TYPES
+import OpenModal.fft_tools as fft_tools
 
 from OpenModal.gui.templates import COLOR_PALETTE
 
@@ -230,6 +231,7 @@ class ExcitationConfig(QtWidgets.QWidget):
         # Save general stuff (Acq. settings at the moment) ADD AN ENTRY HERE FOR EACH PROPERTY
         for key in self.fields.keys():
             self.settings[key] = self.fields[key]()
+        fft_tools.set_fft_backend(self.settings['fft_backend'], workers=self.settings['fft_workers'])
         # self.settings['samples_per_channel'] = int(self.samples_channel_edit.text())
         # self.settings['pre_trigger_samples'] = int(self.pre_trigger_edit.text())
 
@@ -247,7 +249,7 @@ class ExcitationConfig(QtWidgets.QWidget):
     def _refresh_tasks_list(self, drop_popup=True):
         # Get tasks
         self.device_task.blockSignals(True)
-        tasks_tmp = map(bytes.decode, dq.get_daq_tasks())
+        tasks_tmp = map(bytes.decode, dq.get_daq_tasks() + dp.SimulatedDAQTask.get_simulated_tasks())
         tasks = list(tasks_tmp).copy()
 
         self.device_task.clear()
@@ -370,6 +372,11 @@ class ExcitationConfig(QtWidgets.QWidget):
         signal_grid.addWidget(zero_padding_label, 1, 0)
         signal_grid.addWidget(zero_padding, 1, 2)
         self.fields['zero_padding'] = zero_padding.value
+        fast_fft_len = QtWidgets.QCheckBox('Fast length')
+        fast_fft_len.setToolTip(tt.tooltips['fft_len'])
+        fast_fft_len.setChecked(DEFAULTS['fft_len'] == 'fast')
+        signal_grid.addWidget(fast_fft_len, 1, 3, 1, 2)
+        self.fields['fft_len'] = lambda: 'fast' if fast_fft_len.isChecked() else 'auto'
 
         # Excitation window.
         self.exc_win = QtWidgets.QComboBox()
@@ -438,6 +445,11 @@ class ExcitationConfig(QtWidgets.QWidget):
         signal_grid.addWidget(save_time_history_label, 5, 0)
         signal_grid.addWidget(save_time_history, 5, 2)
         self.fields['save_time_history'] = save_time_history.isChecked
+        time_archive = QtWidgets.QLineEdit()
+        time_archive.setToolTip(tt.tooltips['time_archive'])
+        time_archive.setText(DEFAULTS['time_archive'])
+        signal_grid.addWidget(time_archive, 5, 3, 1, 2)
+        self.fields['time_archive'] = time_archive.text
 
         # Trigger level
         self.trigger_level = QtWidgets.QDoubleSpinBox()
@@ -462,6 +474,52 @@ class ExcitationConfig(QtWidgets.QWidget):
         signal_grid.addWidget(pre_trigger_unit, 7, 3)
         self.fields['pre_trigger_samples'] = self.pre_trigger.value
 
+        # FFT backend.
+        self.fft_backend = QtWidgets.QComboBox()
+        self.fft_backend.setToolTip(tt.tooltips['fft_backend'])
+        self.fft_backend.addItems(fft_tools.get_available_fft_backends())
+        set_combo_box_index(self.fft_backend, DEFAULTS['fft_backend'])
+        fft_workers = QtWidgets.QSpinBox()
+        fft_workers.setToolTip(tt.tooltips['fft_backend'])
+        fft_workers.setRange(-64, 64)
+        fft_workers.setValue(DEFAULTS['fft_workers'])
+        fft_backend_label = QtWidgets.QLabel('FFT backend')
+        fft_workers_unit = QtWidgets.QLabel('threads')
+        signal_grid.addWidget(fft_backend_label, 8, 0)
+        signal_grid.addWidget(self.fft_backend, 8, 2)
+        signal_grid.addWidget(fft_workers, 8, 3)
+        signal_grid.addWidget(fft_workers_unit, 8, 4)
+        self.fields['fft_backend'] = self.fft_backend.currentText
+        self.fields['fft_workers'] = fft_workers.value
+
+        # Continuous impact measurement.
+        continuous_impact = QtWidgets.QCheckBox()
+        continuous_impact.setToolTip(tt.tooltips['continuous_impact'])
+        continuous_impact_label = QtWidgets.QLabel('Continuous impact')
+        continuous_impact.setChecked(DEFAULTS['continuous_impact'])
+        signal_grid.addWidget(continuous_impact_label, 9, 0)
+        signal_grid.addWidget(continuous_impact, 9, 2)
+        self.fields['continuous_impact'] = continuous_impact.isChecked
+
+        # Live FRF from the streamed blocks.
+        stream_blocks = QtWidgets.QCheckBox()
+        stream_blocks.setToolTip(tt.tooltips['stream_blocks'])
+        stream_blocks_label = QtWidgets.QLabel('Live FRF (random, OMA)')
+        stream_blocks.setChecked(DEFAULTS['stream_blocks'])
+        signal_grid.addWidget(stream_blocks_label, 10, 0)
+        signal_grid.addWidget(stream_blocks, 10, 2)
+        self.fields['stream_blocks'] = stream_blocks.isChecked
+
+        # FRF length for the identification.
+        fast_frf_len = QtWidgets.QComboBox()
+        fast_frf_len.setToolTip(tt.tooltips['fast_frf_len'])
+        fast_frf_len.addItems(['None', 'trim', 'pad'])
+        set_combo_box_index(fast_frf_len, DEFAULTS['fast_frf_len'])
+        fast_frf_len_label = QtWidgets.QLabel('Fast FRF length (analysis)')
+        signal_grid.addWidget(fast_frf_len_label, 11, 0)
+        signal_grid.addWidget(fast_frf_len, 11, 2)
+        self.fields['fast_frf_len'] = fast_frf_len.currentText
+
         # Check if task is already set and if it is, fill saved values.
         if 'task_name' in self.settings:
             self.win_length.setValue(self.settings['samples_per_channel'])
@@ -475,6 +533,19 @@ class ExcitationConfig(QtWidgets.QWidget):
             self.pre_trigger.setValue(self.settings['pre_trigger_samples'])
             zero_padding.setValue(self.settings['zero_padding'])
             save_time_history.setChecked(self.settings['save_time_history'])
+            if 'time_archive' in self.settings:
+                time_archive.setText(self.settings['time_archive'])
+            if 'fft_backend' in self.settings:
+                set_combo_box_index(self.fft_backend, self.settings['fft_backend'])
+                fft_workers.setValue(self.settings['fft_workers'])
+            if 'continuous_impact' in self.settings:
+                continuous_impact.setChecked(self.settings['continuous_impact'])
+            if 'stream_blocks' in self.settings:
+                stream_blocks.setChecked(self.settings['stream_blocks'])
+            if 'fft_len' in self.settings:
+                fast_fft_len.setChecked(self.settings['fft_len'] == 'fast')
+            if 'fast_frf_len' in self.settings:
+                set_combo_box_index(fast_frf_len, self.settings['fast_frf_len'])
 
 
         if 'excitation_type' in self.settings:
@@ -709,7 +780,7 @@ class ExcitationConfig(QtWidgets.QWidget):
                 try:
                     # TODO: Check for required buffer size and availible buffer.
                 # i = dq.DAQTask(self.device_task.currentText().encode())
-                    i = dq.DAQTask(self.device_task.currentText().encode())
+                    i = dp.get_task(self.device_task.currentText().encode())
 
                     channel_list = list(map(bytes.decode, i.channel_list))
 
@@ -763,7 +834,7 @@ class ExcitationConfig(QtWidgets.QWidget):
         self.device_task.currentIndexChanged.connect(load_task)
         self.measurement_type_change.connect(load_task)
         if 'task_name' in self.settings:
-            tasks = map(bytes.decode, dq.get_daq_tasks())
+            tasks = map(bytes.decode, dq.get_daq_tasks() + dp.SimulatedDAQTask.get_simulated_tasks())
             arglist = [n for n, task in enumerate(tasks) if self.settings['task_name'].decode() in task]
             if len(arglist) > 0:
                 self.device_task.setCurrentIndex(arglist[0]+1)
@@ -918,6 +989,10 @@ class ExcitationConfig(QtWidgets.QWidget):
             if triggered.value:
                 # Stop measurement.
                 triggered.value = False
+                # The data above can be older than the trigger; plot the final record.
+                plotdata = pipe.recv()
+                for i in range(plotdata.shape[0]):
+                    resp_curve[i].setData(self.x_axis, plotdata[i, :])
                 self.stop_measurement_button_trigger()
                 self.button_testrun.setChecked(False)
 
@@ -947,7 +1022,7 @@ class ExcitationConfig(QtWidgets.QWidget):
         #     self.process.__dict__[key] = self.settings[key]
         self.process.run_measurement()
 
-        sampling_fr = self.process.task_info_out.recv()
+        sampling_fr = self.process.get_task_info()
         self.x_axis = np.arange(0, self.settings['samples_per_channel']/sampling_fr, 1/sampling_fr)
         # self.sampling_fr = sampling_fr
 
@@ -958,7 +1033,7 @@ class ExcitationConfig(QtWidgets.QWidget):
 
         if self.settings['excitation_type'] == 'impulse':
             self.timer.timeout.connect(lambda triggered=self.process.triggered, resp_curve=resp_curves,
-                                              pipe=self.process.process_measured_data_out:
+                                              pipe=self.process.measured_data:
                                               plot_triggered(triggered, resp_curve, pipe))
 
         else: # random OR oma
@@ -968,8 +1043,8 @@ class ExcitationConfig(QtWidgets.QWidget):
 
 
             self.timer.timeout.connect(lambda triggered=self.process.triggered, resp_curve=resp_curves,
-                                              pipe_1=self.process.process_measured_data_out,
-                                              pipe=self.process.process_random_chunk_out, text=text:
+                                              pipe_1=self.process.measured_data,
+                                              pipe=self.process.random_chunk, text=text:
                                               plot_random(triggered, resp_curve, pipe_1, pipe, text))
 
         self.timer.start(100)
@@ -25,6 +25,10 @@ tooltips['signal_selection'] = 'Select a DAQmx task, prepared using NI MAX.'
 tooltips['nimax'] = 'Run National Instruments Measurement and Automation Explorer; create a measurement task.'
 tooltips['window_length'] = 'Length of a window, relevant for frequency analysis (FFT) and plot range.'
 tooltips['zero_padding'] = 'Add zeros to signal, for improved frequency resolution.'
+tooltips['fft_len'] = '''Pad the signal further to the next fast FFT length (only small prime factors), the frequency
+resolution is slightly improved.'''
+tooltips['fast_frf_len'] = '''Trim or zero pad the FRF to a fast inverse FFT length before the LSCE/LSCF identification
+(None: the FRF is used as selected).'''
 tooltips['excitation_window'] = 'Type of excitation window.'
 tooltips['excitation_window_percent'] = 'Takes the part of the original window, where the amplitude is above x% (force window only).'
 tooltips['response_window'] = 'Type/shape of response window.'
@@ -33,7 +37,15 @@ tooltips['averaging_type'] = 'Averaging strategy to use.'
 tooltips['averaging_number'] = 'Number of windows to average over, to obtain the final result.'
 tooltips['save_time_history'] = '''Save time history alongside the calculated results (FRFs). Parameters pertaining to
 frequency-domain transformation can be changed later on.'''
+tooltips['time_archive'] = '''Where the time history is kept during the measurement: List (memory), Ring:N (memory, last N blocks),
+Npy:directory (memory-mapped files) or HDF5:file.h5 (compressed file, requires h5py).'''
 tooltips['trigger_level'] = 'Amplitude level, which is considered an impulse.'
 tooltips['pre_trigger_samples'] = 'The number of samples to be added, before the trigger occurence.'
+tooltips['continuous_impact'] = '''Impact measurement without stopping: the hits that pass the quality checks (overload, double hit)
+are averaged automatically and the measurement is stored after the number of averages (the roving node advances).'''
+tooltips['stream_blocks'] = '''Random and OMA measurement: the FRF is updated with every acquired block (the averages are the
+segments of the measurement length, overlapped by one half) instead of once per complete record.'''
+tooltips['fft_backend'] = '''FFT library used for the spectral analysis (scipy and pyFFTW use several threads, if installed)
+and the number of threads (-1: all processors).'''
 tooltips['test_run'] = 'Run acquisition to test the preferences.'
 tooltips['toggle_PSD'] = 'Toggle between time-history and power-spectral density plot.'
\ No newline at end of file
@@ -28,7 +28,7 @@ from OpenModal.analysis.add_reconstruction_to_mdd import save_stabilisation_spot
 from OpenModal.analysis.utility_functions import complex_freq_to_freq_and_damp
 from OpenModal.analysis.utility_functions import prime_factors
 from OpenModal.analysis.utility_functions import get_analysis_id
-from OpenModal.fft_tools import convert_frf
+from OpenModal.fft_tools import convert_frf, fast_frf_len
 from OpenModal.utils import get_frf_from_mdd
 from OpenModal.utils import get_frf_type
 
@@ -158,18 +158,14 @@ class LSCEDialog(QtWidgets.QWidget):
         """
         f = self.lsce_widget.spots_plot.draw_selection.xy[:, 0].real
 
-        selected_model = self.lsce_widget.modaldata.tables['measurement_values'].loc[:, 'model_id'] \
-                         == self.lsce_widget.spots_plot.model_id
-
         selected_model_index = self.lsce_widget.modaldata.tables['measurement_index'].loc[:, 'model_id'] \
                                == self.lsce_widget.spots_plot.model_id
 
-        data = self.lsce_widget.modaldata.tables['measurement_values'][selected_model]
         data_index = self.lsce_widget.modaldata.tables['measurement_index'][selected_model_index]
 
         # TODO: LSCE method only works there is one reference. If not an exception should occur (popout!)
         # Create a 3D FRF array from mdd file
-        frf, _ = get_frf_from_mdd(data, data_index)
+        frf, _ = get_frf_from_mdd(self.lsce_widget.modaldata.measurements, data_index)
 
         f_limits = (f <= self.lsce_widget.box_f_max.value() + ALLOWED_ERROR)
 
@@ -239,16 +235,13 @@ class LSCFDialog(QtWidgets.QWidget):
         """
         f = self.lscf_widget.spots_plot.draw_selection.xy[:, 0].real
 
-        selected_model = self.lscf_widget.modaldata.tables['measurement_values'].loc[:, 'model_id'] \
-                         == self.lscf_widget.spots_plot.model_id
         selected_model_index = self.lscf_widget.modaldata.tables['measurement_index'].loc[:, 'model_id'] \
                                == self.lscf_widget.spots_plot.model_id
 
-        data = self.lscf_widget.modaldata.tables['measurement_values'][selected_model]
         data_index = self.lscf_widget.modaldata.tables['measurement_index'][selected_model_index]
 
         # Create a 3D FRF array from mdd file
-        frf, _ = get_frf_from_mdd(data, data_index)
+        frf, _ = get_frf_from_mdd(self.lscf_widget.modaldata.measurements, data_index)
 
         f_limits = (f <= self.lscf_widget.box_f_max.value() + ALLOWED_ERROR)
 
@@ -340,24 +333,21 @@ class FFTLengthPopout(QtWidgets.QDialog):
             # self.f = self.f_orig
             # self.fft_len_index = len(self.f)
             self.fft_len_index = self.f_max_index - self.f_min_index
-            nf = 2 * (self.fft_len_index - 1)  # two sided FFT length
-            i = 1
-            j = 1
-            while max(prime_factors(nf)) > MAX_FFT_PRIME_FACTOR:
+            # number of lines to cut off for a fast two sided FFT length
+            cutoff = self.fft_len_index - fast_frf_len(self.fft_len_index, 'trim',
+                                                       max_prime=MAX_FFT_PRIME_FACTOR)
+            if cutoff > 0:
                 if cutoff_high_freq.isChecked():
-                    self.f = self.f[:-1]
-                    self.f_max_index = self.f_len - i
-                    i += 1
+                    self.f = self.f[:-cutoff]
+                    self.f_max_index -= cutoff
                 elif cutoff_low_freq.isChecked():
-                    self.f = self.f[1:]
-                    self.f_min_index = j
-                    j += 1
+                    self.f = self.f[cutoff:]
+                    self.f_min_index += cutoff
 
                 self.fft_len_index = self.f_max_index - self.f_min_index
 
                 self.min_freq_index.setValue(self.f_min_index)
                 self.max_freq_index.setValue(self.f_max_index)
-                nf = 2 * (self.fft_len_index - 1)
                 self.reset.setEnabled(True)
 
         def reset_data():
@@ -606,7 +596,8 @@ class DrawSelection(QtWidgets.QWidget):
     def drawing_rows(self, measurement_index, measurement_values, data_table):
         """
         Draws rows according to the selection in the table.
-        :param modaldata_object: mdd file
+        :param measurement_index: measurement index table of the model
+        :param measurement_values: MeasurementStore of the mdd file
         :param data_table: data table
         :return: drawn FRFs
         """
@@ -627,9 +618,8 @@ class DrawSelection(QtWidgets.QWidget):
         for self.index in self.dataTable.selectionModel().selectedRows():
             measurement_id = self.measurement_index.iloc[self.index.row()].loc['measurement_id']
 
-            self.xy = (self.measurement_values[['frq', 'amp']]
-            [self.measurement_values['measurement_id'] == measurement_id].values.astype(
-                'complex'))
+            frq, amp = self.measurement_values.get(measurement_id)
+            self.xy = np.column_stack((frq, amp)).astype('complex')
 
             y = np.abs(self.xy[:, 1])
             x = self.xy[:, 0].real
@@ -650,29 +640,27 @@ class DrawSelection(QtWidgets.QWidget):
         except:
             pass
 
+    def _get_frfs(self):
+        """ Frequency vector and the (number of FRFs, length) array of the FRFs in the table. """
+        measurement_ids = self.measurement_index['measurement_id'].values
+        f = self.measurement_values.get(measurement_ids[0])[0]
+        h = np.array([self.measurement_values.get(measurement_id)[1] for measurement_id in measurement_ids])
+        return f, h
+
     def frf_sum(self):
         """ Computes and plots the FRF sum (if checkbox is selected). """
-
-        n = self.measurement_values['measurement_id'].shape[0] // self.n_len  # number of FRFs
-
-        f = self.measurement_values['frq'].values[:self.n_len]
-        frf_sum = np.sum(
-            np.abs(self.measurement_values['amp'].values)[i * self.n_len:(i + 1) * self.n_len] for i in
-            range(n)) / n
+        f, h = self._get_frfs()
+        frf_sum = np.sum(np.abs(h), axis=0) / h.shape[0]
         self.frfsum = self.plot_area.plot(f, frf_sum)
         self.frfsum.setPen(color=(255, 0, 0))
 
     def cmif(self):
         """ Computes and plots the Complex mode indicator function (if checkbox is selected) """
-        n = self.measurement_values['measurement_id'].shape[0] // self.n_len  # number of FRFs
-        f = self.measurement_values['frq'].values[:self.n_len]
-
-        h = np.zeros([1, n, self.n_len], dtype='complex')
-        s = np.zeros(self.n_len)
-        for i in range(n):
-            h[0, i, :] = self.measurement_values['amp'].values[i * self.n_len:(i + 1) * self.n_len]
+        f, h = self._get_frfs()
+        h = h[np.newaxis].astype('complex')
+        s = np.zeros(f.size)
 
-        for i in range(self.n_len):
+        for i in range(f.size):
             u, s[i], v = np.linalg.svd(np.imag(h[:, :, i]))
 
         cmif = s
@@ -887,6 +875,11 @@ class PropertiesTab(QtWidgets.QTabWidget):
     #
     #     return fn_temp, xi_temp, test_fn, test_xi
 
+    def get_fast_frf_len(self):
+        """Returns the fast_len of the identification methods (see lsce, lscf) set in the preferences."""
+        fast_len = self.settings.get('fast_frf_len', 'None')
+        return None if fast_len == 'None' else fast_len
+
     def lsce_stabilisation(self, f, frf, low_lim):
         """
         Uses the LSCE method to get the eigenfrequencies and dampin ratios.
@@ -908,7 +901,8 @@ class PropertiesTab(QtWidgets.QTabWidget):
         dt = 1 / (nf * df)  # sampling period
 
         frf = frf[0]  # LSCE method takes only one reference
-        sr = lsce.lsce(frf, f[low_lim], low_lim, self.nmax, dt, reconstruction='LSFD')
+        sr = lsce.lsce(frf, f[low_lim], low_lim, self.nmax, dt, reconstruction='LSFD',
+                       fast_len=self.get_fast_frf_len())
 
         fn_temp, xi_temp, test_fn, test_xi = stabilisation(sr, self.nmax, self.err_fn, self.err_xi)
 
@@ -937,7 +931,8 @@ class PropertiesTab(QtWidgets.QTabWidget):
         # reshape the frf array to 2D
         frf = frf.reshape(frf.shape[0] * frf.shape[1], frf.shape[2])  # TODO: check if this holds for LSCF
 
-        sr = lscf.lscf(frf, low_lim, self.nmax, dt, weighing_type='Unity', reconstruction='LSFD')
+        sr = lscf.lscf(frf, low_lim, self.nmax, dt, weighing_type='Unity', reconstruction='LSFD',
+                       fast_len=self.get_fast_frf_len())
 
         fn_temp, xi_temp, test_fn, test_xi = stabilisation(sr, self.nmax, self.err_fn, self.err_xi)
 
@@ -1191,20 +1186,17 @@ class PropertiesTab(QtWidgets.QTabWidget):
         self.spots_plot.dataTable.horizontalHeader().setStretchLastSection(True)
         self.spots_plot.dataTable.setFixedWidth(250)
 
-        # selection model for measurement values
-        self.select_model_meas = (self.modaldata.tables['measurement_values'].loc[:, 'model_id'] ==
-                                  self.button_model.currentIndex())
+        # frequency axes of the model measurements
+        frequency_axes = self.modaldata.measurements.get_frequency_axes(self.button_model.currentIndex())
 
         # set minimum  and maximum frequency values in the spinboxes
         try:
             self.f_min
             self.f_max
         except:
-            if np.sum(self.select_model_meas) > 0:
-                self.box_f_min.setValue((self.modaldata.tables['measurement_values'].loc[
-                                             self.select_model_meas, 'frq'].values).min())
-                self.box_f_max.setValue((self.modaldata.tables['measurement_values'].loc[
-                                             self.select_model_meas, 'frq'].values).max())
+            if len(frequency_axes) > 0:
+                self.box_f_min.setValue(min(frq.min() for frq in frequency_axes))
+                self.box_f_max.setValue(max(frq.max() for frq in frequency_axes))
             else:
                 self.box_f_min.setValue(1)
                 self.box_f_max.setValue(100)
@@ -1241,8 +1233,7 @@ class PropertiesTab(QtWidgets.QTabWidget):
         """
         if state == QtCore.Qt.Checked:
             measurement_index = self.modaldata.tables['measurement_index'][self.spots_plot.select_model]
-            measurement_values = self.modaldata.tables['measurement_values'][
-                self.spots_plot.select_model_meas_val]
+            measurement_values = self.modaldata.measurements
 
             # TODO:
             # convert_frf(self.spots_plot.frf, 2*np.pi*self.spots_plot.f, self.spots_plot.frf_type.values, self.spots_plot.frf_type.values)
@@ -1415,10 +1406,6 @@ class PropertiesTab(QtWidgets.QTabWidget):
         self.spots_plot.select_model = (self.modaldata.tables['measurement_index'].loc[:, 'model_id']
                                         == self.spots_plot.model_id)
 
-        self.spots_plot.select_model_meas_val = (
-            self.modaldata.tables['measurement_values'].loc[:, 'model_id']
-            == self.spots_plot.model_id)
-
         # get FRF types
         self.spots_plot.frf_type = self.modaldata.tables['measurement_index'] \
                                        [self.spots_plot.select_model].loc[:, ['ordinate_spec_data_type',
@@ -1427,8 +1414,7 @@ class PropertiesTab(QtWidgets.QTabWidget):
 
         # get the FRF from mdd file
         self.spots_plot.frf, self.spots_plot.f = get_frf_from_mdd(
-            self.modaldata.tables['measurement_values'][self.spots_plot.select_model_meas_val], \
-            self.modaldata.tables['measurement_index'][self.spots_plot.select_model])
+            self.modaldata.measurements, self.modaldata.tables['measurement_index'][self.spots_plot.select_model])
 
         # update the data model
         self.LeftDataModel.signal_update(self.modaldata.tables['measurement_index'].loc[
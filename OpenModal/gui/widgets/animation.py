@@ -1230,10 +1230,18 @@ class Model():
 
 
             #find frequency nearest to clicked one
-            anim_freq = find_nearest(np.unique(modal_data.tables['measurement_values']['frq'].values), freq)
-
-            mv_model_mask = modal_data.tables['measurement_values']['model_id'] == model_id
-            mv = modal_data.tables['measurement_values'][mv_model_mask]
+            measurement_ids = modal_data.measurements.get_measurement_ids(model_id)
+            frequency_axes = modal_data.measurements.get_frequency_axes(model_id)
+            anim_freq = find_nearest(np.unique(np.concatenate(frequency_axes)), freq)
+
+            # amplitudes of the model measurements at the animation frequency
+            mv_rows = []
+            for measurement_id in measurement_ids:
+                frq, amp = modal_data.measurements.get(measurement_id)
+                frq_mask = frq == anim_freq
+                if np.any(frq_mask):
+                    mv_rows.append((model_id, measurement_id, anim_freq, amp[frq_mask][0]))
+            mv = pd.DataFrame(mv_rows, columns=['model_id', 'measurement_id', 'frq', 'amp'])
 
             mx_model_mask = modal_data.tables['measurement_index']['model_id'] == model_id
             mx = modal_data.tables['measurement_index'][mx_model_mask]
@@ -1241,7 +1249,7 @@ class Model():
             g_model_mask = modal_data.tables['geometry']['model_id'] == model_id
             g = modal_data.tables['geometry'][g_model_mask]
 
-            new = pd.merge(mx, mv[mv.frq == anim_freq], on='measurement_id')
+            new = pd.merge(mx, mv, on='measurement_id')
             final = pd.merge(g, new, left_on='node_nums', right_on=roving_map[self.roving_type][0])
 
             #select only one reference dir
@@ -1927,12 +1935,11 @@ class Model():
         :return:
         '''
 
-        model_mask = self.modal_data.tables['measurement_values']['model_id'] == self.model_id
-        measurements = np.unique(self.modal_data.tables['measurement_values'][model_mask]['measurement_id'].values)
+        measurements = self.modal_data.measurements.get_measurement_ids(self.model_id)
 
 
         #check number of all measurements
-        num_of_meas = len(np.unique(self.modal_data.tables['measurement_values']['measurement_id'].values))
+        num_of_meas = len(self.modal_data.measurements)
         #TODO: plot only selected FRFs via context menu via extra true/false dialogue
 
 
@@ -1957,20 +1964,16 @@ class Model():
             for i in range(num_of_meas):
                 pens.append(pg.mkPen(color=(red[i], green[i], blue[i]), width=1))  #, style=QtCore.Qt.DashLine))
 
-        grouped = self.modal_data.tables['measurement_values']
-        grouped = grouped.set_index(['model_id', 'measurement_id'],
-                                    inplace=False)  #copy need to be made so that original data is preserved
-
         m = 0
         plotitems = {}
 
         # if all FRFs must be plotted
 
         for j in measurements:
-            data = grouped.ix[self.model_id].ix[j]
+            frq, amp = self.modal_data.measurements.get(j)
             itm_name = 'model_id: ' + str(self.model_id) + ' measurement_id: ' + str(int(j))
-            #itm = pg.PlotCurveItem(data['frq'].values, np.imag(data['amp']), pen=pens[m], name=itm_name) #original
-            itm = CustomPlotCurveItem(data['frq'].values, np.imag(data['amp']), pen=pens[m], name=itm_name)
+            #itm = pg.PlotCurveItem(frq, np.imag(amp), pen=pens[m], name=itm_name) #original
+            itm = CustomPlotCurveItem(frq, np.imag(amp), pen=pens[m], name=itm_name)
             itm.setClickable(True,width=1)
             plotitems[itm_name] = itm
             m = m + 1
@@ -1994,16 +1997,19 @@ class Model():
             ind = self.uff_tree_index - (self.uff_tree_index // 7) * 7
             color = COLORS[ind]
 
-        mv_model_mask = self.modal_data.tables['measurement_values']['model_id'] == self.model_id
-        mv = self.modal_data.tables['measurement_values'][mv_model_mask]
+        measurements = self.modal_data.measurements.get_measurement_ids(self.model_id)
 
         #number of measurements
-        num_of_meas = len(np.unique(mv['measurement_id']))
+        num_of_meas = len(measurements)
 
-        mv['amp_abs']=mv['amp'].abs()
+        frq, amp_abs = [np.empty(0)], [np.empty(0)]
+        for j in measurements:
+            frq_j, amp_j = self.modal_data.measurements.get(j)
+            frq.append(frq_j)
+            amp_abs.append(np.abs(amp_j))
 
         # group by freq and sum
-        data = mv.groupby(mv['frq']).sum()
+        data = pd.DataFrame({'amp_abs': np.concatenate(amp_abs)}).groupby(np.concatenate(frq)).sum()
 
         itm_name = 'FRF sum [dB] - model: ' + str(int(self.model_id))
         # itm = pg.PlotCurveItem(data.index.values, np.abs(data['amp_abs'].values)/num_of_meas,
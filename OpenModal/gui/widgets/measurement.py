@@ -41,8 +41,8 @@ except NotImplementedError as nie:
     dp = None
     dq = None
 import OpenModal.frf as frf
+import OpenModal.fft_tools as fft_tools
 import OpenModal.gui.templates as temp
-from OpenModal.meas_check import overload_check, double_hit_check
 
 FONT_TABLE_FAMILY = 'Consolas'
 FONT_TABLE_SIZE = 13
@@ -153,6 +153,8 @@ class MeasurementWidget(prototype.SubWidget):
         super(MeasurementWidget, self).__init__(*args, **kwargs)
 
         self.frf_container = None
+        self.continuous_impact = False
+        self.time_save_busy = False
 
         self.excitation_type_old = None
 
@@ -294,7 +296,6 @@ class MeasurementWidget(prototype.SubWidget):
 
         idx_m = self.modaldata.tables['measurement_index']
         idx_m = idx_m[idx_m.model_id == self.button_model.currentIndex()]
-        val_m = self.modaldata.tables['measurement_values']
 
         # TODO: Do some smart(er) node (ref/resp) numbering. Connect with geometry.
         if idx_m.shape[0] == 0:
@@ -478,8 +479,6 @@ class MeasurementWidget(prototype.SubWidget):
         rows = self.table_view.selectedIndexes()
         df_idx = self.modaldata.tables['measurement_index']
 
-        df = self.modaldata.tables['measurement_values']
-
         self.fig_h_mag.clear()
         self.fig_h_phi.clear()
 
@@ -497,8 +496,7 @@ class MeasurementWidget(prototype.SubWidget):
             # self.table_model
 
 
-            data = df[df.measurement_id == measurement_id].amp.values
-            frq = df[df.measurement_id == measurement_id].frq.values
+            frq, data = self.modaldata.measurements.get(measurement_id)
             mag = np.abs(data)
             phi = np.angle(data)
 
@@ -616,7 +614,6 @@ class MeasurementWidget(prototype.SubWidget):
 
         idx_m = self.modaldata.tables['measurement_index']
         idx_m = idx_m[idx_m.model_id == self.button_model.currentIndex()]
-        val_m = self.modaldata.tables['measurement_values']
 
         # TODO: Do some smart(er) node (ref/resp) numbering. Connect with geometry.
         if idx_m.shape[0] == 0:
@@ -641,7 +638,7 @@ class MeasurementWidget(prototype.SubWidget):
 
         if 'task_name' in self.settings:
             try:
-                i = dq.DAQTask(self.settings['task_name'])
+                i = dp.get_task(self.settings['task_name'])
             except dq.DAQError:
                 del self.settings['task_name']
 
@@ -749,8 +746,9 @@ class MeasurementWidget(prototype.SubWidget):
 
         # Then remove from measurement_index and measurement_values at that same measurement_id.
         self.modaldata.tables['measurement_index'] = self.modaldata.tables['measurement_index'][~self.modaldata.tables['measurement_index'].measurement_id.isin(measurement_ids)]
-        self.modaldata.tables['measurement_values'] = self.modaldata.tables['measurement_values'][~self.modaldata.tables['measurement_values'].measurement_id.isin(measurement_ids)]
+        self.modaldata.measurements.remove(measurement_ids)
         self.modaldata.tables['measurement_values_td'] = self.modaldata.tables['measurement_values_td'][~self.modaldata.tables['measurement_values_td'].measurement_id.isin(measurement_ids)]
+        self.modaldata.tables['measurement_archive'] = self.modaldata.tables['measurement_archive'][~self.modaldata.tables['measurement_archive'].measurement_id.isin(measurement_ids)]
 
         self.reload()
 
@@ -826,6 +824,14 @@ class MeasurementWidget(prototype.SubWidget):
 
         self.n_averages_done = 0
 
+        def show_overload(exc_channel, resp_channels):
+            # The overload is checked in the measurement process (quality checks of the current record).
+            overload = self.process.get_quality()[0]['overload']
+            if overload[exc_channel] or overload[resp_channels].any():
+                self.button_overload.setStyleSheet('color: red')
+            else:
+                self.button_overload.setStyleSheet('color: lightgray')
+
         # TODO: This must be made into an object. Too much mess using it this way.
         # Plot update function - impulse measurement.
         def plot_impulse(triggered, exc_curve, resp_curve, pipe,
@@ -836,28 +842,18 @@ class MeasurementWidget(prototype.SubWidget):
             resp = plotdata[resp_channels, :]
             exc = plotdata[exc_channel, :]
             exc_curve.setData(self.x_axis, exc)
-
-            # if double_hit_check(exc, self.x_axis[1]-self.x_axis[0]):
-            #     self.button_doublehit.setStyleSheet('color: red')
-            # else:
-            #     self.button_overload.setStyleSheet('color: lightgray')
-
-            if overload_check(exc):
-                self.button_overload.setStyleSheet('color: red')
-            else:
-                self.button_overload.setStyleSheet('color: lightgray')
-            # TODO: This should be faster.
-            overload_list = []
             for i in range(resp.shape[0]):
-                overload_list.append(overload_check(resp[i, :]))
                 resp_curve[i].setData(self.x_axis, resp[i, :])
-            if True in overload_list:
-                self.button_overload.setStyleSheet('color: red')
-            else:
-                self.button_overload.setStyleSheet('color: lightgray')
+            show_overload(exc_channel, resp_channels)
             if triggered.value:
                 # Stop measurement.
                 triggered.value = False
+                # The data above can be older than the trigger; read the final record from the ring buffer.
+                plotdata = pipe.recv()
+                resp = plotdata[resp_channels, :]
+                exc = plotdata[exc_channel, :]
+                # Read the check results before stopping, the shared memory is closed on stop.
+                quality = self.process.get_quality()[1]
                 self.button_run.toggle()
 
                 # Sometimes measurement gives zeros. We have to retry the measurement.
@@ -865,8 +861,30 @@ class MeasurementWidget(prototype.SubWidget):
                     self.button_run.toggle()
                 else:
                     # Show detailed data for impact type of measurement.
-                    self.add_measurement_data(exc, resp)
+                    self.add_measurement_data(exc, resp, quality)
 
+        # Plot update function - continuous impact measurement.
+        def plot_impact_continuous(triggered, exc_curve, resp_curve, pipe,
+                 exc_channel, resp_channels, random_chunk):
+            plotdata = pipe.recv()
+            resp = plotdata[resp_channels, :]
+            exc = plotdata[exc_channel, :]
+            exc_curve.setData(self.x_axis, exc)
+            for i in range(resp.shape[0]):
+                resp_curve[i].setData(self.x_axis, resp[i, :])
+            show_overload(exc_channel, resp_channels)
+            # The measurement process queues only the hits that passed the quality checks.
+            triggered.value = False
+            while random_chunk.poll():
+                if self.n_averages_done >= self.settings['n_averages']:
+                    # The previous node is still being saved, keep the hits in the queue.
+                    break
+                chunk_data = random_chunk.recv()
+                self.add_measurement_data(chunk_data[exc_channel, :], chunk_data[resp_channels, :])
+                self.average_counter.setText('Pass {0} of {1}'.format(self.n_averages_done, self.settings['n_averages']))
+            if self.n_averages_done >= self.settings['n_averages'] and not self.time_save_busy:
+                # Store the averaged FRF and continue at the next roving node.
+                self.confirm_add_to_model()
 
         def plot_random(triggered, exc_curve, resp_curve, pipe,
                  exc_channel, resp_channels, random_chunk):
@@ -876,27 +894,22 @@ class MeasurementWidget(prototype.SubWidget):
             resp = plotdata[resp_channels, :]
             exc = plotdata[exc_channel, :]
             exc_curve.setData(self.x_axis, exc)
-            if overload_check(exc):
-                self.button_overload.setStyleSheet('color: red')
-            else:
-                self.button_overload.setStyleSheet('color: lightgray')
-            # TODO: This should be faster.
-            # print('Now drawing')
-            overload_list = []
             for i in range(resp.shape[0]):
-                overload_list.append(overload_check(resp[i, :]))
                 resp_curve[i].setData(self.x_axis, resp[i, :])
-            if True in overload_list:
-                self.button_overload.setStyleSheet('color: red')
-            else:
-                self.button_overload.setStyleSheet('color: lightgray')
+            show_overload(exc_channel, resp_channels)
             if triggered.value:
                 # print('Now Triggered')
                 triggered.value = False
-                chunk_data = random_chunk.recv()
-                resp = chunk_data[resp_channels, :]
-                exc = chunk_data[exc_channel, :]
-                self.add_measurement_data(exc, resp)
+                if self.stream_blocks:
+                    # Every acquired block is queued, the FRF is updated for the completed segments.
+                    while random_chunk.poll() and self.n_averages_done < self.settings['n_averages']:
+                        chunk_data = random_chunk.recv()
+                        self.add_measurement_data(chunk_data[exc_channel, :], chunk_data[resp_channels, :], stream=True)
+                else:
+                    chunk_data = random_chunk.recv()
+                    resp = chunk_data[resp_channels, :]
+                    exc = chunk_data[exc_channel, :]
+                    self.add_measurement_data(exc, resp)
                 self.average_counter.setText('Pass {0} of {1}'.format(self.n_averages_done, self.settings['n_averages']))
                 if self.n_averages_done >= self.settings['n_averages']:
                     # TODO: Problems when stopping mid-measurement or for short windows!
@@ -910,28 +923,23 @@ class MeasurementWidget(prototype.SubWidget):
             # mstime, plotdata = pipe.recv()
             resp = plotdata[resp_channels, :]
             exc = plotdata[exc_channel, :]
-            if overload_check(exc):
-                self.button_overload.setStyleSheet('color: red')
-            else:
-                self.button_overload.setStyleSheet('color: lightgray')
             exc_curve.setData(self.x_axis, exc)
-            # TODO: This should be faster.
-            # print('Now drawing')
-            overload_list = []
             for i in range(resp.shape[0]):
-                overload_list.append(overload_check(resp[i, :]))
                 resp_curve[i].setData(self.x_axis, resp[i, :])
-            if True in overload_list:
-                self.button_overload.setStyleSheet('color: red')
-            else:
-                self.button_overload.setStyleSheet('color: lightgray')
+            show_overload(exc_channel, resp_channels)
             if triggered.value:
                 # print('Now Triggered')
                 triggered.value = False
-                chunk_data = random_chunk.recv()
-                resp = chunk_data[:, :]
-                exc = chunk_data[exc_channel, :]
-                self.add_measurement_data(exc, resp)
+                if self.stream_blocks:
+                    # Every acquired block is queued, the FRF is updated for the completed segments.
+                    while random_chunk.poll() and self.n_averages_done < self.settings['n_averages']:
+                        chunk_data = random_chunk.recv()
+                        self.add_measurement_data(chunk_data[exc_channel, :], chunk_data[:, :], stream=True)
+                else:
+                    chunk_data = random_chunk.recv()
+                    resp = chunk_data[:, :]
+                    exc = chunk_data[exc_channel, :]
+                    self.add_measurement_data(exc, resp)
                 self.average_counter.setText('Pass {0} of {1}'.format(self.n_averages_done, self.settings['n_averages']))
                 if self.n_averages_done >= self.settings['n_averages']:
                     # TODO: Problems when stopping mid-measurement or for short windows!
@@ -944,7 +952,7 @@ class MeasurementWidget(prototype.SubWidget):
             self.process.__dict__[key] = self.settings[key]
         self.process.run_measurement()
 
-        sampling_fr = self.process.task_info_out.recv()
+        sampling_fr = self.process.get_task_info()
         self.x_axis = np.arange(0, self.settings['samples_per_channel']/sampling_fr, 1/sampling_fr)
         self.sampling_fr = sampling_fr
 
@@ -956,17 +964,57 @@ class MeasurementWidget(prototype.SubWidget):
 
 
 
-        if self.settings['excitation_type'] == 'impulse':
+        # The time history is archived as set in the preferences (see time_archive.get_stores).
+        archive_time_data = self.settings['save_time_history'] and self.settings.get('time_archive', 'List')
+
+        # The random and oma FRF is updated with every acquired block (see MeasurementProcess stream_blocks),
+        # the averages are the overlapped segments of the measurement length.
+        self.stream_blocks = (self.settings['excitation_type'] in ['random', 'oma'] and
+                              self.settings.get('stream_blocks', False))
+        nperseg = self.settings['samples_per_channel'] if self.stream_blocks else None
+
+        # The FFT length is padded further to a fast length if set in the preferences.
+        fft_len = self.settings['samples_per_channel'] + self.settings['zero_padding']
+        if self.settings.get('fft_len', 'auto') == 'fast':
+            fft_len = fft_tools.next_fast_len(fft_len)
 
-            # -- Initialize frf objects. For each channel.
-            self.frf_container = [frf.FRF(self.sampling_fr,
+        self.continuous_impact = (self.settings['excitation_type'] == 'impulse' and
+                                  self.settings.get('continuous_impact', False))
+
+        if self.continuous_impact:
+
+            # -- The hits are averaged, a new frf object is made for every roving node.
+            self.new_frf_container = lambda: frf.MultiChannelFRF(self.sampling_fr,
                                 exc_type=self.settings['channel_types'][self.settings['exc_channel']],
-                                resp_type=self.settings['channel_types'][self.settings['resp_channels'][i]],
+                                resp_type=[self.settings['channel_types'][i] for i in self.settings['resp_channels']],
                                 exc_window=self.settings['exc_window'], resp_window=self.settings['resp_window'],
-                                resp_delay=self.settings['channel_delay'][self.settings['resp_channels'][i]],
-                                fft_len=self.settings['samples_per_channel']+self.settings['zero_padding'],
-                                archive_time_data=self.settings['save_time_history']) for
-                                i in range(len(self.settings['resp_channels']))]
+                                resp_delay=[self.settings['channel_delay'][i] for i in self.settings['resp_channels']],
+                                weighting='Linear', n_averages=self.settings['n_averages'],
+                                fft_len=fft_len,
+                                archive_time_data=archive_time_data)
+            self.frf_container = self.new_frf_container()
+            self.average_counter.setText('Pass 0 of {0}'.format(self.settings['n_averages']))
+
+            self.timer.timeout.connect(lambda triggered=self.process.triggered, exc_curve=exc_curve, resp_curve=resp_curves,
+                                              pipe=self.process.measured_data,
+                                              exc_channel=self.settings['exc_channel'],
+                                              resp_channels=self.settings['resp_channels'],
+                                              random_chunk=self.process.random_chunk:
+                                              plot_impact_continuous(triggered, exc_curve, resp_curve, pipe, exc_channel,
+                                                                     resp_channels, random_chunk))
+
+            self.timer.start(100)
+
+        elif self.settings['excitation_type'] == 'impulse':
+
+            # -- Initialize frf object. All response channels are processed together.
+            self.frf_container = frf.MultiChannelFRF(self.sampling_fr,
+                                exc_type=self.settings['channel_types'][self.settings['exc_channel']],
+                                resp_type=[self.settings['channel_types'][i] for i in self.settings['resp_channels']],
+                                exc_window=self.settings['exc_window'], resp_window=self.settings['resp_window'],
+                                resp_delay=[self.settings['channel_delay'][i] for i in self.settings['resp_channels']],
+                                fft_len=fft_len,
+                                archive_time_data=archive_time_data)
 
             # aa = [(self.settings['channel_types'][self.settings['resp_channels'][i]],
             #  self.settings['channel_delay'][self.settings['resp_channels'][i]])
@@ -974,7 +1022,7 @@ class MeasurementWidget(prototype.SubWidget):
             # print(aa)
 
             self.timer.timeout.connect(lambda triggered=self.process.triggered, exc_curve=exc_curve, resp_curve=resp_curves,
-                                              pipe=self.process.process_measured_data_out,
+                                              pipe=self.process.measured_data,
                                               exc_channel=self.settings['exc_channel'],
                                               resp_channels=self.settings['resp_channels']:
                                               plot_impulse(triggered, exc_curve, resp_curve, pipe, exc_channel, resp_channels))
@@ -983,54 +1031,73 @@ class MeasurementWidget(prototype.SubWidget):
 
         elif self.settings['excitation_type'] == 'random':
 
-            self.frf_container = [frf.FRF(self.sampling_fr,
+            self.frf_container = frf.MultiChannelFRF(self.sampling_fr,
                                 exc_type=self.settings['channel_types'][self.settings['exc_channel']],
-                                resp_type=self.settings['channel_types'][self.settings['resp_channels'][i]],
+                                resp_type=[self.settings['channel_types'][i] for i in self.settings['resp_channels']],
                                 exc_window=self.settings['exc_window'], resp_window=self.settings['resp_window'],
-                                resp_delay=self.settings['channel_delay'][self.settings['resp_channels'][i]],
+                                resp_delay=[self.settings['channel_delay'][i] for i in self.settings['resp_channels']],
                                 weighting=self.settings['weighting'], n_averages=self.settings['n_averages'],
-                                fft_len=self.settings['samples_per_channel']+self.settings['zero_padding'],
-                                archive_time_data=self.settings['save_time_history']) for
-                                i in range(len(self.settings['resp_channels']))]
+                                fft_len=fft_len,
+                                nperseg=nperseg, archive_time_data=archive_time_data)
 
             self.timer.timeout.connect(lambda triggered=self.process.triggered, exc_curve=exc_curve, resp_curve=resp_curves,
-                                              pipe=self.process.process_measured_data_out,
+                                              pipe=self.process.measured_data,
                                               exc_channel=self.settings['exc_channel'],
                                               resp_channels=self.settings['resp_channels'],
-                                              random_chunk=self.process.process_random_chunk_out:
+                                              random_chunk=self.process.random_chunk:
                                               plot_random(triggered, exc_curve, resp_curve, pipe, exc_channel, resp_channels,
                                                           random_chunk))
 
 
 
-            self.timer.start(1000)
+            self.timer.start(100 if self.stream_blocks else 1000)
 
         elif self.settings['excitation_type'] == 'oma':
 
-            self.frf_container = [frf.FRF(self.sampling_fr,
+            nr_oma_ch = len(self.settings['resp_channels'])+1
+            self.frf_container = frf.MultiChannelFRF(self.sampling_fr,
                                 exc_type=self.settings['channel_types'][self.settings['exc_channel']],
-                                resp_type=self.settings['channel_types'][i],
+                                resp_type=self.settings['channel_types'][:nr_oma_ch],
                                 exc_window=self.settings['exc_window'], resp_window=self.settings['resp_window'],
-                                resp_delay=self.settings['channel_delay'][i],
+                                resp_delay=self.settings['channel_delay'][:nr_oma_ch],
                                 weighting=self.settings['weighting'], n_averages=self.settings['n_averages'],
-                                fft_len=self.settings['samples_per_channel']+self.settings['zero_padding'],
-                                archive_time_data=self.settings['save_time_history']) for
-                                i in range(len(self.settings['resp_channels'])+1)]
+                                fft_len=fft_len,
+                                nperseg=nperseg, archive_time_data=archive_time_data)
 
             self.timer.timeout.connect(lambda triggered=self.process.triggered, exc_curve=exc_curve, resp_curve=resp_curves,
-                                              pipe=self.process.process_measured_data_out,
+                                              pipe=self.process.measured_data,
                                               exc_channel=self.settings['exc_channel'],
                                               resp_channels=self.settings['resp_channels'],
-                                              random_chunk=self.process.process_random_chunk_out:
+                                              random_chunk=self.process.random_chunk:
                                               plot_oma(triggered, exc_curve, resp_curve, pipe, exc_channel, resp_channels,
                                                           random_chunk))
 
 
 
-            self.timer.start(1000)
+            self.timer.start(100 if self.stream_blocks else 1000)
 
-    def add_measurement_data(self, excitation, response):
-        """Show appropriate data when the trigger is tripped and add it to database."""
+    def _add_frf_data(self, excitation, response, stream=False):
+        """Add the data to the FRF container and count the averages.
+
+        :param stream: if True, the data is an acquired block (see FRF.add_data_stream)
+        :return: number of averages added
+        """
+        if stream:
+            averages = self.frf_container.add_data_stream(excitation.copy(), response.copy())
+        else:
+            self.frf_container.add_data(excitation.copy(), response.copy())
+            averages = 1
+        self.n_averages_done += averages
+        return averages
+
+    def add_measurement_data(self, excitation, response, quality=None, stream=False):
+        """Show appropriate data when the trigger is tripped and add it to database.
+
+        :param quality: quality check results of the record (see MeasurementProcess.get_quality), read from
+            the measurement process if not given
+        :param stream: if True, the data is an acquired block (see FRF.add_data_stream), the FRF is only
+            updated when segments are completed
+        """
         # Do calculations.
         # print(self.settings['exc_window'], self.settings['resp_window'])
         # TODO: Different response types not implemented (all must me of same type now).
@@ -1039,26 +1106,27 @@ class MeasurementWidget(prototype.SubWidget):
         # self.excitation_container = []
         # self.response_container = []
         if self.settings['excitation_type'] == 'oma':
-            print('drawing oma')
+            if not self._add_frf_data(excitation, response[:len(self.settings['resp_channels'])+1], stream):
+                return
+            f = self.frf_container.get_f_axis()
+            h = self.frf_container.get_ods_frf()
             for i in range(len(self.settings['resp_channels'])+1):
-                resp_1 = self.frf_container[i]
-
-                resp_1.add_data(excitation, response[i, :])
-                f = resp_1.get_f_axis()
-                self.fig_h_mag_pen[i].setData(f, np.abs(resp_1.get_ods_frf()))
-                self.fig_h_phi_pen[i].setData(f, np.angle(resp_1.get_ods_frf()))
+                self.fig_h_mag_pen[i].setData(f, np.abs(h[i]))
+                self.fig_h_phi_pen[i].setData(f, np.angle(h[i]))
         else:
-            if double_hit_check(excitation, self.x_axis[1]-self.x_axis[0], limit=1e-2):
+            if quality is None:
+                quality = self.process.get_quality()[1]
+            if 'double_hit' in quality.dtype.names and quality['double_hit']:
                 self.button_doublehit.setStyleSheet('color: red')
             else:
                 self.button_doublehit.setStyleSheet('color: lightgray')
+            if not self._add_frf_data(excitation, response, stream):
+                return
+            f = self.frf_container.get_f_axis()
+            h = self.frf_container.get_H1()
             for i in range(len(self.settings['resp_channels'])):
-                resp_1 = self.frf_container[i]
-
-                resp_1.add_data(excitation.copy(), response[i, :].copy())
-                f = resp_1.get_f_axis()
-                self.fig_h_mag_pen[i].setData(f, np.abs(resp_1.get_H1()))
-                self.fig_h_phi_pen[i].setData(f, np.angle(resp_1.get_H1()))
+                self.fig_h_mag_pen[i].setData(f, np.abs(h[i]))
+                self.fig_h_phi_pen[i].setData(f, np.angle(h[i]))
 
 
             #self.coherence = pg.ViewBox() # TODO: add coherence plot (when avereging/repetition is done)
@@ -1079,20 +1147,19 @@ class MeasurementWidget(prototype.SubWidget):
             # if self.button_save_raw.isChecked():
             # self.excitation_container.append(excitation)
             # self.response_container.append(response[i, :])
-        self.n_averages_done += 1
         self.frq_axis = f
 
-        zoom = int(np.floor(self.settings['samples_per_channel']*0.1))
+        zoom = min(int(np.floor(self.settings['samples_per_channel']*0.1)), excitation.shape[-1])
         self.fig_exc_zoom_pen.setData(self.x_axis[:zoom], excitation[:zoom])
         # impulse_fft = np.fft.fft(excitation)
         # f_impulse = np.fft.fftfreq(self.x_axis.size)
         # TODO: Below is impulse frequency transform. Is it correct?
-        self.fig_exc_frq_pen.setData(f, 2 * np.abs(resp_1.Exc * resp_1.Exc.conj()))
+        self.fig_exc_frq_pen.setData(f, 2 * np.abs(self.frf_container.Exc * self.frf_container.Exc.conj()))
 
         if self.settings['weighting'] == 'None':
             self.button_accept_measurement.setEnabled(True)
             self.button_repeat_measurement.setEnabled(True)
-        elif self.settings['n_averages'] == self.n_averages_done:
+        elif self.n_averages_done >= self.settings['n_averages']:
             self.button_accept_measurement.setEnabled(True)
             self.button_repeat_measurement.setEnabled(True)
 
@@ -1105,7 +1172,6 @@ class MeasurementWidget(prototype.SubWidget):
 
         idx_m = self.modaldata.tables['measurement_index']
         idx_m = idx_m[idx_m.model_id == model_id]
-        val_m = self.modaldata.tables['measurement_values']
 
         # TODO: Do some smart(er) node (ref/resp) numbering. Connect with geometry.
         if idx_m.shape[0] == 0:
@@ -1137,14 +1203,23 @@ class MeasurementWidget(prototype.SubWidget):
             self.button_repeat_measurement.setDisabled(True)
 
             self.status_bar.setBusy('time_save')
+            self.time_save_busy = True
+
+            # The thread saves this container; the continuous impact measurement goes on with a new one.
+            frf_container = self.frf_container
+            continuous = self.continuous_impact and self.button_run.isChecked()
+            if continuous:
+                self.continue_measurement()
 
             def endimport():
             # Put everything in its place and update table.
                 self.button_run.setEnabled(True)
                 model_id = self.modaldata.tables['info'].model_id.values[self.button_model.currentIndex()]
                 self.table_model.update(self.modaldata.tables['measurement_index'], model_id)
-                self.button_run.toggle()
+                if not continuous:
+                    self.continue_measurement()
 
+                self.time_save_busy = False
                 self.status_bar.setNotBusy('time_save')
                 # self.status_bar.setProgressBarBusy(False)
                 # self.status_bar.hideProgressBar()
@@ -1169,30 +1244,32 @@ class MeasurementWidget(prototype.SubWidget):
                     self.zero_padding = zero_padding
 
                 def run(self):
-                    for frf in self.frf_container:
-                        # TODO: Optimize saving in modaldata.
-                        if self.excitation_type == 'oma':
-                            self.modaldata_object.new_measurement(self.model_id, self.excitation_type, self.frq_axis, frf.get_ods_frf(), reference=[self.ref_node, self.ref_dir],
-                                                               response=[self.rsp_node, self.rsp_dir], function_type='Frequency Response Function',
-                                                               abscissa='frequency', ordinate='acceleration',
-                                                               denominator='excitation force', zero_padding=self.zero_padding, td_x_axis=self.x_axis,
-                                                               td_excitation=frf.exc_archive,
-                                                               td_response=frf.resp_archive)
+                    if self.excitation_type == 'oma':
+                        h = self.frf_container.get_ods_frf()
+                    else:
+                        h = self.frf_container.get_H1()
+                    # The time data in a disk archive is only referenced, the other archives are copied.
+                    archive_reference = self.frf_container.get_archive_reference()
+                    exc_archive, resp_archive = self.frf_container.get_archive()
+                    for i, h_i in enumerate(h):
+                        if archive_reference is None:
+                            td = dict(td_x_axis=self.x_axis, td_excitation=exc_archive,
+                                      td_response=[resp[i] for resp in resp_archive])
                         else:
-                            self.modaldata_object.new_measurement(self.model_id, self.excitation_type, self.frq_axis, frf.get_H1(), reference=[self.ref_node, self.ref_dir],
-                                                               response=[self.rsp_node, self.rsp_dir], function_type='Frequency Response Function',
-                                                               abscissa='frequency', ordinate='acceleration',
-                                                               denominator='excitation force', zero_padding=self.zero_padding, td_x_axis=self.x_axis,
-                                                               td_excitation=frf.exc_archive,
-                                                               td_response=frf.resp_archive)
+                            td = dict(td_archive=archive_reference + (i,))
+                        self.modaldata_object.new_measurement(self.model_id, self.excitation_type, self.frq_axis, h_i, reference=[self.ref_node, self.ref_dir],
+                                                           response=[self.rsp_node, self.rsp_dir], function_type='Frequency Response Function',
+                                                           abscissa='frequency', ordinate='acceleration',
+                                                           denominator='excitation force', zero_padding=self.zero_padding, **td)
                         if self.rsp_dir == 3:
                             self.rsp_dir = 1
                             self.rsp_node += 1
                         else:
                             self.rsp_dir += 1
+                    self.frf_container.close_archive()
 
             self.thread = IOThread(self.modaldata, model_id, self.frq_axis, self.x_axis, rsp_node, rsp_dir, ref_node,
-                                   ref_dir, self.frf_container, self.settings['excitation_type'], self.settings['zero_padding'])
+                                   ref_dir, frf_container, self.settings['excitation_type'], self.settings['zero_padding'])
             self.thread.finished.connect(endimport)
             self.thread.start()
 
@@ -1200,37 +1277,39 @@ class MeasurementWidget(prototype.SubWidget):
         else:
             if self.settings['excitation_type'] == 'oma':
                 print('adding oma')
-                for frf in self.frf_container:
-                    self.modaldata.new_measurement(model_id, self.settings['excitation_type'], self.frq_axis, frf.get_ods_frf(), reference=[ref_node, ref_dir],
-                                                   response=[rsp_node, rsp_dir], function_type='Frequency Response Function',
-                                                   abscissa='frequency', ordinate='acceleration',
-                                                   denominator='excitation force', zero_padding=self.settings['zero_padding'])
-
-                    if rsp_dir == 3:
-                        rsp_dir = 1
-                        rsp_node += 1
-                    else:
-                        rsp_dir += 1
+                h = self.frf_container.get_ods_frf()
             else:
-                for frf in self.frf_container:
-                    self.modaldata.new_measurement(model_id, self.settings['excitation_type'], self.frq_axis, frf.get_H1(), reference=[ref_node, ref_dir],
-                                                   response=[rsp_node, rsp_dir], function_type='Frequency Response Function',
-                                                   abscissa='frequency', ordinate='acceleration',
-                                                   denominator='excitation force', zero_padding=self.settings['zero_padding'])
-
-                    if rsp_dir == 3:
-                        rsp_dir = 1
-                        rsp_node += 1
-                    else:
-                        rsp_dir += 1
+                h = self.frf_container.get_H1()
+            for h_i in h:
+                self.modaldata.new_measurement(model_id, self.settings['excitation_type'], self.frq_axis, h_i, reference=[ref_node, ref_dir],
+                                               response=[rsp_node, rsp_dir], function_type='Frequency Response Function',
+                                               abscissa='frequency', ordinate='acceleration',
+                                               denominator='excitation force', zero_padding=self.settings['zero_padding'])
+
+                if rsp_dir == 3:
+                    rsp_dir = 1
+                    rsp_node += 1
+                else:
+                    rsp_dir += 1
 
 
             # Put everything in its place and update table.
             model_id = self.modaldata.tables['info'].model_id.values[self.button_model.currentIndex()]
             self.table_model.update(self.modaldata.tables['measurement_index'], model_id)
+            self.continue_measurement()
+
+    def continue_measurement(self):
+        """Measure the next node. The continuous impact measurement keeps running, only the averaging
+        starts again; otherwise the measurement is restarted."""
+        if self.continuous_impact and self.button_run.isChecked():
+            self.frf_container = self.new_frf_container()
+            self.n_averages_done = 0
+            self.average_counter.setText('Pass 0 of {0}'.format(self.settings['n_averages']))
+            self.button_accept_measurement.setDisabled(True)
+            self.button_repeat_measurement.setDisabled(True)
+        else:
             self.button_run.toggle()
 
-
     def open_configuration_window(self):
         """Configure excitation method."""
         self.preferences_window.setWindowModality(QtCore.Qt.ApplicationModal)
@@ -19,6 +19,44 @@
 import numpy as np
 from OpenModal.fft_tools import PSD
 
+
+def overload_check_block(data, min_overload_samples=3):
+    """Check all the channels of a block for overload
+
+    A channel is overloaded if at least `min_overload_samples` samples are equal to its maximal
+    absolute value (the signal is clipped).
+
+    :param data: (channels, samples) array (or (samples,) for one channel)
+    :param min_overload_samples: number of samples that need to be equal to max
+                                 for overload
+    :return: overload status of the channels, bool array of shape data.shape[:-1]
+    """
+    x = np.abs(data)
+    x_max = np.max(x, axis=-1, keepdims=True)
+    return np.count_nonzero(x == x_max, axis=-1) >= min_overload_samples
+
+
+def double_hit_check_block(data, dt=1, limit=1e-3):
+    """Check all the channels of a block for double-hit (one batched PSD of PSD)
+
+    See: at the end of http://scholar.lib.vt.edu/ejournals/MODAL/ijaema_v7n2/trethewey/trethewey.pdf
+
+    :param data: (channels, samples) array (or (samples,) for one channel)
+    :param dt: time step
+    :param limit: ratio of freq content od the double vs single hit
+                  smaller number means more sensitivity
+    :return: double-hit status of the channels, bool array of shape data.shape[:-1]
+    """
+    # first PSD
+    W, fr = PSD(data, dt=dt)
+    # second PSD: look for oscillations in PSD
+    W2, _ = PSD(W, dt=fr[1])
+    upto = max(1, int(0.01 * data.shape[-1]))
+    max_impact = np.max(W2[..., :upto], axis=-1)
+    max_after_impact = np.max(W2[..., upto:], axis=-1)
+    return max_after_impact / max_impact > limit
+
+
 def overload_check(data, min_overload_samples=3):
     """Check data for overload
 
@@ -30,20 +68,10 @@ def overload_check(data, min_overload_samples=3):
     if data.ndim > 2:
         raise Exception('Number of dimensions of data should be 2 or less')
 
-    def _overload_check(x):
-        s = np.sort(np.abs(x))[::-1]
-        over = s == np.max(s)
-        if np.sum(over) >= min_overload_samples:
-            return True
-        else:
-            return False
-
     if data.ndim == 2:
-        over = [_overload_check(d) for d in data.T]
-        return over
+        return overload_check_block(data.T, min_overload_samples).tolist()
     else:
-        over = _overload_check(data)
-        return over
+        return bool(overload_check_block(data, min_overload_samples))
 
 
 def double_hit_check(data, dt=1, limit=1e-3, plot_figure=False):
@@ -61,37 +89,30 @@ def double_hit_check(data, dt=1, limit=1e-3, plot_figure=False):
     if data.ndim > 2:
         raise Exception('Number of dimensions of data should be 2 or less!')
 
-    def _double_hit_check(x):
-        # first PSD
+    def _plot_figure(x):
         W, fr = PSD(x, dt=dt)
-        # second PSD: look for oscillations in PSD
         W2, fr2 = PSD(W, dt=fr[1])
         upto = int(0.01 * len(x))
-        max_impact = np.max(W2[:upto])
-        max_after_impact = np.max(W2[upto:])
-        if plot_figure:
-            import matplotlib.pyplot as plt
-            plt.subplot(121)
-            l = int(0.002*len(x))
-            plt.plot(1000*dt*np.arange(l),  x[:l])
-            plt.xlabel('t [ms]')
-            plt.ylabel('F [N]')
-            plt.subplot(122)
-            plt.semilogy((W2/np.max(W2))[:5*upto])
-            plt.axhline(limit, color='r')
-            plt.axvline(upto, color='g')
-            plt.xlabel('Double freq')
-            plt.ylabel('')
-            plt.show()
-
-        if max_after_impact / max_impact > limit:
-            return True
-        else:
-            return False
+        import matplotlib.pyplot as plt
+        plt.subplot(121)
+        l = int(0.002*len(x))
+        plt.plot(1000*dt*np.arange(l),  x[:l])
+        plt.xlabel('t [ms]')
+        plt.ylabel('F [N]')
+        plt.subplot(122)
+        plt.semilogy((W2/np.max(W2))[:5*upto])
+        plt.axhline(limit, color='r')
+        plt.axvline(upto, color='g')
+        plt.xlabel('Double freq')
+        plt.ylabel('')
+        plt.show()
 
     if data.ndim == 2:
-        double_hit = [_double_hit_check(d) for d in data.T]
-        return double_hit
+        if plot_figure:
+            for d in data.T:
+                _plot_figure(d)
+        return double_hit_check_block(data.T, dt, limit).tolist()
     else:
-        double_hit = _double_hit_check(data)
-        return double_hit
+        if plot_figure:
+            _plot_figure(data)
+        return bool(double_hit_check_block(data, dt, limit))
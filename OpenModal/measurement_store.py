@@ -0,0 +1,322 @@
+
+# Copyright (C) 2014-2017 Matjaž Mršnik, Miha Pirnat, Janko Slavič, Blaž Starc (in alphabetic order)
+# 
+# This file is part of OpenModal.
+# 
+# OpenModal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+# 
+# OpenModal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with OpenModal.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Columnar store of the measured functions, the measurement_values table of ModalData.
+
+The measurements are kept in blocks: a frequency axis, shared by all the measurements of a model
+with the same axis, and a contiguous (n_meas, n_freq) array of the amplitudes. A model has one
+block per distinct frequency axis (usually one). A measurement is found by its measurement_id
+without searching the table.
+
+The long-format DataFrame (model_id, measurement_id, frq, amp) of the previous versions is
+available as a (cached, read-only) view, see MeasurementStore.to_dataframe.
+
+The arrays grow geometrically and the rows of the other measurement tables are staged in an
+AppendTable, so adding a measurement does not copy the previous ones; the DataFrames are only
+made when they are read. The stores are locked, the measurements can be added in a worker thread
+while the tables are read in the GUI thread.
+
+Classes:
+    class MeasurementStore:     Store of the measurements, keyed by measurement_id.
+    class AppendTable:          DataFrame with a fast append.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+_COLUMNS = ['model_id', 'measurement_id', 'frq', 'amp']
+
+
+class _Block(object):
+    """Measurements of one model with the same frequency axis"""
+
+    def __init__(self, model_id, frq, dtype):
+        self.model_id = model_id
+        self.frq = frq
+        self.measurement_ids = []
+        self._amp = np.empty((0, frq.size), dtype=dtype)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_amp'] = self.amp.copy()
+        return state
+
+    def copy(self):
+        """Returns a copy of the block with the used rows."""
+        block = _Block(self.model_id, self.frq, self._amp.dtype)
+        block.measurement_ids = list(self.measurement_ids)
+        block._amp = self.amp.copy()
+        return block
+
+    @property
+    def amp(self):
+        return self._amp[:len(self.measurement_ids)]
+
+    @amp.setter
+    def amp(self, amp):
+        self._amp = amp
+
+    def append(self, measurement_id, amp):
+        """Adds the amplitudes of a measurement, returns its row."""
+        row = len(self.measurement_ids)
+        dtype = np.result_type(self._amp, amp)
+        if row == self._amp.shape[0] or dtype != self._amp.dtype:
+            # grow geometrically, the appends are amortized O(1)
+            _amp = np.empty((max(4, 2 * row), self.frq.size), dtype=dtype)
+            _amp[:row] = self.amp
+            self._amp = _amp
+        self._amp[row] = amp
+        self.measurement_ids.append(measurement_id)
+        return row
+
+
+class MeasurementStore(object):
+    """Store of the measured functions, keyed by measurement_id
+
+    The returned arrays are views of the store and should not be changed.
+    """
+
+    def __init__(self):
+        self.blocks = []
+        # measurement_id: (block, row), in the order the measurements were added
+        self._location = dict()
+        self._dataframe = None
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._location)
+
+    def __contains__(self, measurement_id):
+        return measurement_id in self._location
+
+    def __getstate__(self):
+        # A snapshot, the store can be changed by another thread while it is pickled.
+        with self._lock:
+            return {'blocks': [block.copy() for block in self.blocks], 'measurement_ids': list(self._location)}
+
+    def __setstate__(self, state):
+        if 'measurement_ids' in state:
+            rows = dict((_, (block, row)) for block in state['blocks'] for row, _ in enumerate(block.measurement_ids))
+            state = {'blocks': state['blocks'], '_location': dict((_, rows[_]) for _ in state['measurement_ids'])}
+        self.__dict__.update(state)
+        self._dataframe = None
+        self._lock = threading.RLock()
+
+    @property
+    def nbytes(self):
+        return sum(block.frq.nbytes + block.amp.nbytes for block in self.blocks)
+
+    def get_measurement_ids(self, model_id=None):
+        """Returns the measurement ids (of the model) in the order they were added."""
+        with self._lock:
+            if model_id is None:
+                return list(self._location)
+            return [_ for _, (block, row) in self._location.items() if block.model_id == model_id]
+
+    def add(self, model_id, measurement_id, frq, amp):
+        """Adds a measurement.
+
+        :param model_id: model id
+        :param measurement_id: unique measurement id
+        :param frq: frequency axis
+        :param amp: amplitudes (stored as complex, the precision of amp is kept)
+        """
+        if isinstance(measurement_id, np.integer):
+            measurement_id = int(measurement_id)
+        frq = np.asarray(frq)
+        amp = np.asarray(amp)
+        if frq.dtype == object:
+            frq = frq.astype(float)
+        if amp.dtype == object:
+            amp = amp.astype(complex)
+        if frq.ndim != 1 or frq.shape != amp.shape:
+            raise ValueError('frequency and amplitude shapes do not match.')
+
+        with self._lock:
+            if measurement_id in self._location:
+                raise ValueError('measurement_id %s is already in the store.' % measurement_id)
+            block = self._find_block(model_id, frq)
+            if block is None:
+                block = _Block(model_id, frq.copy(), np.result_type(amp, np.complex64))
+                self.blocks.append(block)
+            self._location[measurement_id] = (block, block.append(measurement_id, amp))
+            self._dataframe = None
+
+    def add_dataframe(self, df):
+        """Adds the measurements of a long-format DataFrame (model_id, measurement_id, frq, amp)."""
+        if df.shape[0] == 0:
+            return
+        for measurement_id, rows in df.groupby('measurement_id', sort=False):
+            self.add(rows['model_id'].values[0], measurement_id, rows['frq'].values, rows['amp'].values)
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """Returns the store of a long-format DataFrame (model_id, measurement_id, frq, amp)."""
+        store = cls()
+        store.add_dataframe(df)
+        return store
+
+    def _find_block(self, model_id, frq):
+        for block in self.blocks:
+            if block.model_id == model_id and np.array_equal(block.frq, frq):
+                return block
+        return None
+
+    def get(self, measurement_id):
+        """Returns the (frequency axis, amplitudes) of the measurement."""
+        with self._lock:
+            block, row = self._location[measurement_id]
+            return block.frq, block.amp[row]
+
+    def get_frequency_axes(self, model_id):
+        """Returns the list of the frequency axes of the model."""
+        with self._lock:
+            return [block.frq for block in self.blocks if block.model_id == model_id]
+
+    def get_model(self, model_id):
+        """Returns the measurements of the model with a shared frequency axis.
+
+        :param model_id: model id
+        :return: (frequency axis, list of measurement ids, (n_meas, n_freq) amplitudes)
+        """
+        with self._lock:
+            blocks = [block for block in self.blocks if block.model_id == model_id]
+            if len(blocks) == 0:
+                return np.empty(0), [], np.empty((0, 0), dtype=complex)
+            elif len(blocks) > 1:
+                raise Exception('the measurements of model %s have %d different frequency axes'
+                                % (model_id, len(blocks)))
+            return blocks[0].frq, list(blocks[0].measurement_ids), blocks[0].amp
+
+    def remove(self, measurement_ids):
+        """Removes the measurements (the ids not in the store are ignored)."""
+        measurement_ids = set(measurement_ids)
+        with self._lock:
+            for block in self.blocks:
+                keep = [_ not in measurement_ids for _ in block.measurement_ids]
+                if not all(keep):
+                    block.amp = block.amp[keep]
+                    block.measurement_ids = [_ for _, k in zip(block.measurement_ids, keep) if k]
+            self.blocks = [block for block in self.blocks if len(block.measurement_ids)]
+            rows = dict((_, (block, row)) for block in self.blocks for row, _ in enumerate(block.measurement_ids))
+            self._location = dict((_, rows[_]) for _ in self._location if _ in rows)
+            self._dataframe = None
+
+    def to_dataframe(self):
+        """Returns the long-format DataFrame (model_id, measurement_id, frq, amp) view of the store.
+
+        The DataFrame is made when needed and kept until the store changes; changing it does not
+        change the store."""
+        with self._lock:
+            if self._dataframe is None:
+                if len(self) == 0:
+                    df = pd.DataFrame(columns=_COLUMNS)
+                    df.amp = df.amp.astype('complex')
+                else:
+                    locations = list(self._location.values())
+                    lengths = [block.frq.size for block, row in locations]
+                    df = pd.DataFrame({'model_id': np.repeat([block.model_id for block, row in locations], lengths),
+                                       'measurement_id': np.repeat(list(self._location), lengths),
+                                       'frq': np.concatenate([block.frq for block, row in locations]),
+                                       'amp': np.concatenate([block.amp[row] for block, row in locations])},
+                                      columns=_COLUMNS)
+                self._dataframe = df
+            return self._dataframe
+
+
+class AppendTable(object):
+    """DataFrame with a fast append
+
+    The appended rows are staged in NumPy arrays (one per column) that grow geometrically; the
+    DataFrame is made when it is read (see to_dataframe) and kept until the next append.
+
+        :param df: DataFrame with the initial rows and the columns of the table
+    """
+
+    def __init__(self, df):
+        self._dataframe = df
+        self._staged = None
+        self._rows = 0
+        self._max = dict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        with self._lock:
+            return self._dataframe.shape[0] + self._rows
+
+    def __getstate__(self):
+        return {'_dataframe': self.to_dataframe()}
+
+    def __setstate__(self, state):
+        self.__init__(state['_dataframe'])
+
+    def append(self, **columns):
+        """Appends rows; the values are scalars or arrays of the same length (one value per row).
+        The rows appended between two reads must have the same columns, the other columns are NaN."""
+        with self._lock:
+            n = max([np.size(value) for value in columns.values()] + [1])
+            if self._staged is None:
+                self._staged = dict()
+            elif set(columns) != set(self._staged):
+                raise ValueError('the appended columns differ from the staged columns.')
+            for name, value in columns.items():
+                value = np.asarray(value)
+                staged = self._staged.get(name)
+                if staged is None:
+                    staged = np.empty(max(16, n), dtype=value.dtype)
+                elif self._rows + n > staged.shape[0] or not np.can_cast(value.dtype, staged.dtype):
+                    # grow geometrically, the appends are amortized O(1)
+                    dtype = staged.dtype
+                    if not np.can_cast(value.dtype, dtype):
+                        try:
+                            dtype = np.result_type(staged, value)
+                        except TypeError:
+                            dtype = np.dtype(object)
+                    _staged = np.empty(max(2 * staged.shape[0], self._rows + n), dtype=dtype)
+                    _staged[:self._rows] = staged[:self._rows]
+                    staged = _staged
+                staged[self._rows:self._rows + n] = value
+                self._staged[name] = staged
+                if self._max.get(name) is not None and value.size:
+                    self._max[name] = max(self._max[name], value.max())
+                elif name in self._max and value.size:
+                    self._max[name] = value.max()
+            self._rows += n
+
+    def get_max(self, name):
+        """Returns the maximum of the column (None if the table is empty), without making the DataFrame."""
+        with self._lock:
+            if name not in self._max:
+                column = self.to_dataframe()[name]
+                self._max[name] = column.max() if column.size else None
+            return self._max[name]
+
+    def to_dataframe(self):
+        """Returns the DataFrame with all the rows."""
+        with self._lock:
+            if self._rows:
+                staged = pd.DataFrame(dict((name, values[:self._rows]) for name, values in self._staged.items()))
+                if self._dataframe.shape[0] == 0:
+                    # do not upcast to the dtypes of the empty table
+                    self._dataframe = staged.reindex(columns=self._dataframe.columns.union(staged.columns, sort=False))
+                else:
+                    self._dataframe = pd.concat([self._dataframe, staged], ignore_index=True)
+                self._staged = None
+                self._rows = 0
+            return self._dataframe
@@ -46,6 +46,8 @@ from OpenModal.anim_tools import zyx_euler_to_rotation_matrix
 import numpy as np
 import pyuff
 import OpenModal.utils as ut
+import OpenModal.time_archive as time_archive
+from OpenModal.measurement_store import MeasurementStore, AppendTable
 
 # import _transformations as tr
 
@@ -120,6 +122,46 @@ SPECIFIC_DATA_TYPE['sound power'] = 23
 
 # TODO: Fast get and set. Check setting with enlargement.
 
+# Tables with the rows appended for every new measurement.
+_APPEND_TABLES = ['measurement_index', 'measurement_values_td', 'measurement_archive']
+
+class _Tables(dict):
+    """The tables of ModalData
+
+    The measurement_values table is kept in a MeasurementStore (see ModalData.measurements), the
+    table itself is its DataFrame view. The tables in _APPEND_TABLES are kept in AppendTables. Setting
+    a DataFrame replaces the content of the store or the append table.
+    """
+
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        if isinstance(value, (MeasurementStore, AppendTable)):
+            return value.to_dataframe()
+        return value
+
+    def __setitem__(self, key, value):
+        if key == 'measurement_values' and isinstance(value, pd.DataFrame):
+            value = MeasurementStore.from_dataframe(value)
+        elif key in _APPEND_TABLES and isinstance(value, pd.DataFrame):
+            value = AppendTable(value)
+        dict.__setitem__(self, key, value)
+
+    def __reduce__(self):
+        # Pickle the store, not the DataFrame view.
+        return self.__class__, (), None, None, iter(dict.items(self))
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def values(self):
+        return [self[key] for key in self]
+
+
 class ModalData(object):
     """The data object holds all measurement, results and geometry data
     """
@@ -129,11 +171,27 @@ class ModalData(object):
         """
         self.create_empty()
 
+    def __setstate__(self, state):
+        # The projects of the older versions have the measurement_values DataFrame in a dict.
+        if not isinstance(state.get('tables'), _Tables):
+            tables = _Tables()
+            for key, value in state.get('tables', dict()).items():
+                tables[key] = value
+            state['tables'] = tables
+        self.__dict__.update(state)
+        if 'measurement_archive' not in self.tables:
+            self.create_measurement_archive_table()
+
+    @property
+    def measurements(self):
+        """The MeasurementStore of the measurement_values table."""
+        return dict.__getitem__(self.tables, 'measurement_values')
+
 
     def create_empty(self):
         """Create an empty data container."""
         # Tables
-        self.tables = dict()
+        self.tables = _Tables()
 
         # Holds the tables, populated by importing a uff file.
         # TODO: This is temporary? Maybe, maybe not, might be
@@ -172,12 +230,18 @@ class ModalData(object):
                                                                  'ref_dir', 'abscissa_spec_data_type',
                                                                  'ordinate_spec_data_type', 'orddenom_spec_data_type', 'zero_padding'], dtype=int)
 
-        self.tables['measurement_values'] = pd.DataFrame(columns=['model_id', 'measurement_id', 'frq', 'amp'])
-        self.tables['measurement_values'].amp = self.tables['measurement_values'].amp.astype('complex')
+        self.tables['measurement_values'] = MeasurementStore()
 
         self.tables['measurement_values_td'] = pd.DataFrame(columns=['model_id', 'measurement_id', 'n_avg', 'x_axis',
                                                                      'excitation', 'response'])
 
+        self.create_measurement_archive_table()
+
+    def create_measurement_archive_table(self):
+        """Creates an empty table of the time data kept in the disk archives (see time_archive)."""
+        self.tables['measurement_archive'] = pd.DataFrame(columns=['model_id', 'measurement_id', 'archive',
+                                                                   'excitation', 'response', 'channel'])
+
     def create_analysis_table(self):
         """Creates an empty analysis table."""
         self.tables['analysis_index'] = pd.DataFrame(columns=['model_id', 'analysis_id', 'analysis_method', 'uffid',
@@ -258,41 +322,46 @@ class ModalData(object):
     def new_measurement(self, model_id, excitation_type, frequency, h, reference=[0, 0], response=[0, 0],
                         function_type='Frequency Response Function', abscissa='frequency', ordinate='acceleration',
                         denominator='excitation force', zero_padding=0, td_x_axis=np.array([]),
-                        td_excitation=None, td_response=None):
+                        td_excitation=None, td_response=None, dtype=None, td_archive=None):
+
+        """Add a new measurement.
 
-        """Add a new measurement."""
+        The dtype ('float32' or 'float64') sets the precision of the stored frequencies and
+        time data, the amplitudes are stored as the corresponding complex type ('float32' gives
+        complex64 and halves the memory). If None, the data is stored as given. Mixing
+        precisions in one table upcasts it to the higher one.
+
+        The time data kept in a disk archive is not copied: td_archive is the (archive string, excitation
+        store name, response store name, response channel) of the time data (see FRF.get_archive_reference),
+        stored in the measurement_archive table; see get_archive_time_data."""
         # Check if model id exists.
         if self.tables['info'].model_id.size == 0:
             raise ValueError
         elif not any(self.tables['info'].model_id == model_id):
             raise ValueError
 
+        # The rows are appended without making the DataFrames (they are made when the tables are read).
+        measurement_index = dict.__getitem__(self.tables, 'measurement_index')
+
         # Prepare a new measurement_id.
-        if self.tables['measurement_index'].measurement_id.size == 0:
+        if len(measurement_index) == 0:
             measurement_id = 0
         else:
-            measurement_id = self.tables['measurement_index'].measurement_id.max() + 1
+            measurement_id = measurement_index.get_max('measurement_id') + 1
 
-        newentry_idx = pd.DataFrame([[model_id, measurement_id, excitation_type, FUNCTION_TYPE[function_type], response[0],
-                                      response[1], reference[0], reference[1], SPECIFIC_DATA_TYPE[abscissa],
-                                      SPECIFIC_DATA_TYPE[ordinate], SPECIFIC_DATA_TYPE[denominator], zero_padding]],
-                                    columns=['model_id', 'measurement_id', 'excitation_type', 'func_type', 'rsp_node', 'rsp_dir',
-                                             'ref_node', 'ref_dir', 'abscissa_spec_data_type',
-                                             'ordinate_spec_data_type', 'orddenom_spec_data_type', 'zero_padding'])
+        measurement_index.append(model_id=model_id, measurement_id=measurement_id, excitation_type=excitation_type,
+                                 func_type=FUNCTION_TYPE[function_type], rsp_node=response[0], rsp_dir=response[1],
+                                 ref_node=reference[0], ref_dir=reference[1],
+                                 abscissa_spec_data_type=SPECIFIC_DATA_TYPE[abscissa],
+                                 ordinate_spec_data_type=SPECIFIC_DATA_TYPE[ordinate],
+                                 orddenom_spec_data_type=SPECIFIC_DATA_TYPE[denominator], zero_padding=zero_padding)
 
-        self.tables['measurement_index'] = pd.concat([ self.tables['measurement_index'],
-                                                       newentry_idx], ignore_index=True)
+        if dtype is not None:
+            frequency = np.asarray(frequency, dtype=dtype)
+            h = np.asarray(h, dtype=np.result_type(dtype, np.complex64))
 
         # Add entry with measured frf.
-        newentry_val = pd.DataFrame(columns=['model_id', 'measurement_id', 'frq', 'amp'])
-        newentry_val['frq'] = frequency
-        newentry_val['amp'] = h
-        newentry_val['model_id'] = model_id
-        newentry_val['measurement_id'] = measurement_id
-
-
-        self.tables['measurement_values'] = pd.concat([self.tables['measurement_values'],
-                                                                 newentry_val], ignore_index=True)
+        self.measurements.add(model_id, measurement_id, frequency, h)
 
         # if td_x_axis.size > 0:
         #     # TODO: Create it with size you already know. Should be faster?
@@ -307,23 +376,39 @@ class ModalData(object):
         #                                                      ignore_index=True)
 
         if td_x_axis.size > 0:
-            n_averages = len(td_response)
-            i = 0
-            # TODO: Optimize here.
-            for td_excitation_i, td_response_i in zip(td_excitation, td_response):
-            # TODO: Create it with size you already know. Should be faster?
-                newentry_val_td = pd.DataFrame(columns=['model_id', 'measurement_id', 'n_avg',
-                                                        'x_axis', 'excitation', 'response'])
-                newentry_val_td['x_axis'] = td_x_axis
-                newentry_val_td['excitation'] = td_excitation_i
-                newentry_val_td['response'] = td_response_i
-                newentry_val_td['model_id'] = model_id
-                newentry_val_td['measurement_id'] = measurement_id
-                newentry_val_td['n_avg'] = i
-                i += 1
-
-                self.tables['measurement_values_td'] = pd.concat([self.tables['measurement_values_td'], newentry_val_td],
-                                                                 ignore_index=True)
+            measurement_values_td = dict.__getitem__(self.tables, 'measurement_values_td')
+            for i, (td_excitation_i, td_response_i) in enumerate(zip(td_excitation, td_response)):
+                # Streamed blocks (see FRF.add_data_stream) can differ in length from the record.
+                samples = np.shape(td_excitation_i)[-1]
+                if samples == td_x_axis.size:
+                    td_x_axis_i = td_x_axis
+                else:
+                    td_x_axis_i = td_x_axis[0] + np.arange(samples) * (td_x_axis[1] - td_x_axis[0])
+                measurement_values_td.append(model_id=model_id, measurement_id=measurement_id, n_avg=i,
+                                             x_axis=td_x_axis_i, excitation=np.asarray(td_excitation_i, dtype=dtype),
+                                             response=np.asarray(td_response_i, dtype=dtype))
+
+        if td_archive is not None:
+            archive, excitation, response, channel = td_archive
+            dict.__getitem__(self.tables, 'measurement_archive').append(model_id=model_id, measurement_id=measurement_id,
+                                                                        archive=archive, excitation=excitation,
+                                                                        response=response, channel=channel)
+
+    def get_archive_time_data(self, measurement_id):
+        """Returns the time data of the measurement kept in a disk archive.
+
+        :param measurement_id: measurement id
+        :return: (excitation blocks, response blocks of the measurement channel), see time_archive.open_store;
+            (None, None) if the time data is not in a disk archive
+        """
+        archive = self.tables['measurement_archive']
+        archive = archive[archive.measurement_id == measurement_id]
+        if archive.shape[0] == 0:
+            return None, None
+        archive = archive.iloc[0]
+        exc_store = time_archive.open_store(archive.archive, archive.excitation)
+        resp_store = time_archive.open_store(archive.archive, archive.response)
+        return exc_store, [resp[archive.channel] for resp in resp_store]
 
     def remove_model(self, model_id):
         """Remove all data connected to the supplied model id."""
@@ -353,11 +438,12 @@ class ModalData(object):
 
         try:
             me_idx = self.tables['measurement_index']
-            me_vals = self.tables['measurement_values']
             me_vals_td = self.tables['measurement_values_td']
             measurement_id = me_idx[me_idx.model_id == model_id].measurement_id
             self.tables['measurement_values_td'] = self.tables['measurement_values_td'][~me_vals_td.measurement_id.isin(measurement_id)]
-            self.tables['measurement_values'] = self.tables['measurement_values'][~me_vals.measurement_id.isin(measurement_id)]
+            me_archive = self.tables['measurement_archive']
+            self.tables['measurement_archive'] = me_archive[~me_archive.measurement_id.isin(measurement_id)]
+            self.measurements.remove(measurement_id)
             self.tables['measurement_index'] = self.tables['measurement_index'][me_idx.model_id != model_id]
         except AttributeError:
             print('There is no measurement data to delete.')
@@ -386,7 +472,10 @@ class ModalData(object):
         uffdata = ModalDataUff(fname, base_key=base_key)
 
         for key in self.tables.keys():
-            if key in uffdata.tables:
+            if key == 'measurement_values' and key in uffdata.tables:
+                self.measurements.add_dataframe(uffdata.tables[key])
+                self.uff_import_tables[key] = ''
+            elif key in uffdata.tables:
                 # uffdata.tables[key].model_id += 100
                 self.tables[key] = pd.concat([self.tables[key], uffdata.tables[key]], ignore_index=True)
                 self.uff_import_tables[key] = ''
@@ -503,15 +592,12 @@ class ModalData(object):
                 dfi.field_type = 58
 
                 if len(dfi) != 0:
-                    dfv = self.tables['measurement_values']
-                    dfv = dfv[dfv.model_id == model_id]
-
                     for id, measurement in dfi.iterrows():
-                        data = dfv[dfv.measurement_id == measurement.measurement_id]
+                        frq, amp = self.measurements.get(measurement.measurement_id)
                         dsets={'type': measurement['field_type'],
                                'func_type': measurement['func_type'],
-                               'data': data['amp'].values.astype('complex'),
-                               'x': data['frq'].values,
+                               'data': amp.astype('complex'),
+                               'x': frq,
                                'rsp_node': measurement['rsp_node'],
                                'rsp_dir': measurement['rsp_dir'],
                                'ref_node': measurement['ref_node'],
@@ -586,15 +672,12 @@ class ModalData(object):
                 df_ = self.tables['measurement_index']
                 df_[df_.model_id == model_id].to_csv(os.path.join(measurements_dir, 'measurements_index.csv'))
 
-                df_ = self.tables['measurement_values']
-                grouped_measurements = df_[df_.model_id == model_id].groupby('measurement_id')
-
-                for id, measurement in grouped_measurements:
-                    measurement['amp_real'] = measurement.amp.real
-                    measurement['amp_imag'] = measurement.amp.imag
-                    measurement[['frq', 'amp_real', 'amp_imag']].to_csv(os.path.join(measurements_dir,
-                                                                                     'measurement_{0:.0f}.csv'.format(id)),
-                                                                        index=False)
+                for id in self.measurements.get_measurement_ids(model_id):
+                    frq, amp = self.measurements.get(id)
+                    measurement = pd.DataFrame({'frq': frq, 'amp_real': amp.real, 'amp_imag': amp.imag},
+                                               columns=['frq', 'amp_real', 'amp_imag'])
+                    measurement.to_csv(os.path.join(measurements_dir, 'measurement_{0:.0f}.csv'.format(id)),
+                                       index=False)
 
 
 
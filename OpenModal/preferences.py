@@ -64,9 +64,15 @@ DEFAULTS['resp_window'] = EXCITATION_DEFAULTS['impulse']['resp_window']
 DEFAULTS['weighting'] = EXCITATION_DEFAULTS['impulse']['weighting']
 DEFAULTS['n_averages'] = EXCITATION_DEFAULTS['impulse']['n_averages']
 
-DEFAULTS['fft_len'] = 'auto'
+DEFAULTS['fft_len'] = 'auto'  # 'auto' (samples and zero padding) or 'fast' (next fast length, see FRF)
+DEFAULTS['fast_frf_len'] = 'None'  # FRF length for the identification: 'None', 'trim' or 'pad', see lsce/lscf
 DEFAULTS['pre_trigger_samples'] = 30
 DEFAULTS['zero_padding'] = 0
 DEFAULTS['save_time_history'] = False
+DEFAULTS['time_archive'] = 'List'  # see time_archive.get_stores
+DEFAULTS['continuous_impact'] = False
+DEFAULTS['stream_blocks'] = False
+DEFAULTS['fft_backend'] = 'numpy'  # see fft_tools.set_fft_backend
+DEFAULTS['fft_workers'] = -1  # all CPUs
 DEFAULTS['roving_type'] = 'Ref. node'
 DEFAULTS['selected_model_id'] = 1
\ No newline at end of file
@@ -0,0 +1,346 @@
+
+# Copyright (C) 2014-2017 Matjaž Mršnik, Miha Pirnat, Janko Slavič, Blaž Starc (in alphabetic order)
+# 
+# This file is part of OpenModal.
+# 
+# OpenModal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+# 
+# OpenModal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with OpenModal.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Per-block signal quality checks, run in the acquisition process (see daqprocess.ThreadedDAQ).
+
+The checks are updated incrementally with every acquired block of the current record and finished
+when the record is complete (an impulse record or a random/OMA chunk). The results are the fields
+of one compact numpy record, which the acquisition process publishes in shared memory; a record
+that fails a check can be rejected before any FFT/FRF work is done on it.
+
+The checks are defined as the windows in frf (type:parameter):
+    'Overload:3':       clipping, at least 3 samples equal to the maximum of a channel in a block
+    'DoubleHit:0.01':   double hit in the excitation of the complete record (limit, see meas_check)
+    'Statistics':       DC offset, RMS, peak and crest factor of the channels (no rejection)
+    'Coherence:0.2':    the mean coherence of a response drops more than 20 % below the mean of the
+                        accepted records (estimated from short segments, random excitation)
+Objects derived from QualityCheck can also be given.
+
+Classes:
+    class QualityCheck:     Base class of the checks.
+    class QualityStage:     Runs the checks over the blocks and records.
+"""
+import numpy as np
+
+import OpenModal.fft_tools as fft_tools
+from OpenModal.meas_check import overload_check_block, double_hit_check_block
+
+_CHECKS = ['Overload', 'DoubleHit', 'Statistics', 'Coherence']
+
+
+def get_default_checks(excitation_type):
+    """Returns the default checks for the excitation type ('impulse', 'random' or 'oma')."""
+    if excitation_type == 'impulse':
+        return ['Overload', 'DoubleHit', 'Statistics']
+    elif excitation_type == 'random':
+        return ['Overload', 'Statistics', 'Coherence']
+    return ['Overload', 'Statistics']
+
+
+def get_check(check):
+    """Returns the QualityCheck for the check string (or the check itself)."""
+    if isinstance(check, QualityCheck):
+        return check
+    check = check.split(':')
+    if check[0] == 'Overload':
+        return OverloadCheck(*[int(_) for _ in check[1:]])
+    elif check[0] == 'DoubleHit':
+        return DoubleHitCheck(*[float(_) for _ in check[1:]])
+    elif check[0] == 'Statistics':
+        return StatisticsCheck()
+    elif check[0] == 'Coherence':
+        return CoherenceCheck(*[float(_) for _ in check[1:]])
+    else:
+        raise Exception('wrong quality check given %s (can be %s)' % (check[0], _CHECKS))
+
+
+class QualityCheck(object):
+    """Base class of the quality checks
+
+    A check defines its result fields and updates them in the result record; the boolean fields
+    listed in `reject_fields` reject the record if any of them is True.
+    """
+    reject_fields = []
+
+    def setup(self, number_of_channels, exc_channel, sampling_rate):
+        """Called once, before the first record."""
+        self.number_of_channels = number_of_channels
+        self.exc_channel = exc_channel
+        self.sampling_rate = sampling_rate
+
+    def get_fields(self):
+        """Returns the list of the result fields (numpy dtype description)."""
+        return []
+
+    def reset(self, result):
+        """Starts a new record."""
+        pass
+
+    def update(self, block, result):
+        """Updates the result with a (channels, samples) block of the record."""
+        pass
+
+    def finish(self, record, result):
+        """Finishes the result for the complete (channels, samples) record."""
+        pass
+
+    def accept(self, result):
+        """Called with the result of a record that was not rejected."""
+        pass
+
+
+class OverloadCheck(QualityCheck):
+    """Overloaded (clipped) channels, see meas_check.overload_check_block
+
+    :param min_overload_samples: number of samples that need to be equal to max for overload
+    """
+    reject_fields = ['overload']
+
+    def __init__(self, min_overload_samples=3):
+        self.min_overload_samples = min_overload_samples
+
+    def get_fields(self):
+        return [('overload', '?', (self.number_of_channels,))]
+
+    def reset(self, result):
+        result['overload'] = False
+
+    def update(self, block, result):
+        result['overload'] |= overload_check_block(block, self.min_overload_samples)
+
+
+class DoubleHitCheck(QualityCheck):
+    """Double hit in the excitation of the record, see meas_check.double_hit_check_block
+
+    :param limit: ratio of freq content of the double vs single hit
+    """
+    reject_fields = ['double_hit']
+
+    def __init__(self, limit=1e-2):
+        self.limit = limit
+
+    def get_fields(self):
+        return [('double_hit', '?')]
+
+    def reset(self, result):
+        result['double_hit'] = False
+
+    def finish(self, record, result):
+        result['double_hit'] = double_hit_check_block(record[self.exc_channel], 1. / self.sampling_rate,
+                                                      self.limit)
+
+
+class StatisticsCheck(QualityCheck):
+    """DC offset, RMS, peak and crest factor (peak/RMS) of the channels, updated with every block"""
+
+    def get_fields(self):
+        n = (self.number_of_channels,)
+        return [('dc_offset', 'f8', n), ('rms', 'f8', n), ('peak', 'f8', n), ('crest_factor', 'f8', n)]
+
+    def reset(self, result):
+        self._sum = np.zeros(self.number_of_channels)
+        self._sum_squares = np.zeros(self.number_of_channels)
+        self._samples = 0
+        for name in ['dc_offset', 'rms', 'peak', 'crest_factor']:
+            result[name] = 0.
+
+    def update(self, block, result):
+        self._sum += np.sum(block, axis=-1)
+        self._sum_squares += np.einsum('ij,ij->i', block, block)
+        self._samples += block.shape[-1]
+        result['dc_offset'] = self._sum / self._samples
+        result['rms'] = np.sqrt(self._sum_squares / self._samples)
+        result['peak'] = np.maximum(result['peak'], np.max(np.abs(block), axis=-1))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result['crest_factor'] = np.where(result['rms'] > 0, result['peak'] / result['rms'], 0.)
+
+
+class CoherenceCheck(QualityCheck):
+    """Coherence-drop watchdog for the random excitation
+
+    The excitation and response spectra are averaged over the Hann-windowed segments of the record
+    (the segments continue over the blocks). The mean coherence of each response is compared to the
+    mean of the accepted records.
+
+    :param drop: relative drop of the coherence that rejects the record
+    :param segment: number of samples in a segment
+    """
+    reject_fields = ['coherence_drop']
+
+    def __init__(self, drop=0.2, segment=256):
+        self.drop = drop
+        self.segment = int(segment)
+        self.reference = None
+        self._accepted = 0
+
+    def setup(self, number_of_channels, exc_channel, sampling_rate):
+        QualityCheck.setup(self, number_of_channels, exc_channel, sampling_rate)
+        self._window = np.hanning(self.segment)
+
+    def get_fields(self):
+        return [('coherence', 'f8', (self.number_of_channels,)), ('coherence_drop', '?')]
+
+    def reset(self, result):
+        self._carry = np.zeros((self.number_of_channels, 0))
+        self._S_FF = 0.
+        self._S_XX = 0.
+        self._S_FX = 0.
+        result['coherence'] = 0.
+        result['coherence_drop'] = False
+
+    def update(self, block, result):
+        if self._carry.shape[-1]:
+            block = np.concatenate((self._carry, block), axis=-1)
+        n_segments = block.shape[-1] // self.segment
+        used = n_segments * self.segment
+        self._carry = block[:, used:].copy()
+        if n_segments == 0:
+            return
+        segments = block[:, :used].reshape(block.shape[0], n_segments, self.segment) * self._window
+        X = fft_tools.rfft(segments)
+        F = X[self.exc_channel]
+        self._S_FF = self._S_FF + np.einsum('sf,sf->f', F.conj(), F).real
+        self._S_XX = self._S_XX + np.einsum('csf,csf->cf', X.conj(), X).real
+        self._S_FX = self._S_FX + np.einsum('sf,csf->cf', F.conj(), X)
+
+    def finish(self, record, result):
+        if np.ndim(self._S_FX) == 0:
+            return
+        with np.errstate(divide='ignore', invalid='ignore'):
+            coherence = np.abs(self._S_FX) ** 2 / (self._S_FF * self._S_XX)
+        coherence = np.nanmean(coherence[:, 1:], axis=-1)
+        result['coherence'] = coherence
+        if self.reference is not None:
+            responses = np.arange(self.number_of_channels) != self.exc_channel
+            result['coherence_drop'] = np.any(coherence[responses] < (1 - self.drop) * self.reference[responses])
+
+    def accept(self, result):
+        # running mean of the accepted records
+        self._accepted += 1
+        if self.reference is None:
+            self.reference = result['coherence'].copy()
+        else:
+            self.reference += (result['coherence'] - self.reference) / self._accepted
+
+
+class QualityStage(object):
+    """Runs the quality checks over the blocks and records
+
+    The results are in `result` (structured array of shape (2,)): result[0] is the current record
+    (updated with every block), result[1] is the last complete record. Besides the fields of the
+    checks, the results have the fields `records` (number of complete records) and `reject`.
+
+        :param checks: list of check strings or QualityCheck objects, see _CHECKS
+        :param number_of_channels: number of channels
+        :param exc_channel: excitation channel
+        :param sampling_rate: sampling rate
+    """
+
+    def __init__(self, checks, number_of_channels, exc_channel, sampling_rate):
+        self.checks = [get_check(_) for _ in checks]
+        fields = [('records', 'i8'), ('reject', '?')]
+        for check in self.checks:
+            check.setup(number_of_channels, exc_channel, sampling_rate)
+            fields += check.get_fields()
+        self.dtype = np.dtype(fields)
+        self.result = np.zeros(2, dtype=self.dtype)
+        self.new_record()
+
+    def set_result(self, result):
+        """Use the (e.g. shared memory) array result for the results."""
+        result[...] = self.result
+        self.result = result
+
+    def new_record(self):
+        """Starts a new record."""
+        current = self.result[0]
+        current['reject'] = False
+        for check in self.checks:
+            check.reset(current)
+
+    def update(self, block):
+        """Updates the checks with a (channels, samples) block of the current record."""
+        if block.shape[-1] == 0:
+            return
+        current = self.result[0]
+        for check in self.checks:
+            check.update(block, current)
+
+    def finish(self, record):
+        """Finishes the checks for the complete record; returns True if the record is rejected."""
+        current = self.result[0]
+        for check in self.checks:
+            check.finish(record, current)
+        reject = any(np.any(current[name]) for check in self.checks for name in check.reject_fields)
+        current['reject'] = reject
+        current['records'] += 1
+        if not reject:
+            for check in self.checks:
+                check.accept(current)
+        self.result[1] = current
+        return reject
+
+
+def test_quality_stage():
+    from OpenModal.SimulatedDAQTask import SimulatedDAQTask
+
+    def check_record(stage, record, block_size=512):
+        stage.new_record()
+        for i in range(0, record.shape[-1], block_size):
+            stage.update(record[:, i:i + block_size])
+        return stage.finish(record)
+
+    # impulse: clean hit, clipped response, double hit
+    task = SimulatedDAQTask('Simulated:impulse:0', sample_rate=5120., number_of_ch=3, samples_per_ch=5120,
+                            hit_period=1., seed=0)
+    stage = QualityStage(get_default_checks('impulse'), 3, 0, task.sample_rate)
+    # the second record, the noise of the simulated task is relative to the peak of the first hit
+    task.acquire()
+    task.acquire()
+    record = task.data
+    assert not check_record(stage, record)
+
+    clipped = record.copy()
+    clipped[1] = np.clip(clipped[1], -0.5 * np.max(np.abs(record[1])), 0.5 * np.max(np.abs(record[1])))
+    assert check_record(stage, clipped)
+    assert list(stage.result[1]['overload']) == [False, True, False]
+
+    double_hit = record.copy()
+    double_hit[0, 3000:3100] += record[0, 2560:2660]
+    assert check_record(stage, double_hit)
+    assert stage.result[1]['double_hit'] and not np.any(stage.result[1]['overload'])
+    assert stage.result[1]['records'] == 3
+
+    # random: the coherence of the accepted records is the reference, a noise response is rejected
+    task = SimulatedDAQTask('Simulated:random:0', sample_rate=5120., number_of_ch=3, samples_per_ch=10240,
+                            noise=1e-3, seed=0)
+    stage = QualityStage(get_default_checks('random'), 3, 0, task.sample_rate)
+    coherence = stage.checks[-1]
+    for i in range(3):
+        task.acquire()
+        assert not check_record(stage, task.data)
+    reference = coherence.reference.copy()
+    task.acquire()
+    noise = task.data.copy()
+    noise[2] = np.random.RandomState(0).randn(noise.shape[-1]) * np.std(noise[2])
+    assert check_record(stage, noise)
+    assert stage.result[1]['coherence_drop'] and stage.result[1]['coherence'][2] < 0.5 * reference[2]
+    np.testing.assert_array_equal(coherence.reference, reference)
+
+
+if __name__ == '__main__':
+    test_quality_stage()
@@ -0,0 +1,341 @@
+
+# Copyright (C) 2014-2017 Matjaž Mršnik, Miha Pirnat, Janko Slavič, Blaž Starc (in alphabetic order)
+# 
+# This file is part of OpenModal.
+# 
+# OpenModal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+# 
+# OpenModal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with OpenModal.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Storage backends for the archived time data (see FRF.archive_time_data).
+
+The archive string is defined as the window strings in frf (type:parameter):
+    'List':                 all blocks in memory (the default, unbounded)
+    'Ring:100':             the last 100 blocks in memory
+    'Npy:directory':        all blocks on disk, in memory-mapped .npy chunk files
+    'HDF5:filename.h5':     all blocks on disk, in a compressed HDF5 file (requires h5py)
+
+All the stores are appended with blocks of shape (..., samples) (the number of samples can change
+between the blocks) and behave as read-only sequences of the blocks. The disk stores read the
+blocks lazily, only when they are accessed.
+
+The disk stores get unique names (see get_stores), so the stores of several FRF objects and of
+several sessions can share the directory (file); an existing file or dataset is never overwritten.
+After close() the block boundaries are written next to the data and the store can be opened again
+by its archive string and name (see open_store).
+
+Classes:
+    class ListStore:    Unbounded in-memory store.
+    class RingStore:    Bounded in-memory store.
+    class NpyStore:     Disk store with memory-mapped .npy chunk files.
+    class HDF5Store:    Disk store with a compressed HDF5 dataset.
+"""
+import os
+import uuid
+from collections import deque
+
+import numpy as np
+
+_ARCHIVES = ['List', 'Ring', 'Npy', 'HDF5']
+_DISK_ARCHIVES = ['Npy', 'HDF5']
+
+
+def get_stores(archive_time_data):
+    """Returns the (excitation, response) stores for the archive type
+
+    The names of the disk stores are 'exc_<id>' and 'resp_<id>' with a unique id.
+
+    :param archive_time_data: archive string, see _ARCHIVES; True for 'List'
+    :return: (excitation store, response store) or ([], []) if the time data is not archived
+    """
+    if archive_time_data is False or archive_time_data is None:
+        return [], []
+    if archive_time_data is True:
+        archive_time_data = 'List'
+
+    archive = archive_time_data.split(':', 1)
+    if archive[0] == 'List':
+        return ListStore(), ListStore()
+    elif archive[0] == 'Ring':
+        return RingStore(int(archive[1])), RingStore(int(archive[1]))
+    elif archive[0] in _DISK_ARCHIVES:
+        store_id = uuid.uuid4().hex
+        return (open_store(archive_time_data, 'exc_%s' % store_id, mode='w'),
+                open_store(archive_time_data, 'resp_%s' % store_id, mode='w'))
+    else:
+        raise Exception('wrong archive type given %s (can be %s)' % (archive_time_data, _ARCHIVES))
+
+
+def open_store(archive_time_data, name, mode='r'):
+    """Opens the disk store
+
+    :param archive_time_data: archive string of a disk store, see _DISK_ARCHIVES
+    :param name: name of the store (see _DiskStore.name)
+    :param mode: 'w' for a new store, 'r' to read a closed store
+    :return: disk store
+    """
+    archive = archive_time_data.split(':', 1)
+    if archive[0] == 'Npy':
+        return NpyStore(archive[1], name, mode=mode)
+    elif archive[0] == 'HDF5':
+        return HDF5Store(archive[1], name, mode=mode)
+    else:
+        raise Exception('wrong disk archive type given %s (can be %s)' % (archive_time_data, _DISK_ARCHIVES))
+
+
+class ListStore(object):
+    """Unbounded in-memory store of time data blocks"""
+
+    def __init__(self):
+        self.blocks = []
+
+    def append(self, x):
+        """Adds a copy of the block x."""
+        self.blocks.append(np.array(x))
+
+    def close(self):
+        """Nothing to close, the blocks stay in memory."""
+        pass
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def __getitem__(self, item):
+        return self.blocks[item]
+
+    def __iter__(self):
+        return iter(self.blocks)
+
+
+class RingStore(ListStore):
+    """Bounded in-memory store; only the last `max_blocks` blocks are kept
+
+        :param max_blocks: maximal number of stored blocks
+    """
+
+    def __init__(self, max_blocks):
+        ListStore.__init__(self)
+        self.blocks = deque(maxlen=max_blocks)
+        self.dropped_blocks = 0
+
+    def append(self, x):
+        """Adds a copy of the block x, the oldest block is dropped if the store is full."""
+        if len(self.blocks) == self.blocks.maxlen:
+            self.dropped_blocks += 1
+        ListStore.append(self, x)
+
+
+class _DiskStore(object):
+    """Common part of the disk stores: the blocks are concatenated along the samples axis
+    and the block boundaries are kept in memory (and written to the disk on close).
+
+        :param archive: archive string of the store, see open_store
+        :param name: name of the store
+        :param mode: 'w' for a new store, 'r' to read a closed store
+    """
+
+    def __init__(self, archive, name, mode):
+        self.archive = archive
+        self.name = name
+        self.mode = mode
+        self.starts = []
+        self.stops = []
+        self.shape = None
+        self.dtype = None
+        self.samples = 0
+        self.closed = False
+
+    def append(self, x):
+        """Writes the block x to the store."""
+        if self.mode != 'w' or self.closed:
+            raise Exception('the store %s is read-only.' % self.name)
+        x = np.asarray(x)
+        if self.shape is None:
+            self.shape = x.shape[:-1]
+            self.dtype = x.dtype
+            self._create()
+        elif x.shape[:-1] != self.shape:
+            raise ValueError('number of channels changed.')
+        self._write(x, self.samples)
+        self.starts.append(self.samples)
+        self.samples += x.shape[-1]
+        self.stops.append(self.samples)
+
+    def close(self):
+        """Closes the store; a written store writes the block boundaries and can be opened again
+        with open_store."""
+        if not self.closed:
+            self._close()
+            self.closed = True
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[_] for _ in range(*item.indices(len(self)))]
+        return self._read(self.starts[item], self.stops[item])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class NpyStore(_DiskStore):
+    """Disk store of time data blocks in memory-mapped .npy chunk files
+
+    The blocks are written to files ``<name>_<k>.npy`` in the directory, each holding
+    `chunk_samples` samples per channel, the block boundaries to ``<name>_blocks.npy`` on close.
+    The returned blocks are memory-mapped (read from the disk when used); a block spanning two chunk
+    files is read into memory.
+
+    A chunk file is allocated in full when it is created (on the file systems without sparse files,
+    e.g. on Windows, this takes the disk space). By default the chunk files hold about `chunk_bytes`
+    bytes and at least the first block.
+
+        :param directory: directory of the chunk files (created if needed)
+        :param name: name of the store, used as the file name prefix
+        :param chunk_samples: number of samples per channel in one chunk file (None: from chunk_bytes)
+        :param chunk_bytes: size of a chunk file, used if chunk_samples is None
+        :param mode: 'w' for a new store, 'r' to read a closed store
+    """
+
+    def __init__(self, directory, name, chunk_samples=None, chunk_bytes=2**26, mode='w'):
+        _DiskStore.__init__(self, 'Npy:' + directory, name, mode)
+        self.directory = directory
+        self.chunk_samples = chunk_samples
+        self.chunk_bytes = chunk_bytes
+        self._chunks = []
+        if mode == 'r':
+            self.starts, self.stops = np.load(self._get_fname('blocks')).tolist()
+            self.samples = self.stops[-1] if self.stops else 0
+            while os.path.isfile(self._get_fname(len(self._chunks))):
+                self._chunks.append(np.load(self._get_fname(len(self._chunks)), mmap_mode='r'))
+            if self._chunks:
+                self.shape = self._chunks[0].shape[:-1]
+                self.dtype = self._chunks[0].dtype
+                self.chunk_samples = self._chunks[0].shape[-1]
+
+    def _get_fname(self, k):
+        return os.path.join(self.directory, '%s_%s.npy' % (self.name, k))
+
+    def _create(self):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    def _write(self, x, start):
+        if self.chunk_samples is None:
+            # Size the chunks from the first block.
+            bytes_per_sample = max(1, int(np.prod(self.shape))) * self.dtype.itemsize
+            self.chunk_samples = max(x.shape[-1], self.chunk_bytes // bytes_per_sample)
+        self._write_chunks(x, start)
+
+    def _get_chunk(self, k):
+        """Returns the memory-mapped chunk k; a new chunk file is created if needed."""
+        while len(self._chunks) <= k:
+            fname = self._get_fname(len(self._chunks))
+            if os.path.exists(fname):
+                raise Exception('the archive file %s exists.' % fname)
+            self._chunks.append(np.lib.format.open_memmap(fname, mode='w+', dtype=self.dtype,
+                                                          shape=self.shape + (self.chunk_samples,)))
+        return self._chunks[k]
+
+    def _write_chunks(self, x, start):
+        done = 0
+        while done < x.shape[-1]:
+            k, pos = divmod(start + done, self.chunk_samples)
+            n = min(x.shape[-1] - done, self.chunk_samples - pos)
+            self._get_chunk(k)[..., pos:pos + n] = x[..., done:done + n]
+            done += n
+
+    def _read(self, start, stop):
+        pieces = []
+        while start < stop:
+            k, pos = divmod(start, self.chunk_samples)
+            n = min(stop - start, self.chunk_samples - pos)
+            pieces.append(self._chunks[k][..., pos:pos + n])
+            start += n
+        if len(pieces) == 1:
+            return pieces[0]
+        return np.concatenate(pieces, axis=-1)
+
+    def flush(self):
+        """Flushes the chunk files to the disk."""
+        for chunk in self._chunks:
+            if isinstance(chunk, np.memmap) and chunk.mode == 'w+':
+                chunk.flush()
+
+    def _close(self):
+        if self.mode == 'w' and self.starts:
+            self.flush()
+            np.save(self._get_fname('blocks'), np.array([self.starts, self.stops], dtype='int64'))
+
+
+class HDF5Store(_DiskStore):
+    """Disk store of time data blocks in a compressed HDF5 dataset (requires h5py)
+
+    The block boundaries are written to the attributes of the dataset on close. The file is kept
+    open until close() (or until the store is deleted).
+
+        :param filename: HDF5 file name
+        :param name: name of the dataset
+        :param compression: HDF5 compression filter
+        :param chunk_samples: number of samples per channel in one HDF5 chunk
+        :param mode: 'w' for a new store, 'r' to read a closed store
+    """
+
+    def __init__(self, filename, name, compression='gzip', chunk_samples=2**16, mode='w'):
+        try:
+            import h5py
+        except ImportError:
+            raise ImportError('h5py is required for the HDF5 time data archive.')
+        _DiskStore.__init__(self, 'HDF5:' + filename, name, mode)
+        self.file = h5py.File(filename, 'a' if mode == 'w' else 'r')
+        self.compression = compression
+        self.chunk_samples = chunk_samples
+        self.dataset = None
+        if mode == 'r':
+            self.dataset = self.file[name]
+            self.starts = self.dataset.attrs['starts'].tolist()
+            self.stops = self.dataset.attrs['stops'].tolist()
+            self.samples = self.stops[-1] if self.stops else 0
+            self.shape = self.dataset.shape[:-1]
+            self.dtype = self.dataset.dtype
+
+    def __del__(self):
+        file = getattr(self, 'file', None)
+        if file is not None and file.id.valid:
+            self.close()
+
+    def _create(self):
+        if self.name in self.file:
+            raise Exception('the archive dataset %s exists.' % self.name)
+        self.dataset = self.file.create_dataset(self.name, shape=self.shape + (0,), maxshape=self.shape + (None,),
+                                                dtype=self.dtype, chunks=self.shape + (self.chunk_samples,),
+                                                compression=self.compression)
+
+    def _write(self, x, start):
+        self.dataset.resize(start + x.shape[-1], axis=len(self.shape))
+        self.dataset[..., start:start + x.shape[-1]] = x
+
+    def _read(self, start, stop):
+        return self.dataset[..., start:stop]
+
+    def flush(self):
+        """Flushes the HDF5 file to the disk."""
+        self.file.flush()
+
+    def _close(self):
+        if self.mode == 'w' and self.dataset is not None:
+            self.dataset.attrs['starts'] = np.array(self.starts, dtype='int64')
+            self.dataset.attrs['stops'] = np.array(self.stops, dtype='int64')
+        self.file.close()
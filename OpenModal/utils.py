@@ -24,6 +24,8 @@ such as euler/direction vector conversion.
 import numpy as np
 import pandas as pd
 
+from OpenModal.measurement_store import MeasurementStore
+
 
 def zyx_euler_to_rotation_matrix(th):
     """Convert the ZYX order (the one LMS uses) Euler
@@ -82,10 +84,14 @@ def get_frf_from_mdd(measurement_values, measurement_index):
 
     The dimensions of the new array are (number of inputs, number of outputs, length of data)
 
-    :param measurement_values: measurement values table of the mdd file
+    :param measurement_values: measurement values table of the mdd file or its MeasurementStore
+                               (ModalData.measurements)
     :param measurement_index: measurement index table of the mdd file
     :return: FRF array
     """
+    if isinstance(measurement_values, MeasurementStore):
+        return _get_frf_from_store(measurement_values, measurement_index)
+
     # Get unique row indices from reference nodes and reference directions
     inputs, ni = unique_row_indices(measurement_index.loc[:, ['ref_node', 'ref_dir']].values)
 
@@ -110,6 +116,24 @@ def get_frf_from_mdd(measurement_values, measurement_index):
     return frf, f
 
 
+def _get_frf_from_store(store, measurement_index):
+    """get_frf_from_mdd for the measurements in a MeasurementStore."""
+    inputs, ni = unique_row_indices(measurement_index.loc[:, ['ref_node', 'ref_dir']].values)
+    outputs, no = unique_row_indices(measurement_index.loc[:, ['rsp_node', 'rsp_dir']].values)
+
+    measurement_ids = measurement_index.loc[:, 'measurement_id'].values
+    if len(measurement_ids) > 0:
+        f = store.get(measurement_ids[0])[0]
+    else:
+        f = None
+
+    frf = np.empty((ni, no, 0 if f is None else f.size), dtype=complex)
+    for i, meas_id in enumerate(measurement_ids):
+        frf[inputs[i], outputs[i]] = store.get(meas_id)[1]
+
+    return frf, f
+
+
 def get_frf_type(num_denom_type):
     """
     Get frf type from reference and response types. The supported frf types are:
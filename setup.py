@@ -129,6 +129,7 @@ executables = [
 setup(name='OpenModal',
       version='0.1',
       description='OpenModal first freeze',
+      python_requires='>=3.8',  # multiprocessing.shared_memory (see SharedBuffer)
       options=options,
       executables=executables
       )